@@ -2,82 +2,73 @@ from dotenv import load_dotenv
 import os
 import asyncio
 import signal
+import time
 
 from livekit import agents, rtc
-from livekit.agents import AgentServer,AgentSession, Agent, room_io, ChatContext
-from livekit.plugins import noise_cancellation, silero, google, openai
+from livekit.agents import AgentServer,AgentSession, Agent, room_io, ChatContext, JobProcess, ChatMessage
+from livekit.agents.metrics import LLMMetrics, RealtimeModelMetrics
+from livekit.plugins import noise_cancellation, silero, google
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
 
-from prompts import AGENT_INSTRUCTION, SESSION_INSTRUCTION
+from prompts import AGENT_INSTRUCTION, GREETING, SESSION_INSTRUCTION
 from tools import get_weather, search_web, send_email
+from backends import build_llm, prewarm_llm, start_local_model_warmer
+from memory_cache import CachedMemoryClient
+from context_window import SUMMARY_ID
+from conversation import attach_conversation, close_conversation
+from sessions import SessionState, registry
+from turn_metrics import process_stats
+from loop_watchdog import start_watchdog, stop_watchdog
+from phrase_audio import phrase_audio
+from outbox import get_outbox
+from answer_cache import AnswerCache, answer_from_cache
+from knowledge import KnowledgeIndex, add_knowledge, packed_instructions
+from worker_load import WorkerLoad, clear_session, report_session
+from audio_frontend import AdaptiveNoiseCancellation
+from video_sampler import VideoSampler
 from mem0 import AsyncMemoryClient
-import json
 import logging
+import psutil
 
 load_dotenv(".env.local")
 
-# Initialize Mem0 client
-mem0_client = AsyncMemoryClient(api_key=os.getenv("MEM0_API_KEY"))
+# Data files ship next to this module, whatever directory the worker is started from
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Global variables to track session for cleanup
-current_assistant = None
-current_user_name = None
-current_memory_str = ''
+# Initialize Mem0 client behind a local read-through cache shared by every session in the worker
+mem0_client = CachedMemoryClient(
+    AsyncMemoryClient(api_key=os.getenv("MEM0_API_KEY")),
+    ttl=float(os.getenv("MEM0_CACHE_TTL", "300")),
+    stale_ttl=float(os.getenv("MEM0_CACHE_STALE_TTL", "3600")),
+    max_users=int(os.getenv("MEM0_CACHE_MAX_USERS", "1000")),
+)
 
+# Approved answers to the questions most callers ask, answered without the LLM
+FAQ_ANSWERS_PATH = os.getenv("FAQ_ANSWERS_PATH", os.path.join(BASE_DIR, "faq_answers.json"))
+answer_cache = AnswerCache(
+    threshold=float(os.getenv("FAQ_CACHE_THRESHOLD", "0.55")),
+    ttl=float(os.getenv("FAQ_CACHE_TTL", "3600")),
+)
+if os.path.exists(FAQ_ANSWERS_PATH):
+    answer_cache.load(FAQ_ANSWERS_PATH)
 
-async def shutdown_hook(chat_ctx: ChatContext, mem0: AsyncMemoryClient, user_id: str, memory_str: str = ''):
-    """
-    Save the chat context to memory when shutting down.
-    
-    Args:
-        chat_ctx: The chat context containing conversation history
-        mem0: The Mem0 client instance
-        user_id: The user identifier for storing memories
-        memory_str: The memory string that was loaded at the start to avoid re-saving it
-    """
-    logging.info("Shutting down, saving chat context to memory...")
-    
-    messages_formatted = []
-    
-    logging.info(f"Chat context messages: {chat_ctx.items}")
-    
-    for item in chat_ctx.items:
-        # Handle content that could be a list or string
-        content_str = ''.join(item.content) if isinstance(item.content, list) else str(item.content)
-        
-        # Skip if this content contains the loaded memory string (avoid re-saving past memories)
-        if memory_str and memory_str in content_str:
-            continue
-        
-        # Only save user and assistant messages (skip system messages)
-        if item.role in ['user', 'assistant']:
-            messages_formatted.append({
-                "role": item.role,
-                "content": content_str.strip()
-            })
-    
-    if messages_formatted:
-        logging.info(f"Saving {len(messages_formatted)} messages to memory for user {user_id}")
-        try:
-            result = await mem0.add(messages_formatted, user_id=user_id)
-            logging.info(f"Memory saved successfully: {result}")
-            logging.info("Chat context saved to memory.")
-        except Exception as e:
-            logging.error(f"Failed to save chat context to memory: {e}")
-    else:
-        logging.info("No messages to save to memory.")
+# Product knowledge, searched per turn instead of sent in full with the instructions; built in prewarm
+KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", os.path.join(BASE_DIR, "knowledge"))
+knowledge_index = KnowledgeIndex(
+    [KNOWLEDGE_DIR, FAQ_ANSWERS_PATH],
+    index_path=os.getenv("KNOWLEDGE_INDEX_PATH", os.path.join(BASE_DIR, ".knowledge_index.json")),
+)
+KNOWLEDGE_MAX_TOKENS = int(os.getenv("KNOWLEDGE_MAX_TOKENS", "200"))
 
 
 class Assistant(Agent):
-    def __init__(self, chat_ctx: ChatContext | None = None, model_type: str = "google") -> None:
+    def __init__(
+        self, chat_ctx: ChatContext | None = None, model_type: str = "google", state: SessionState | None = None
+    ) -> None:
         # Select the LLM based on model_type
+        llm = build_llm(model_type)
         if model_type == "openai":
-            # Use OpenAI-compatible LLM targeting Ollama's API; pair with Google TTS for audio replies
-            llm = openai.LLM(
-                model=os.getenv("OPENAI_MODEL", "llama3.2:latest"),
-                base_url=os.getenv("OPENAI_BASE_URL", "http://localhost:11434/v1"),
-                api_key=os.getenv("OPENAI_API_KEY", "ollama"),
-            )
+            # OpenAI-compatible LLM targeting Ollama's API; pair with Google TTS for audio replies
             super().__init__(
                 instructions=AGENT_INSTRUCTION,
                 llm=llm,
@@ -90,13 +81,9 @@ class Assistant(Agent):
                 chat_ctx=chat_ctx,
             )
         else:
-            # Google Realtime Model handles its own audio
-            llm = google.beta.realtime.RealtimeModel(
-                voice="Aoede",
-                temperature=0.8,
-            )
+            # Google Realtime Model handles its own audio, and takes the knowledge base once with its instructions
             super().__init__(
-                instructions=AGENT_INSTRUCTION,
+                instructions=packed_instructions(AGENT_INSTRUCTION, KNOWLEDGE_DIR),
                 llm=llm,
                 tools=[
                     get_weather,
@@ -107,271 +94,369 @@ class Assistant(Agent):
             )
         
         self.model_type = model_type
+        self.state = state
+
+    async def on_user_turn_completed(self, turn_ctx: ChatContext, new_message: ChatMessage) -> None:
+        # Recurring questions with an approved answer skip the LLM entirely. The realtime
+        # model speaks in its own voice, so its answers stay with it
+        if self.model_type == "openai":
+            await answer_from_cache(
+                answer_cache,
+                self,
+                new_message,
+                backend=self.model_type,
+                on_user_message=self.state.on_user_message if self.state else None,
+                phrases=phrase_audio,
+            )
+        await add_knowledge(knowledge_index, self, turn_ctx, new_message, max_tokens=KNOWLEDGE_MAX_TOKENS)
 
-server = AgentServer()
 
-@server.rtc_session()
-async def my_agent(ctx: agents.JobContext):
-    global current_assistant, current_user_name, current_memory_str
+async def sync_chat_ctx(source: Agent, target: Agent) -> int:
+    """
+    Copy the conversation items the target assistant has not seen yet.
     
-    # Initialize session first
+    Standby assistants keep their own context between switches, so only the
+    items added while the other backend was active need to be carried over.
+    
+    Returns:
+        The number of items added to the target
+    """
+    known_ids = {item.id for item in target.chat_ctx.items}
+    source_ids = {item.id for item in source.chat_ctx.items}
+    new_items = [item for item in source.chat_ctx.items if item.id not in known_ids]
+    # Turns folded into the summary while the target was on standby are gone from the source too
+    dropped = [item for item in target.chat_ctx.items if item.id not in source_ids]
+    if new_items or dropped:
+        chat_ctx = target.chat_ctx.copy()
+        for item in dropped:
+            chat_ctx.remove(item.id)
+        # The rolling summary keeps its id but its content changes with every compaction
+        for item in source.chat_ctx.items:
+            if item.id == SUMMARY_ID and item.id in known_ids:
+                chat_ctx.remove(item.id)
+                new_items.append(item)
+        chat_ctx.insert(new_items)
+        await target.update_chat_ctx(chat_ctx)
+    return len(new_items)
+
+
+async def prerender_phrases(texts: list[str], timeout: float) -> None:
+    """Render the fixed phrases in the openai assistant's voice, which greets callers and speaks the approved answers."""
+    model = google.TTS()
+    start = time.perf_counter()
+    try:
+        rendered = await asyncio.wait_for(phrase_audio.prerender(texts, model), timeout)
+        logging.info(f"Pre-rendered {rendered} of {len(texts)} stock phrases in {time.perf_counter() - start:.2f}s")
+    except asyncio.TimeoutError:
+        # Finished phrases are already on disk; the rest render on their first use
+        logging.warning(f"Stock phrases not all pre-rendered within {timeout:.0f}s")
+    finally:
+        await model.aclose()
+
+
+def prewarm(proc: JobProcess):
+    """
+    Load the heavy models once per worker process so every session in it can share them.
+    
+    The Silero VAD is read-only after loading, so one instance serves all sessions.
+    The turn detector needs the job's inference executor, so it is created lazily
+    by get_turn_detector() on the first job and then reused. The openai backend's
+    local model is loaded and kept resident from here too, the greeting and
+    approved answers are pre-rendered so the first callers hear them without TTS,
+    and the email outbox starts delivering whatever is already spooled.
+    """
+    rss_before = psutil.Process().memory_info().rss
+    start = time.perf_counter()
+    
+    proc.userdata["vad"] = silero.VAD.load()
+    # Only files changed since the last build are re-indexed
+    knowledge_index.build()
+    
+    load_time = time.perf_counter() - start
+    rss_after = psutil.Process().memory_info().rss
+    logging.info(
+        f"Prewarmed VAD in {load_time:.2f}s "
+        f"(+{(rss_after - rss_before) / 1024 / 1024:.1f} MB, RSS {rss_after / 1024 / 1024:.1f} MB)"
+    )
+    
+    # Workers share the rendered audio on disk, so only the first start after a voice or text change synthesizes
+    try:
+        asyncio.run(prerender_phrases([GREETING, *answer_cache.answers], float(os.getenv("PHRASE_PRERENDER_TIMEOUT", "5"))))
+    except Exception as e:
+        logging.warning(f"Could not pre-render stock phrases: {e}")
+    
+    # Deliver mail spooled before this process started, including claims a crashed process left behind
+    try:
+        get_outbox()
+    except Exception as e:
+        logging.warning(f"Could not start the email outbox: {e}")
+    
+    # Load the local model and cache the instruction prefix in the background, then keep it resident
+    proc.userdata["model_warmer"] = start_local_model_warmer(AGENT_INSTRUCTION)
+
+
+def get_turn_detector(proc: JobProcess) -> MultilingualModel:
+    """Return the process-wide turn detector, creating it on the first job."""
+    turn_detection = proc.userdata.get("turn_detection")
+    if turn_detection is None:
+        start = time.perf_counter()
+        turn_detection = MultilingualModel()
+        proc.userdata["turn_detection"] = turn_detection
+        logging.info(
+            f"Loaded turn detector in {time.perf_counter() - start:.2f}s "
+            f"(RSS {psutil.Process().memory_info().rss / 1024 / 1024:.1f} MB)"
+        )
+    return turn_detection
+
+
+def participant_user_name(participant: rtc.RemoteParticipant) -> str | None:
+    """Return the caller's name if the frontend provided one in the participant's attributes or display name."""
+    name = participant.attributes.get(os.getenv("MEMORY_USER_ATTRIBUTE", "user_name"))
+    # The web frontend joins every caller with the placeholder name "user"
+    if not name and participant.name and participant.name.lower() not in ("user", participant.identity.lower()):
+        name = participant.name
+    return name.strip() if name else None
+
+
+# Report load from what our sessions actually cost, and pass on jobs that would not fit
+worker_load = WorkerLoad(threshold=float(os.getenv("WORKER_LOAD_THRESHOLD", "0.75")))
+
+server = AgentServer(
+    setup_fnc=prewarm,
+    load_fnc=worker_load,
+    load_threshold=worker_load.threshold,
+    # Job processes share metrics through PROMETHEUS_MULTIPROC_DIR when it is set
+    prometheus_port=int(os.getenv("PROMETHEUS_PORT")) if os.getenv("PROMETHEUS_PORT") else None,
+    prometheus_multiproc_dir=os.getenv("PROMETHEUS_MULTIPROC_DIR") or None,
+)
+
+@server.rtc_session(on_request=worker_load.on_request)
+async def my_agent(ctx: agents.JobContext):
+    # Initialize session first, reusing the models prewarmed for this process
     session = AgentSession(
         stt="assemblyai/universal-streaming:en",
         tts="cartesia/sonic-3:9626c31c-bec5-4cca-baa8-f8ba9e84c8bc",
-        vad=silero.VAD.load(),
-        turn_detection=MultilingualModel(),
+        vad=ctx.proc.userdata["vad"],
+        turn_detection=get_turn_detector(ctx.proc),
     )
     
+    # Opt-in (LOOP_WATCHDOG_MS): report anything that blocks the loop every session in this process shares
+    start_watchdog(tools=[get_weather, search_web, send_email])
+    
+    async def release_watchdog():
+        stop_watchdog()
+    
+    # Registered straight away, so the watchdog is released even if the setup below raises
+    ctx.add_shutdown_callback(release_watchdog)
+    
     # Wait for participant to connect
     await ctx.connect()
     
-    # Variables to track user name and memories
-    user_name = None
-    memory_str = ''
-    memories_loaded = False
+    # All per-call state lives here, so concurrent jobs in this worker never share it
+    state = registry.create(ctx.job.id, ctx.room.name)
+    report_session(state.job_id, video=False)
     
-    # Track video state
-    video_enabled = False
-    current_model_type = "openai"  # Start with OpenAI (no video by default)
+    # In hot-standby mode both backends are built once and kept warm for the whole
+    # session, so a video toggle only swaps the active assistant. A backend that
+    # can't be built (no GOOGLE_API_KEY on an Ollama-only deployment) is left out,
+    # and a switch to it rebuilds as without hot standby
+    hot_standby = os.getenv("HOT_STANDBY_BACKENDS", "false").lower() == "true"
+    standby_assistants = {}
+    if hot_standby:
+        for model_type in ("openai", "google"):
+            try:
+                standby_assistants[model_type] = Assistant(chat_ctx=ChatContext(), model_type=model_type, state=state)
+            except Exception as e:
+                logging.warning(f"No hot standby for the {model_type} backend: {e}")
+                continue
+            prewarm_llm(standby_assistants[model_type].llm)
+    
+    # Start with OpenAI (no video by default)
+    state.model_type = "openai"
+    state.assistant = standby_assistants.get("openai") or Assistant(chat_ctx=ChatContext(), model_type="openai", state=state)
     
-    # Create assistant with empty ChatContext - start with OpenAI
-    assistant = Assistant(chat_ctx=ChatContext(), model_type="openai")
+    # Memory, context budget and latency metrics for this call; summaries come from the local model
+    identify_user = attach_conversation(session, state, mem0_client, summarizer=build_llm("openai"))
     
-    # Store globally for signal handler
-    current_assistant = assistant
+    # If the frontend already told us who is calling, start fetching memories in
+    # parallel with the session start and the greeting instead of waiting for the name
+    def on_participant_connected(participant: rtc.RemoteParticipant):
+        user_name = participant_user_name(participant)
+        if user_name and not state.user_name:
+            identify_user(user_name)
+    ctx.room.on("participant_connected", on_participant_connected)
+    for participant in ctx.room.remote_participants.values():
+        on_participant_connected(participant)
+
+    # Noise cancellation follows the line's noise and the worker's CPU headroom, unless fixed to BVC
+    if os.getenv("ADAPTIVE_NOISE_CANCELLATION", "true").lower() == "true":
+        state.audio_frontend = AdaptiveNoiseCancellation(session)
+        select_noise_cancellation = state.audio_frontend.select
+    else:
+        select_noise_cancellation = lambda params: noise_cancellation.BVCTelephony() if params.participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP else noise_cancellation.BVC()
 
     await session.start(
         room=ctx.room,
-        agent=assistant,
+        agent=state.assistant,
         room_options=room_io.RoomOptions(
             video_input=True,
             audio_input=room_io.AudioInputOptions(
-                noise_cancellation=lambda params: noise_cancellation.BVCTelephony() if params.participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP else noise_cancellation.BVC(),
+                noise_cancellation=select_noise_cancellation,
             ),
         ),
     )
+    if state.audio_frontend:
+        state.audio_frontend.attach()
+
+    # Camera frames reach the realtime model only when the scene changes or the user is talking
+    if session.input.video is not None:
+        state.video_sampler = VideoSampler(
+            session.input.video,
+            session,
+            max_fps=float(os.getenv("VIDEO_MAX_FPS", "1")),
+            burst_fps=float(os.getenv("VIDEO_BURST_FPS", "2")),
+            change_threshold=float(os.getenv("VIDEO_CHANGE_THRESHOLD", "0.04")),
+        )
+        session.input.video = state.video_sampler
     
-    # Ask for user's name first
-    await session.generate_reply(
-        instructions="""Greet the user warmly and ask for their name in a friendly, conversational way. 
-        For example: 'Hello! Welcome to Steward Bank. I'm Batsi, your virtual assistant. May I have your name please?' 
-        Once they tell you their name, acknowledge it and proceed to help them with their banking needs."""
-    )
+    # Ask for user's name first. The greeting is the same for every caller, so it plays
+    # from pre-rendered audio; the first call renders it while speaking it with live TTS
+    await phrase_audio.say(session, GREETING, state.assistant.tts or session.tts, phrase="greeting")
+    
+    # Switch models when a participant's camera is published, unpublished, muted or unmuted.
+    # Room events arrive in bursts (publish + unmute), so evaluate once they settle.
+    switch_debounce = float(os.getenv("VIDEO_SWITCH_DEBOUNCE", "0.15"))
+    video_toggled_at = None
+    video_switch_task = None
     
-    # Monitor for user's name in the chat and load memories
-    original_chat_ctx_items = []
+    def is_video_enabled() -> bool:
+        for participant in ctx.room.remote_participants.values():
+            for track_pub in participant.track_publications.values():
+                if track_pub.source == rtc.TrackSource.SOURCE_CAMERA and not track_pub.muted:
+                    return True
+        return False
     
-    async def check_and_load_memories():
-        nonlocal user_name, memory_str, memories_loaded
+    async def apply_video_state():
+        nonlocal video_toggled_at, switched_at
         
-        if memories_loaded or not hasattr(assistant, 'chat_ctx') or not assistant.chat_ctx:
-            return
+        await asyncio.sleep(switch_debounce)
+        try:
+            new_video_enabled = is_video_enabled()
+            if new_video_enabled == state.video_enabled:
+                video_toggled_at = None
+                return
             
-        # Look for the first user message after the greeting
-        current_items = list(assistant.chat_ctx.items)
-        
-        # Find new user messages
-        for item in current_items:
-            if item.role == "user" and item not in original_chat_ctx_items:
-                # This is the user's response with their name
-                content = item.content.strip() if isinstance(item.content, str) else ''.join(item.content)
-                
-                # Extract just the name from common patterns
-                # e.g., "My name is Gregory" -> "Gregory"
-                # e.g., "I'm John" -> "John"  
-                # e.g., "Gregory" -> "Gregory"
-                import re
-                name_patterns = [
-                    r"(?:my name is|i'm|i am|it's|name is|this is|call me)\s+([a-zA-Z]+)",
-                    r"^([a-zA-Z]+)$",  # Just a single name
-                    r"([a-zA-Z]+)\s*$"  # Name at the end
-                ]
-                
-                extracted_name = content
-                for pattern in name_patterns:
-                    match = re.search(pattern, content, re.IGNORECASE)
-                    if match:
-                        extracted_name = match.group(1).strip()
-                        break
-                
-                user_name = extracted_name
-                logging.info(f"User identified as: {user_name}")
-                memories_loaded = True
-                
-                # Update global variables
-                current_user_name = user_name
-                
-                # Now retrieve memories for this user
-                try:
-                    results = await mem0_client.get_all(user_id=user_name)
+            state.video_enabled = new_video_enabled
+            report_session(state.job_id, video=state.video_enabled)
+            new_model_type = "google" if state.video_enabled else "openai"
             
-                    if results:
-                        memories = [
-                            {
-                                "memory": result["memory"],
-                                "updated_at": result.get("updated_at", "")
-                            }
-                            for result in results
-                        ]
-                        memory_str = json.dumps(memories)
-                        current_memory_str = memory_str
-                        logging.info(f"Retrieved {len(results)} memories for {user_name}")
-                        logging.info(f"Memory contents: {memory_str}")
-                        
-                        # Format memories in a natural, readable way for the AI
-                        memory_lines = [f"- {result['memory']}" for result in results]
-                        memory_content = f"""Previous conversation memories about {user_name}:
-
-{chr(10).join(memory_lines)}
-
-Use these memories to personalize your responses and remember past conversations with {user_name}."""
-                        
-                        # Add memories to the chat context using the proper API
-                        if hasattr(assistant, 'chat_ctx') and assistant.chat_ctx:
-                            # Create a copy and add the memory message
-                            ctx_copy = assistant.chat_ctx.copy()
-                            ctx_copy.add_message(
-                                role="system",
-                                content=memory_content
-                            )
-                            # Update the agent's chat context (MUST await this!)
-                            await assistant.update_chat_ctx(ctx_copy)
-                            logging.info(f"Memories loaded into chat context: {memory_content}")
-                    else:
-                        logging.info(f"No existing memories found for {user_name}")
-                except Exception as e:
-                    logging.error(f"Failed to retrieve memories for {user_name}: {e}")
-                break
-    
-    # Periodically check for user's name
-    import asyncio
-    async def memory_loader_task():
-        while not memories_loaded:
-            await check_and_load_memories()
-            await asyncio.sleep(1)  # Check every second
-        logging.info("Memory loader task completed")
-    
-    # Start the memory loader task
-    asyncio.create_task(memory_loader_task())
-    
-    # Monitor video track state and switch models
-    async def video_monitor_task():
-        nonlocal assistant, video_enabled, current_model_type
-        
-        while True:
-            try:
-                # Check for local participant's video track
-                local_participant = ctx.room.local_participant
-                video_track = None
+            if new_model_type != state.model_type:
+                logging.info(f"Video state changed: {state.video_enabled}. Switching from {state.model_type} to {new_model_type}")
+                state.model_type = new_model_type
                 
-                for track_pub in local_participant.track_publications.values():
-                    if track_pub.source == rtc.TrackSource.SOURCE_CAMERA:
-                        video_track = track_pub.track
-                        break
+                assistant = state.assistant
+                if new_model_type in standby_assistants:
+                    # Swap to the warm assistant and bring it up to date with the latest turns
+                    target = standby_assistants[new_model_type]
+                    synced = await sync_chat_ctx(assistant, target)
+                    logging.info(f"Synced {synced} new chat items to the {new_model_type} assistant")
+                    state.assistant = target
+                else:
+                    # Create new assistant with the appropriate model, carrying the conversation over
+                    old_chat_ctx = assistant.chat_ctx.copy() if hasattr(assistant, 'chat_ctx') and assistant.chat_ctx else ChatContext()
+                    state.assistant = Assistant(chat_ctx=old_chat_ctx, model_type=new_model_type, state=state)
                 
-                # Determine if video is currently enabled
-                new_video_enabled = video_track is not None and not video_track.muted
+                # Update the session with the new assistant
+                session.update_agent(state.assistant)
                 
-                # If video state changed, switch models
-                if new_video_enabled != video_enabled:
-                    video_enabled = new_video_enabled
-                    new_model_type = "google" if video_enabled else "openai"
-                    
-                    if new_model_type != current_model_type:
-                        logging.info(f"Video state changed: {video_enabled}. Switching from {current_model_type} to {new_model_type}")
-                        current_model_type = new_model_type
-                        
-                        # Stop current session and create new assistant with different model
-                        old_chat_ctx = assistant.chat_ctx.copy() if hasattr(assistant, 'chat_ctx') and assistant.chat_ctx else ChatContext()
-                        
-                        # Create new assistant with the appropriate model
-                        assistant = Assistant(chat_ctx=old_chat_ctx, model_type=new_model_type)
-                        current_assistant = assistant
-                        
-                        # Update the session with the new assistant
-                        session._agent = assistant
-                        
-                        logging.info(f"Switched to {new_model_type.upper()} model successfully")
-                        
-            except Exception as e:
-                logging.error(f"Error in video monitor task: {e}")
-            
-            await asyncio.sleep(0.5)  # Check every 500ms
+                switched_at = time.perf_counter()
+                switch_latency = switched_at - video_toggled_at
+                logging.info(
+                    f"Switched to {new_model_type.upper()} model successfully "
+                    f"(video toggled -> new model active: {switch_latency * 1000:.0f} ms)"
+                )
+        except Exception as e:
+            logging.error(f"Error switching models on video change: {e}")
+        video_toggled_at = None
     
-    # Start the video monitor task
-    asyncio.create_task(video_monitor_task())
+    def on_video_event(publication: rtc.TrackPublication):
+        nonlocal video_toggled_at, video_switch_task
+        if publication.source != rtc.TrackSource.SOURCE_CAMERA:
+            return
+        
+        # Keep the time of the first event in a burst so the latency covers the debounce too
+        if video_toggled_at is None:
+            video_toggled_at = time.perf_counter()
+        if video_switch_task and not video_switch_task.done():
+            video_switch_task.cancel()
+        video_switch_task = asyncio.create_task(apply_video_state(), name="video_switch")
+    
+    # Benchmark the first generation on the new backend: switch -> first token
+    switched_at = None
+    
+    def on_metrics_collected(ev):
+        nonlocal switched_at
+        if not isinstance(ev.metrics, (LLMMetrics, RealtimeModelMetrics)):
+            return
+        prompt_tokens = ev.metrics.prompt_tokens if isinstance(ev.metrics, LLMMetrics) else ev.metrics.input_tokens
+        logging.info(
+            f"Turn prompt on {state.model_type}: {prompt_tokens} tokens "
+            f"(chat context ~{state.compactor.tokens()}/{state.compactor.max_tokens})"
+        )
+        if switched_at is None:
+            return
+        since_switch = time.perf_counter() - switched_at
+        switched_at = None
+        logging.info(
+            f"First {state.model_type} generation after switch "
+            f"({'hot-standby' if state.model_type in standby_assistants else 'rebuild'}): ttft {ev.metrics.ttft * 1000:.0f} ms, "
+            f"{since_switch * 1000:.0f} ms since switch"
+        )
+    session.on("metrics_collected", on_metrics_collected)
+    
+    ctx.room.on("track_published", lambda publication, participant: on_video_event(publication))
+    ctx.room.on("track_unpublished", lambda publication, participant: on_video_event(publication))
+    ctx.room.on("track_muted", lambda participant, publication: on_video_event(publication))
+    ctx.room.on("track_unmuted", lambda participant, publication: on_video_event(publication))
+    
+    # A participant may have joined with the camera already on
+    if is_video_enabled():
+        video_toggled_at = time.perf_counter()
+        video_switch_task = asyncio.create_task(apply_video_state(), name="video_switch")
+    
+    # Save the conversation when the user disconnects or the session ends; the
+    # flusher makes repeated triggers cheap, so every path can simply ask for a flush
+    async def save_conversation(reason: str):
+        try:
+            await state.flusher.flush(reason)
+        except Exception as e:
+            logging.error(f"Error saving memories ({reason}): {e}")
     
-    # Set up shutdown hook to save conversation when user disconnects
     def on_participant_disconnected(participant: rtc.RemoteParticipant):
         logging.info(f"Participant disconnected: {participant.identity or participant.sid}")
-        async def _save():
-            if user_name:
-                logging.info(f"User {user_name} disconnected, saving conversation to memory...")
-                try:
-                    if hasattr(assistant, 'chat_ctx') and assistant.chat_ctx:
-                        await shutdown_hook(assistant.chat_ctx, mem0_client, user_name, memory_str)
-                        logging.info(f"Successfully saved conversation for {user_name}")
-                    else:
-                        logging.warning("Assistant doesn't have chat_ctx attribute")
-                except Exception as e:
-                    logging.error(f"Error saving memories: {e}")
-            else:
-                logging.info("User disconnected before providing name, no memories to save")
-        asyncio.create_task(_save())
+        asyncio.create_task(save_conversation("participant disconnected"), name="save_conversation")
     ctx.room.on("participant_disconnected", on_participant_disconnected)
 
     # Handle cleanup on session end (for console mode)
     def on_room_disconnected():
         logging.info("Room disconnected, attempting to save memories...")
-        async def _save():
-            if user_name:
-                try:
-                    if hasattr(assistant, 'chat_ctx') and assistant.chat_ctx:
-                        await shutdown_hook(assistant.chat_ctx, mem0_client, user_name, memory_str)
-                        logging.info(f"Successfully saved conversation for {user_name} on room disconnect")
-                except Exception as e:
-                    logging.error(f"Error saving memories on room disconnect: {e}")
-        asyncio.create_task(_save())
+        asyncio.create_task(save_conversation("room disconnected"), name="save_conversation")
     ctx.room.on("disconnected", on_room_disconnected)
     
-    # Monitor the session state and save when it closes
-    async def session_monitor():
-        try:
-            # Wait for the session to be closed
-            while session._agent is not None:
-                await asyncio.sleep(1)
-        except Exception:
-            pass
-        
-        # Session is closing, save conversation
-        logging.info("Session monitor detected closure, saving conversation...")
-        if user_name:
-            try:
-                if hasattr(assistant, 'chat_ctx') and assistant.chat_ctx:
-                    await shutdown_hook(assistant.chat_ctx, mem0_client, user_name, memory_str)
-                    logging.info(f"Successfully saved conversation for {user_name} via monitor")
-            except Exception as e:
-                logging.error(f"Error saving memories via monitor: {e}")
-    
-    # Start session monitor
-    asyncio.create_task(session_monitor())
+    # Save when the session closes
+    def on_session_close(ev):
+        logging.info("Session closed, saving conversation...")
+        asyncio.create_task(save_conversation("session closed"), name="save_conversation")
+    session.on("close", on_session_close)
     
     # Register cleanup callback for when context shuts down
     async def cleanup_callback():
         logging.info("Context shutdown callback triggered, saving conversation...")
-        if user_name:
-            try:
-                if hasattr(assistant, 'chat_ctx') and assistant.chat_ctx:
-                    await shutdown_hook(assistant.chat_ctx, mem0_client, user_name, memory_str)
-                    logging.info(f"Successfully saved conversation for {user_name} via cleanup callback")
-                else:
-                    logging.warning("Assistant has no chat_ctx in cleanup")
-            except Exception as e:
-                logging.error(f"Error saving memories in cleanup: {e}")
-                import traceback
-                traceback.print_exc()
-        else:
-            logging.info("No user name available in cleanup callback")
+        try:
+            logging.info(f"Session latency (ms): {await close_conversation(state)}")
+        finally:
+            registry.remove(state.job_id)
+            clear_session(state.job_id)
     
     # Add the cleanup callback
     ctx.add_shutdown_callback(cleanup_callback)
@@ -379,28 +464,28 @@ Use these memories to personalize your responses and remember past conversations
 
 # Signal handler for graceful shutdown
 def signal_handler(sig, frame):
-    logging.info(f"Received signal {sig}, saving conversation...")
-    logging.info(f"Current user: {current_user_name}, Assistant exists: {current_assistant is not None}")
-    if current_user_name and current_assistant:
+    sessions = registry.sessions()
+    logging.info(f"Received signal {sig}, saving {len(sessions)} active conversations...")
+    logging.info(f"Worker latency (ms): {process_stats.summary()}")
+    logging.info(f"FAQ cache: {answer_cache.summary()}")
+    pending = [state for state in sessions if state.user_name and state.flusher]
+    if pending:
         try:
-            logging.info("Attempting to save via signal handler...")
             # Run the async shutdown in a new event loop
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-            if hasattr(current_assistant, 'chat_ctx') and current_assistant.chat_ctx:
-                loop.run_until_complete(
-                    shutdown_hook(current_assistant.chat_ctx, mem0_client, current_user_name, current_memory_str)
-                )
-                logging.info(f"Successfully saved conversation for {current_user_name} on exit")
-            else:
-                logging.warning("Assistant has no chat_ctx")
+            loop.run_until_complete(asyncio.gather(
+                *(state.flusher.flush("signal") for state in pending),
+                return_exceptions=True,
+            ))
             loop.close()
+            logging.info(f"Saved conversations for {', '.join(state.user_name for state in pending)} on exit")
         except Exception as e:
             logging.error(f"Error saving memories on exit: {e}")
             import traceback
             traceback.print_exc()
     else:
-        logging.info(f"No active conversation to save (user_name: {current_user_name}, assistant: {current_assistant is not None})")
+        logging.info("No active conversation to save")
     exit(0)
 
 
@@ -0,0 +1,284 @@
+"""
+Semantic cache of approved answers to recurring banking questions, matched on CPU.
+"""
+import json
+import logging
+import math
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import prometheus_client
+from livekit.agents import Agent, ChatMessage, StopResponse
+
+from phrase_audio import PhraseAudioCache
+from turn_metrics import process_stats
+
+LOOKUPS = prometheus_client.Counter(
+    "faq_cache_lookups_total",
+    "Questions checked against the approved answers, by outcome (hit or miss)",
+    ["outcome"],
+)
+SAVED_SECONDS = prometheus_client.Histogram(
+    "faq_cache_saved_seconds",
+    "LLM time to first token skipped by answering from the cache",
+    ["backend"],
+    buckets=(0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0),
+)
+
+# Openers and politeness that change nothing about what is being asked
+FILLER = re.compile(
+    r"^(?:(?:hi|hello|hey|good (?:morning|afternoon|evening)|batsi|okay|ok|so|um|uh|please|"
+    r"can you tell me|could you tell me|i would like to know|i want to know|i wanted to ask|"
+    r"tell me)\b[\s,]*)+"
+)
+STOP_WORDS = {
+    "the", "a", "an", "to", "of", "i", "me", "my", "you", "your", "is", "are", "do", "does",
+    "can", "could", "would", "will", "please", "it", "and", "or", "for", "on", "in", "at", "with", "be",
+    "what", "how", "when", "where", "why", "which", "who",
+}
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, without punctuation, contractions, openers or politeness."""
+    text = re.sub(r"'s\b", " is", text.lower().replace("\u2019", "'"))
+    text = re.sub(r"n't\b", " not", text)
+    text = " ".join(re.findall(r"[\w*#]+", text))
+    return FILLER.sub("", text).strip()
+
+
+class HashingEmbedder:
+    """
+    Dense vectors for short questions without a model download or GPU.
+
+    Words, word pairs and character 4-grams are hashed into dim buckets and the
+    vector is L2-normalised, so cosine similarity is a dot product. Words are
+    weighted by how rare they are among the example questions (fit()), so
+    "block" counts for more than "card", and words no example uses count the
+    most, which keeps off-topic questions away from the threshold. Character
+    n-grams let "blocking" match "block" and survive small transcription errors.
+    """
+
+    def __init__(self, dim: int = 2048) -> None:
+        self.dim = dim
+        self._idf: dict[str, float] = {}
+        self._unseen_idf = 1.0
+
+    def fit(self, texts: list[str]) -> None:
+        """Weight words by inverse document frequency over texts."""
+        counts: dict[str, int] = {}
+        for text in texts:
+            for word in set(text.split()):
+                counts[word] = counts.get(word, 0) + 1
+        self._unseen_idf = math.log(len(texts) + 1) + 1
+        self._idf = {word: math.log((len(texts) + 1) / (count + 1)) + 1 for word, count in counts.items()}
+
+    @staticmethod
+    def words(text: str) -> list[str]:
+        return [word for word in text.split() if word not in STOP_WORDS]
+
+    def _features(self, text: str) -> list[tuple[str, float]]:
+        words = self.words(text)
+        weights = [self._idf.get(word, self._unseen_idf) for word in words]
+        features = [(f"w:{word}", weight) for word, weight in zip(words, weights)]
+        features += [
+            (f"b:{a} {b}", 0.35 * (wa + wb)) for (a, wa), (b, wb) in zip(zip(words, weights), zip(words[1:], weights[1:]))
+        ]
+        for word in words:
+            padded = f"<{word}>"
+            features += [(f"c:{padded[i:i + 4]}", 0.25) for i in range(max(1, len(padded) - 3))]
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            h = zlib.crc32(feature.encode())
+            # The sign bit keeps colliding features from always adding up
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+@dataclass
+class CachedAnswer:
+    entry_id: str
+    answer: str
+    score: float
+    lookup_seconds: float
+
+
+class AnswerCache:
+    """
+    Approved answers to frequent questions, found by similarity to example questions.
+
+    Every example question is normalised and embedded into one matrix, so a
+    lookup is a single matrix-vector product. A question is answered from the
+    cache only when its best match scores at least threshold and the two share
+    at least min_shared_words words, so a short question like "what time is
+    it" cannot ride on one common word of "what time do you close". Entries expire
+    ttl seconds after they were loaded, after which the answers file is read
+    again, so edits to approved answers reach running workers without a restart;
+    invalidate() drops one entry or all of them straight away.
+    """
+
+    def __init__(
+        self,
+        embedder: HashingEmbedder | None = None,
+        threshold: float = 0.55,
+        ttl: float = 3600.0,
+        min_shared_words: int = 2,
+    ) -> None:
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.min_shared_words = min_shared_words
+        self.ttl = ttl
+        self.path: str | None = None
+        self.hits = 0
+        self.misses = 0
+        self.saved: list[float] = []
+        self._answers: dict[str, tuple[str, float]] = {}
+        self._questions: dict[str, list[str]] = {}
+        self._row_ids: list[str] = []
+        self._row_questions: list[str] = []
+        self._matrix = np.zeros((0, self.embedder.dim), dtype=np.float32)
+
+    def _rebuild(self) -> None:
+        # Word weights depend on every example question, so the matrix is rebuilt as a whole
+        rows = [(entry_id, question) for entry_id, questions in self._questions.items() for question in questions]
+        self.embedder.fit([question for _, question in rows])
+        self._row_ids = [entry_id for entry_id, _ in rows]
+        self._row_questions = [question for _, question in rows]
+        self._matrix = np.array(
+            [self.embedder.embed(question) for _, question in rows], dtype=np.float32
+        ).reshape(len(rows), self.embedder.dim)
+
+    def add(self, entry_id: str, questions: list[str], answer: str, ttl: float | None = None) -> None:
+        """Add or replace an approved answer and the questions it answers."""
+        self._questions[entry_id] = [normalize_question(question) for question in questions]
+        self._answers[entry_id] = (answer, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._rebuild()
+
+    def add_many(self, entries: list[dict]) -> None:
+        for entry in entries:
+            self._questions[entry["id"]] = [normalize_question(question) for question in entry["questions"]]
+            self._answers[entry["id"]] = (entry["answer"], time.monotonic() + self.ttl)
+        self._rebuild()
+
+    @property
+    def answers(self) -> list[str]:
+        """The text of every approved answer, as it is spoken."""
+        return [answer for answer, _ in self._answers.values()]
+
+    def invalidate(self, entry_id: str | None = None) -> None:
+        """Stop serving one answer, or every answer when no id is given."""
+        if entry_id is None:
+            self._answers.clear()
+            self._questions.clear()
+        elif self._answers.pop(entry_id, None) is None:
+            return
+        else:
+            del self._questions[entry_id]
+        self._rebuild()
+
+    def load(self, path: str) -> int:
+        """Replace the cache with the approved answers in a JSON file; returns how many were loaded."""
+        with open(path) as f:
+            entries = json.load(f)
+        self.path = path
+        self._answers.clear()
+        self._questions.clear()
+        self.add_many(entries)
+        logging.info(f"Loaded {len(entries)} approved answers ({len(self._row_ids)} example questions) from {path}")
+        return len(entries)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        expired = [entry_id for entry_id, (_, expires_at) in self._answers.items() if expires_at < now]
+        if not expired:
+            return
+        if self.path:
+            try:
+                self.load(self.path)
+                return
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Could not reload approved answers from {self.path}: {e}")
+        for entry_id in expired:
+            self.invalidate(entry_id)
+
+    def lookup(self, question: str) -> CachedAnswer | None:
+        """The approved answer for question if one matches closely enough."""
+        start = time.perf_counter()
+        self._expire()
+        normalized = normalize_question(question)
+        if not normalized or not self._row_ids:
+            return None
+        scores = self._matrix @ self.embedder.embed(normalized)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        shared = set(self.embedder.words(normalized)) & set(self.embedder.words(self._row_questions[best]))
+        if score < self.threshold or len(shared) < self.min_shared_words:
+            self.misses += 1
+            LOOKUPS.labels(outcome="miss").inc()
+            return None
+        self.hits += 1
+        LOOKUPS.labels(outcome="hit").inc()
+        entry_id = self._row_ids[best]
+        return CachedAnswer(entry_id, self._answers[entry_id][0], score, time.perf_counter() - start)
+
+    def record_saved(self, backend: str, seconds: float) -> None:
+        self.saved.append(seconds)
+        SAVED_SECONDS.labels(backend=backend).observe(seconds)
+
+    def summary(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 2) if lookups else None,
+            "saved_ms": round(sum(self.saved) * 1000),
+        }
+
+
+async def answer_from_cache(
+    cache: AnswerCache,
+    agent: Agent,
+    new_message: ChatMessage,
+    backend: str,
+    on_user_message: Callable[[str], None] | None = None,
+    phrases: PhraseAudioCache | None = None,
+) -> None:
+    """
+    Speak the approved answer to the user's turn and skip the LLM, if there is one.
+
+    Call from Agent.on_user_turn_completed; raises StopResponse on a hit. A
+    stopped turn is never added to the conversation, so no conversation_item_added
+    event fires for it: on a hit the question is put back into the agent's
+    context here, and on_user_message (SessionState.on_user_message) runs the
+    per-turn bookkeeping the event would have. With phrases, the answer plays
+    from its pre-rendered audio when it has been rendered.
+    """
+    hit = cache.lookup(new_message.text_content or "")
+    if hit is None:
+        return
+    chat_ctx = agent.chat_ctx.copy()
+    chat_ctx.insert(new_message)
+    await agent.update_chat_ctx(chat_ctx)
+    if on_user_message is not None and new_message.text_content:
+        on_user_message(new_message.text_content)
+    if phrases is not None:
+        phrases.say(agent.session, hit.answer, agent.tts or agent.session.tts, phrase="faq")
+    else:
+        agent.session.say(hit.answer)
+
+    # What the caller would have waited for the first token, going by this worker's recent turns
+    saved = process_stats.percentile("llm_ttft", backend, 0.5)
+    if saved is not None:
+        cache.record_saved(backend, saved)
+    logging.info(
+        f"Answered from the FAQ cache ({hit.entry_id}, score {hit.score:.2f}) in {hit.lookup_seconds * 1000:.1f} ms"
+        + (f", ~{saved * 1000:.0f} ms of LLM time saved" if saved is not None else "")
+    )
+    raise StopResponse()
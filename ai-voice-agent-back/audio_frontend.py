@@ -0,0 +1,270 @@
+"""
+Adaptive noise cancellation: full BVC, a light local filter or bypass, chosen per
+participant from input noise and CPU headroom.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+import numpy as np
+import prometheus_client
+import psutil
+from livekit import rtc
+from livekit.agents import AgentSession
+from livekit.agents.voice.room_io.types import NoiseCancellationParams
+from livekit.plugins import noise_cancellation
+
+# Most expensive and most effective first
+TIERS = ("bvc", "light", "bypass")
+
+TIER_SECONDS = prometheus_client.Counter(
+    "audio_frontend_tier_seconds_total",
+    "Call time spent in each noise-cancellation tier",
+    ["tier"],
+)
+TIER_CPU_SECONDS = prometheus_client.Counter(
+    "audio_frontend_tier_cpu_seconds_total",
+    "CPU time the job process used while in each noise-cancellation tier",
+    ["tier"],
+)
+TIER_SWITCHES = prometheus_client.Counter(
+    "audio_frontend_tier_switches_total",
+    "Noise-cancellation tier changes, by reason (noise or cpu)",
+    ["from_tier", "to_tier", "reason"],
+)
+TIER_QUALITY_EVENTS = prometheus_client.Counter(
+    "audio_frontend_quality_events_total",
+    "Signs of noise getting through, by tier: false interruptions and speech with no transcript",
+    ["tier", "event"],
+)
+
+
+class NoiseMeter:
+    """Noise floor of the raw input: a low percentile of recent 10 ms levels, in dBFS."""
+
+    def __init__(self, window_seconds: float = 10.0, q: float = 0.1) -> None:
+        self.q = q
+        self._levels: deque[float] = deque(maxlen=int(window_seconds * 100))
+
+    def update(self, frame: rtc.AudioFrame) -> None:
+        samples = np.frombuffer(frame.data, dtype=np.int16).astype(np.float32)
+        size = frame.sample_rate // 100 * frame.num_channels
+        for start in range(0, len(samples) - size + 1, size):
+            rms = np.sqrt(np.mean(np.square(samples[start:start + size]))) / 32768
+            self._levels.append(20 * np.log10(max(rms, 1e-6)))
+
+    @property
+    def floor_dbfs(self) -> float | None:
+        """None until the window is full."""
+        if len(self._levels) < self._levels.maxlen:
+            return None
+        return float(np.quantile(np.fromiter(self._levels, dtype=np.float32), self.q))
+
+
+class MeteredFilter(rtc.FrameProcessor[rtc.AudioFrame]):
+    """
+    Measures the raw input, then optionally runs WebRTC noise suppression and a
+    high-pass filter on it: the light tier, at a fraction of BVC's cost.
+    """
+
+    def __init__(self, meter: NoiseMeter, suppress: bool) -> None:
+        self._meter = meter
+        self._enabled = True
+        self._apm = rtc.AudioProcessingModule(noise_suppression=True, high_pass_filter=True) if suppress else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value: bool) -> None:
+        self._enabled = value
+
+    def _process(self, frame: rtc.AudioFrame) -> rtc.AudioFrame:
+        self._meter.update(frame)
+        if not self._enabled or self._apm is None:
+            return frame
+        # The audio processing module takes exactly 10 ms at a time
+        samples = frame.sample_rate // 100
+        step = samples * frame.num_channels * 2
+        data = bytearray(frame.data.cast("B"))
+        for offset in range(0, len(data) - step + 1, step):
+            chunk = rtc.AudioFrame(data[offset:offset + step], frame.sample_rate, frame.num_channels, samples)
+            self._apm.process_stream(chunk)
+            data[offset:offset + step] = chunk.data.cast("B")
+        return rtc.AudioFrame(data, frame.sample_rate, frame.num_channels, frame.samples_per_channel)
+
+    def _close(self) -> None:
+        self._apm = None
+
+
+class AdaptiveNoiseCancellation:
+    """
+    Picks the noise-cancellation tier for the linked participant and changes it at turn boundaries.
+
+    Pass select as RoomOptions' noise_cancellation and call attach() once the
+    session has started. Calls start on full BVC, so the greeting and the
+    caller's first answers get the best filter. Once the meter has a full
+    window of the raw input, whenever the agent changes state while the user
+    is not speaking, the tier is chosen again:
+
+    - bypass when the worker's CPU is above cpu_shed, or the line is quieter than quiet_dbfs
+    - full BVC (BVCTelephony for SIP callers) when the noise floor is above noisy_dbfs
+      and the CPU is below cpu_bvc_max
+    - the light filter otherwise
+
+    A change rebuilds the participant's audio stream with the new tier, at most
+    once every min_dwell seconds; only CPU pressure moves it sooner. Native BVC
+    runs before any Python code sees the audio, so on that tier the meter reads
+    a second, unfiltered stream of the participant's microphone.
+
+    For each tier, the class records call time, the job process's CPU time, and
+    quality events: false interruptions, and speech that produced no transcript.
+    """
+
+    def __init__(
+        self,
+        session: AgentSession,
+        quiet_dbfs: float = -62.0,
+        noisy_dbfs: float = -48.0,
+        cpu_bvc_max: float = 0.7,
+        cpu_shed: float = 0.9,
+        min_dwell: float = 15.0,
+    ) -> None:
+        self.session = session
+        self.quiet_dbfs = quiet_dbfs
+        self.noisy_dbfs = noisy_dbfs
+        self.cpu_bvc_max = cpu_bvc_max
+        self.cpu_shed = cpu_shed
+        self.min_dwell = min_dwell
+        self.tier = "bvc"
+        self.meter = NoiseMeter()
+        self.noise_floor: float | None = None
+        self.stats = {tier: {"seconds": 0.0, "cpu_seconds": 0.0, "false_interruptions": 0, "noise_turns": 0, "turns": 0} for tier in TIERS}
+        self._sip = False
+        self._process = psutil.Process()
+        self._cpu = psutil.cpu_percent(None) / 100
+        self._switched_at = time.monotonic()
+        self._tier_started_at = time.monotonic()
+        self._tier_cpu_start = self._cpu_time()
+        self._transcribed = False
+        self._probe: asyncio.Task | None = None
+
+    def _cpu_time(self) -> float:
+        times = self._process.cpu_times()
+        return times.user + times.system
+
+    def select(self, params: NoiseCancellationParams) -> rtc.NoiseCancellationOptions | rtc.FrameProcessor[rtc.AudioFrame]:
+        """The noise_cancellation selector: called whenever the participant's audio stream is (re)built."""
+        self._sip = params.participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP
+        self._stop_probe()
+        if self.tier == "bvc":
+            self._probe = asyncio.create_task(self._measure(params.track))
+            return noise_cancellation.BVCTelephony() if self._sip else noise_cancellation.BVC()
+        return MeteredFilter(self.meter, suppress=self.tier == "light")
+
+    async def _measure(self, track: rtc.Track) -> None:
+        """Feed the meter from the raw microphone while BVC filters what the session hears."""
+        stream = rtc.AudioStream.from_track(track=track, sample_rate=16000)
+        try:
+            async for event in stream:
+                self.meter.update(event.frame)
+        finally:
+            await stream.aclose()
+
+    def _stop_probe(self) -> None:
+        if self._probe is not None:
+            self._probe.cancel()
+            self._probe = None
+
+    def attach(self) -> None:
+        self.session.on("agent_state_changed", self._on_agent_state_changed)
+        self.session.on("user_state_changed", self._on_user_state_changed)
+        self.session.on("user_input_transcribed", self._on_user_input_transcribed)
+        self.session.on("agent_false_interruption", self._on_false_interruption)
+
+    def choose(self) -> tuple[str, str]:
+        """The tier for the current noise floor and CPU load, and which of the two decided it."""
+        if self.meter.floor_dbfs is not None:
+            self.noise_floor = self.meter.floor_dbfs
+        if self._cpu >= self.cpu_shed:
+            return "bypass", "cpu"
+        if self.noise_floor is None:
+            return self.tier, "noise"
+        if self.noise_floor > self.noisy_dbfs:
+            return ("bvc", "noise") if self._cpu < self.cpu_bvc_max else ("light", "cpu")
+        if self.noise_floor < self.quiet_dbfs:
+            return "bypass", "noise"
+        return "light", "noise"
+
+    def _close_tier(self) -> None:
+        now, cpu_time = time.monotonic(), self._cpu_time()
+        stats = self.stats[self.tier]
+        stats["seconds"] += now - self._tier_started_at
+        stats["cpu_seconds"] += cpu_time - self._tier_cpu_start
+        TIER_SECONDS.labels(tier=self.tier).inc(now - self._tier_started_at)
+        TIER_CPU_SECONDS.labels(tier=self.tier).inc(cpu_time - self._tier_cpu_start)
+        self._tier_started_at, self._tier_cpu_start = now, cpu_time
+
+    def _switch(self, tier: str, reason: str) -> None:
+        audio_input = self.session.room_io.audio_input
+        participant = self.session.room_io.linked_participant
+        if participant is None or not hasattr(audio_input, "set_participant"):
+            return
+        self._close_tier()
+        TIER_SWITCHES.labels(from_tier=self.tier, to_tier=tier, reason=reason).inc()
+        logging.info(
+            f"Noise cancellation {self.tier} -> {tier} ({reason}: noise floor "
+            f"{self.noise_floor if self.noise_floor is None else round(self.noise_floor)} dBFS, CPU {self._cpu:.0%})"
+        )
+        self.tier = tier
+        self._switched_at = time.monotonic()
+        # Relinking the participant rebuilds its audio stream, which asks select() for the new tier
+        audio_input.set_participant(None)
+        audio_input.set_participant(participant.identity)
+
+    def _on_agent_state_changed(self, ev) -> None:
+        # Between the user's turns, so rebuilding the stream cuts no speech
+        if self.session.user_state == "speaking":
+            return
+        self._cpu = psutil.cpu_percent(None) / 100
+        tier, reason = self.choose()
+        if tier != self.tier and (reason == "cpu" or time.monotonic() - self._switched_at >= self.min_dwell):
+            self._switch(tier, reason)
+
+    def _on_user_state_changed(self, ev) -> None:
+        if ev.new_state == "speaking":
+            self._transcribed = False
+        elif ev.old_state == "speaking":
+            self.stats[self.tier]["turns"] += 1
+            if not self._transcribed:
+                self.stats[self.tier]["noise_turns"] += 1
+                TIER_QUALITY_EVENTS.labels(tier=self.tier, event="noise_turn").inc()
+
+    def _on_user_input_transcribed(self, ev) -> None:
+        if ev.transcript.strip():
+            self._transcribed = True
+
+    def _on_false_interruption(self, ev) -> None:
+        self.stats[self.tier]["false_interruptions"] += 1
+        TIER_QUALITY_EVENTS.labels(tier=self.tier, event="false_interruption").inc()
+
+    def summary(self) -> dict:
+        """Per tier: time, CPU cores used on average, and quality events; closes the current tier's interval."""
+        self._stop_probe()
+        self._close_tier()
+        return {
+            "tier": self.tier,
+            "noise_floor_dbfs": None if self.noise_floor is None else round(self.noise_floor, 1),
+            **{
+                tier: {
+                    "seconds": round(s["seconds"]),
+                    "cpu_cores": round(s["cpu_seconds"] / s["seconds"], 3),
+                    "turns": s["turns"],
+                    "noise_turns": s["noise_turns"],
+                    "false_interruptions": s["false_interruptions"],
+                }
+                for tier, s in self.stats.items() if s["seconds"]
+            },
+        }
@@ -0,0 +1,193 @@
+"""
+LLM backends for the Assistant and the shared clients that keep them warm.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+
+import httpx
+import openai as openai_sdk
+from livekit.agents import llm
+from livekit.agents.utils import images
+from livekit.plugins import google, openai
+
+
+# Camera frames are scaled down before JPEG encoding: fewer bytes and image tokens per frame
+_video_size = int(os.getenv("VIDEO_MAX_SIZE", "768"))
+VIDEO_ENCODE_OPTIONS = images.EncodeOptions(
+    format="JPEG",
+    quality=int(os.getenv("VIDEO_JPEG_QUALITY", "70")),
+    resize_options=images.ResizeOptions(width=_video_size, height=_video_size, strategy="scale_aspect_fit"),
+)
+
+# One OpenAI-compatible client per event loop, so every session on that loop
+# reuses the same pool of keep-alive connections to the Ollama endpoint
+_openai_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai_sdk.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_openai_client() -> openai_sdk.AsyncClient:
+    """Return the pooled OpenAI-compatible client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _openai_clients.get(loop)
+    if client is None:
+        client = openai_sdk.AsyncClient(
+            base_url=os.getenv("OPENAI_BASE_URL", "http://localhost:11434/v1"),
+            api_key=os.getenv("OPENAI_API_KEY", "ollama"),
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                timeout=httpx.Timeout(connect=15.0, read=30.0, write=5.0, pool=5.0),
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=50,
+                    max_keepalive_connections=50,
+                    keepalive_expiry=300,
+                ),
+            ),
+        )
+        _openai_clients[loop] = client
+    return client
+
+
+def build_llm(model_type: str) -> llm.LLM | llm.RealtimeModel:
+    """
+    Build the language model for a backend.
+
+    Args:
+        model_type: "openai" for the OpenAI-compatible (Ollama) endpoint,
+            anything else for the Google Realtime model
+    """
+    if model_type == "openai":
+        # The shared client is not owned by the LLM, so closing one session keeps the pool open
+        return openai.LLM(
+            model=os.getenv("OPENAI_MODEL", "llama3.2:latest"),
+            client=get_openai_client(),
+        )
+    return google.beta.realtime.RealtimeModel(
+        voice="Aoede",
+        temperature=0.8,
+        image_encode_options=VIDEO_ENCODE_OPTIONS,
+    )
+
+
+def prewarm_llm(model: llm.LLM | llm.RealtimeModel) -> None:
+    """Open the connection to the backend ahead of the first turn (non-blocking)."""
+    if isinstance(model, llm.LLM):
+        model.prewarm()
+    else:
+        # LiveKit opens the realtime session when the agent becomes active; building
+        # the model up front still keeps its client and config ready for the switch
+        logging.debug(f"No connection prewarm available for {type(model).__name__}")
+
+
+class LocalModelWarmer:
+    """
+    Keeps the local Ollama model loaded and its static prompt prefix cached.
+
+    Ollama unloads a model once it has been idle for its keep-alive, and the next
+    caller pays the full load. The warmer loads the model when the worker process
+    starts, then sends one request that begins with the agent's instructions so
+    the server's prompt cache already holds that prefix, and re-arms the
+    keep-alive every interval seconds from then on. It runs on a daemon thread,
+    so it never delays process start-up or blocks a session's event loop.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        instructions: str,
+        keep_alive: str = "30m",
+        interval: float = 240.0,
+    ) -> None:
+        # Ollama's native API lives next to its OpenAI-compatible /v1 endpoint
+        self.api_url = base_url.rstrip("/").removesuffix("/v1")
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.instructions = instructions
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.load_time: float | None = None
+        self.prime_time: float | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def keep_alive_ping(self, client: httpx.Client) -> float:
+        """Load the model if needed and push back its unload time; returns seconds taken."""
+        start = time.perf_counter()
+        response = client.post(
+            f"{self.api_url}/api/generate",
+            json={"model": self.model, "keep_alive": self.keep_alive},
+        )
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    def prime_prefix(self, client: httpx.Client) -> float:
+        """Process the instructions once so later requests starting with them skip that work."""
+        start = time.perf_counter()
+        response = client.post(
+            f"{self.base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', 'ollama')}"},
+            json={
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": self.instructions},
+                    {"role": "user", "content": "Hello"},
+                ],
+                "max_tokens": 1,
+                "stream": False,
+            },
+        )
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    def warm(self) -> None:
+        with httpx.Client(timeout=httpx.Timeout(120.0, connect=5.0)) as client:
+            self.load_time = self.keep_alive_ping(client)
+            self.prime_time = self.prime_prefix(client)
+        logging.info(
+            f"Local model {self.model} warm: load {self.load_time * 1000:.0f} ms, "
+            f"instruction prefix {self.prime_time * 1000:.0f} ms, keep-alive {self.keep_alive}"
+        )
+
+    def _run(self) -> None:
+        try:
+            self.warm()
+        except httpx.HTTPError as e:
+            logging.warning(f"Could not warm local model {self.model} at {self.api_url}: {e}")
+        with httpx.Client(timeout=httpx.Timeout(30.0, connect=5.0)) as client:
+            while not self._stop.wait(self.interval):
+                try:
+                    self.keep_alive_ping(client)
+                except httpx.HTTPError as e:
+                    logging.warning(f"Keep-alive for local model {self.model} failed: {e}")
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="local_model_warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def start_local_model_warmer(instructions: str) -> LocalModelWarmer | None:
+    """
+    Warm the openai backend's local model for this process, unless LOCAL_MODEL_KEEP_WARM is "false".
+
+    Only Ollama-style endpoints (an OPENAI_BASE_URL ending in /v1) have the native
+    keep-alive API, so other endpoints are left alone.
+    """
+    base_url = os.getenv("OPENAI_BASE_URL", "http://localhost:11434/v1")
+    if os.getenv("LOCAL_MODEL_KEEP_WARM", "true").lower() != "true" or not base_url.rstrip("/").endswith("/v1"):
+        return None
+    warmer = LocalModelWarmer(
+        base_url,
+        model=os.getenv("OPENAI_MODEL", "llama3.2:latest"),
+        instructions=instructions,
+        keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+        interval=float(os.getenv("OLLAMA_KEEP_ALIVE_INTERVAL", "240")),
+    )
+    warmer.start()
+    return warmer
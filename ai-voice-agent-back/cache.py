@@ -0,0 +1,90 @@
+"""
+Small in-process caches shared by the tools.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    LRU cache whose entries expire a fixed number of seconds after being stored.
+
+    Concurrent lookups for the same missing key are coalesced: the first caller
+    runs the fetch and every other caller awaits the same result.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 256) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable | None = None) -> None:
+        """Drop one entry, or the whole cache when no key is given."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for key, or run fetch() once to produce it.
+
+        Args:
+            key: Cache key
+            fetch: Coroutine factory producing the value; exceptions are raised to
+                every waiting caller and nothing is cached
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        # In-flight tasks belong to the loop that started them
+        inflight_key = (asyncio.get_running_loop(), key)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(key, fetch))
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda t: self._on_fetch_done(inflight_key, t))
+        # Shield so one caller hanging up does not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        self.set(key, value)
+        return value
+
+    def _on_fetch_done(self, inflight_key: tuple, task: asyncio.Task) -> None:
+        self._inflight.pop(inflight_key, None)
+        # Mark the error as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,207 @@
+"""
+Keeping the assistant's chat context within a token budget on long calls.
+"""
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING
+
+from livekit.agents import ChatContext, llm
+
+from tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from sessions import SessionState
+
+
+SUMMARY_ID = "chat_history_summary"
+
+SUMMARY_INSTRUCTION = """Compress the earlier part of a call between a TN CyberTech Bank customer and Batsi, the bank's voice assistant, into a short, faithful summary.
+Keep the customer's goals, account or product details they mentioned, decisions, facts learned from tool results, and anything still unresolved.
+Omit greetings and small talk. Write plain sentences without formatting."""
+
+
+def item_text(item: llm.ChatItem) -> str:
+    """The text an item contributes to the prompt."""
+    if item.type == "message":
+        return item.text_content or ""
+    if item.type == "function_call":
+        return f"{item.name}({item.arguments})"
+    if item.type == "function_call_output":
+        return item.output
+    return ""
+
+
+def context_tokens(chat_ctx: ChatContext) -> int:
+    return sum(estimate_tokens(item_text(item)) for item in chat_ctx.items)
+
+
+def _is_summary(item: llm.ChatItem) -> bool:
+    return item.id == SUMMARY_ID
+
+
+def _is_foldable(item: llm.ChatItem) -> bool:
+    # System messages (memories, the previous summary) stay; conversation turns and tool calls fold
+    if item.type == "message":
+        return item.role in ("user", "assistant")
+    return item.type in ("function_call", "function_call_output")
+
+
+class ContextCompactor:
+    """
+    Folds older turns of a session's conversation into a rolling summary.
+
+    The agent's instructions are never part of its chat context, and memory
+    messages are system messages, so both are always kept verbatim, as are the
+    last keep_turns user turns and everything after them. When the conversation
+    grows past max_tokens, the older turns and the previous summary are
+    summarised together in the background and replaced by one system message.
+    Turns are only folded once the flusher has saved them to Mem0.
+
+    Summary requests start with the agent's instructions when they are given, so
+    a local model that serves both reuses its cached instruction prefix instead
+    of evicting it with a different one.
+
+    Realtime models are left alone: the session on the provider's side keeps
+    its own history, cannot delete items from it and drops system messages, so
+    a summary there would save nothing and be lost. Compaction picks up again
+    once an LLM-backed assistant is active.
+    """
+
+    def __init__(
+        self,
+        state: "SessionState",
+        summarizer: llm.LLM,
+        max_tokens: int = 3000,
+        keep_turns: int = 4,
+        instructions: str | None = None,
+    ) -> None:
+        self.state = state
+        self.summarizer = summarizer
+        self.instructions = instructions
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.compactions = 0
+        self._task: asyncio.Task | None = None
+
+    def _applies(self) -> bool:
+        assistant = self.state.assistant
+        return assistant is not None and not isinstance(assistant.llm, llm.RealtimeModel)
+
+    def tokens(self) -> int:
+        assistant = self.state.assistant
+        if assistant is None or assistant.chat_ctx is None:
+            return 0
+        return context_tokens(assistant.chat_ctx)
+
+    def maybe_compact(self) -> asyncio.Task | None:
+        """Start a compaction in the background if the context is over budget and none is running."""
+        if self._task is not None and not self._task.done():
+            return self._task
+        if not self._applies() or self.tokens() <= self.max_tokens:
+            return None
+        self._task = asyncio.create_task(self.compact(), name="context_compaction")
+        return self._task
+
+    def _split(self, items: list[llm.ChatItem]) -> int:
+        # Index of the first item of the last keep_turns user turns
+        user_turns = 0
+        for i in range(len(items) - 1, -1, -1):
+            item = items[i]
+            if item.type == "message" and item.role == "user":
+                user_turns += 1
+                if user_turns >= self.keep_turns:
+                    return i
+        return 0
+
+    async def compact(self) -> int:
+        """
+        Summarise the turns before the recent ones and replace them with the summary.
+
+        Returns:
+            The number of chat items folded into the summary
+        """
+        # Never drop turns Mem0 has not seen yet
+        flusher = self.state.flusher
+        if flusher is not None and self.state.user_name:
+            await flusher.flush("compaction")
+
+        assistant = self.state.assistant
+        items = assistant.chat_ctx.items
+        head = items[:self._split(items)]
+        previous = next((item for item in items if _is_summary(item)), None)
+        folded = [
+            item for item in head
+            if _is_foldable(item) and (
+                item.type != "message" or flusher is None or not self.state.user_name
+                or flusher.is_flushed(item.id)
+            )
+        ]
+        if not folded:
+            return 0
+
+        lines = []
+        if previous is not None:
+            lines.append(f"Summary so far: {previous.text_content}")
+        for item in folded:
+            if item.type == "message":
+                lines.append(f"{'Customer' if item.role == 'user' else 'Batsi'}: {item_text(item)}")
+            elif item.type == "function_call_output":
+                lines.append(f"Tool result ({item.name}): {item.output}")
+
+        start = time.perf_counter()
+        try:
+            summary = await self._summarize("\n".join(lines))
+        except Exception as e:
+            logging.error(f"Failed to summarize the conversation: {e}")
+            return 0
+        if not summary:
+            return 0
+
+        # The conversation moved on while we were summarising; apply the result to
+        # whichever assistant is active now and keep everything added meanwhile
+        if not self._applies():
+            logging.info("Switched to a realtime model while summarising, conversation left as it is")
+            return 0
+        assistant = self.state.assistant
+        tokens_before = context_tokens(assistant.chat_ctx)
+        folded_ids = {item.id for item in folded}
+        chat_ctx = assistant.chat_ctx.copy()
+        for item in list(chat_ctx.items):
+            if item.id in folded_ids or _is_summary(item):
+                chat_ctx.remove(item)
+        kept = [item for item in chat_ctx.items if _is_foldable(item)]
+        # Inserted by creation time, so the summary sits just ahead of the turns it precedes
+        chat_ctx.insert(llm.ChatMessage(
+            id=SUMMARY_ID,
+            role="system",
+            content=[f"Summary of the earlier conversation: {summary}"],
+            created_at=(kept[0].created_at - 1e-6) if kept else time.time(),
+        ))
+        await assistant.update_chat_ctx(chat_ctx)
+
+        self.compactions += 1
+        logging.info(
+            f"Folded {len(folded)} chat items into the summary in {(time.perf_counter() - start) * 1000:.0f} ms "
+            f"(context {tokens_before} -> {context_tokens(chat_ctx)} tokens, budget {self.max_tokens})"
+        )
+        return len(folded)
+
+    async def _summarize(self, conversation: str) -> str:
+        chat_ctx = ChatContext()
+        if self.instructions:
+            chat_ctx.add_message(role="system", content=self.instructions)
+        chat_ctx.add_message(role="system", content=SUMMARY_INSTRUCTION)
+        chat_ctx.add_message(role="user", content=conversation)
+
+        chunks = []
+        async with self.summarizer.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    chunks.append(chunk.delta.content)
+        return "".join(chunks).strip()
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
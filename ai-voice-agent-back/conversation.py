@@ -0,0 +1,136 @@
+"""
+Wiring one call's memory, context management and metrics to its AgentSession.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Callable
+
+from livekit.agents import AgentSession, llm
+
+from context_window import ContextCompactor
+from memory import ConversationFlusher, MemoryRetriever, extract_name
+from prefetch import SpeculativePrefetcher
+from prompts import AGENT_INSTRUCTION
+from sessions import SessionState
+from turn_metrics import TurnMetrics
+
+
+def attach_conversation(
+    session: AgentSession,
+    state: SessionState,
+    mem0,
+    summarizer: llm.LLM,
+) -> Callable[[str], None]:
+    """
+    Give the session its flusher, retriever, compactor and turn metrics and hook them to its events.
+
+    The caller's name is taken from their reply to the greeting, after which
+    memories are fetched in the background and refreshed as topics change.
+    Older turns are summarised once the assistant has answered. With
+    TOOL_PREFETCH=1, likely tool lookups start from interim transcripts.
+
+    Returns:
+        identify_user(name), for when the caller is known before they speak
+    """
+    # Every save path goes through one flusher, which only uploads what is new
+    state.flusher = ConversationFlusher(
+        mem0,
+        state,
+        checkpoint_interval=float(os.getenv("MEMORY_CHECKPOINT_INTERVAL", "300")),
+        chunk_size=int(os.getenv("MEMORY_UPLOAD_CHUNK_SIZE", "50")),
+        max_concurrency=int(os.getenv("MEMORY_UPLOAD_CONCURRENCY", "4")),
+    )
+    state.retriever = MemoryRetriever(
+        mem0,
+        state,
+        top_k=int(os.getenv("MEMORY_TOP_K", "5")),
+        max_tokens=int(os.getenv("MEMORY_MAX_TOKENS", "400")),
+    )
+    # Summaries are written off the critical path, whichever backend is talking
+    state.compactor = ContextCompactor(
+        state,
+        summarizer,
+        max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "3000")),
+        keep_turns=int(os.getenv("CONTEXT_KEEP_TURNS", "4")),
+        # Same opening as the assistant's requests, so the local model keeps its prefix cache
+        instructions=AGENT_INSTRUCTION,
+    )
+    # Where each reply's time goes: STT, end of turn, LLM first token, tools, TTS first byte
+    state.turn_metrics = TurnMetrics(state, path=os.getenv("TURN_METRICS_PATH", "turn_metrics.jsonl"))
+    session.on("metrics_collected", state.turn_metrics.on_metrics_collected)
+    session.on("function_tools_executed", state.turn_metrics.on_function_tools_executed)
+    # Optionally start weather and search lookups while the caller is still talking
+    if os.getenv("TOOL_PREFETCH", "0") == "1":
+        state.prefetcher = SpeculativePrefetcher(
+            state, max_per_turn=int(os.getenv("TOOL_PREFETCH_MAX_PER_TURN", "2"))
+        )
+        session.on("user_input_transcribed", state.prefetcher.on_user_input_transcribed)
+        session.on("function_tools_executed", state.prefetcher.on_function_tools_executed)
+
+    def identify_user(user_name: str):
+        state.user_name = user_name
+        logging.info(f"User identified as: {state.user_name}")
+        state.flusher.start_checkpoints()
+
+        # Fetch the most useful memories in the background while the conversation goes on
+        identified_at = time.perf_counter()
+        def on_memories_loaded(task: asyncio.Task):
+            if not task.cancelled() and task.exception() is None:
+                logging.info(
+                    f"Name to memories in context for {user_name}: "
+                    f"{(time.perf_counter() - identified_at) * 1000:.0f} ms ({task.result()} memories)"
+                )
+        state.retriever.prefetch().add_done_callback(on_memories_loaded)
+
+    # The user's reply to the greeting is their name: pick it up from the final
+    # transcript as soon as STT delivers it, before the turn is even committed
+    def on_user_input_transcribed(ev):
+        if ev.is_final and not state.user_name and ev.transcript.strip():
+            identify_user(extract_name(ev.transcript))
+    session.on("user_input_transcribed", on_user_input_transcribed)
+
+    # Rank memories against what the user is talking about and inject the new relevant ones.
+    # Also called directly for turns that never reach the conversation as an event (FAQ cache hits)
+    def on_user_message(text: str):
+        if not state.user_name:
+            # Typed chat messages have no transcript, so the name arrives here
+            identify_user(extract_name(text))
+        else:
+            state.retriever.refresh(text)
+    state.on_user_message = on_user_message
+
+    # Once the assistant has answered, fold older turns away if the context is over budget
+    def on_conversation_item_added(ev):
+        role = getattr(ev.item, 'role', None)
+        if role == "assistant":
+            state.compactor.maybe_compact()
+        elif role == "user" and ev.item.text_content:
+            on_user_message(ev.item.text_content)
+    session.on("conversation_item_added", on_conversation_item_added)
+
+    return identify_user
+
+
+async def close_conversation(state: SessionState) -> dict[str, dict]:
+    """
+    Stop background work, save whatever is left and write the session's metrics.
+
+    Returns:
+        The session's latency summary
+    """
+    try:
+        await state.compactor.aclose()
+        await state.flusher.aclose("shutdown callback")
+        if state.prefetcher:
+            logging.info(f"Tool prefetch for {state.job_id}: {await state.prefetcher.aclose()}")
+        if state.audio_frontend:
+            logging.info(f"Noise cancellation tiers for {state.job_id}: {state.audio_frontend.summary()}")
+        if state.video_sampler:
+            logging.info(f"Video frames for {state.job_id}: {state.video_sampler.summary()}")
+    except Exception as e:
+        logging.error(f"Error saving memories in cleanup: {e}")
+        import traceback
+        traceback.print_exc()
+    return await state.turn_metrics.aclose()
@@ -0,0 +1,361 @@
+"""
+Local stand-ins for the external services, for offline tests and benchmarks.
+"""
+import asyncio
+import functools
+import random
+import time
+import uuid
+from collections import deque
+from typing import Callable
+
+import numpy as np
+from livekit import rtc
+from livekit.agents import DEFAULT_API_CONNECT_OPTIONS, APIConnectOptions, ChatContext, llm, stt, tts
+from livekit.agents.voice import io
+
+
+class LocalMem0:
+    """
+    In-process stand-in for AsyncMemoryClient.
+
+    Every user message passed to add() becomes a memory; search() ranks a user's
+    memories by word overlap with the query. Each call waits latency seconds
+    (plus up to jitter), add() a further add_latency_per_message for each message
+    it extracts from, and setting available to False makes calls fail like an
+    outage.
+    """
+
+    def __init__(self, latency: float = 0.15, jitter: float = 0.1, add_latency_per_message: float = 0.0) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.add_latency_per_message = add_latency_per_message
+        self.available = True
+        self.calls = 0
+        self.memories: dict[str, list[dict]] = {}
+
+    async def _wait(self) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if not self.available:
+            raise ConnectionError("mem0 stand-in is unavailable")
+
+    async def add(self, messages: list[dict], user_id: str, **kwargs) -> dict:
+        await self._wait()
+        await asyncio.sleep(self.add_latency_per_message * len(messages))
+        added = []
+        for message in messages:
+            if message["role"] == "user":
+                memory = {
+                    "id": str(uuid.uuid4()),
+                    "memory": message["content"],
+                    "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+                self.memories.setdefault(user_id, []).append(memory)
+                added.append(memory)
+        return {"results": added}
+
+    async def get_all(self, user_id: str, **kwargs) -> list[dict]:
+        await self._wait()
+        return list(self.memories.get(user_id, []))
+
+    async def search(self, query: str, user_id: str, top_k: int = 10, **kwargs) -> list[dict]:
+        await self._wait()
+        words = set(query.lower().split())
+        scored = [
+            (len(words & set(memory["memory"].lower().split())), memory)
+            for memory in self.memories.get(user_id, [])
+        ]
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [dict(memory, score=score) for score, memory in scored[:top_k]]
+
+
+def _echo_last_user_message(chat_ctx: ChatContext) -> str:
+    for item in reversed(chat_ctx.items):
+        if item.type == "message" and item.role == "user":
+            return " ".join((item.text_content or "").split()[:30])
+    return "How can I help you today?"
+
+
+class LocalLLM(llm.LLM):
+    """
+    In-process stand-in for a streaming chat model.
+
+    Each chat() waits ttft seconds, then streams the reply word by word at
+    tokens_per_second. The reply comes from respond(chat_ctx), which by default
+    echoes the start of the last user message.
+    """
+
+    def __init__(
+        self,
+        ttft: float = 0.3,
+        tokens_per_second: float = 40.0,
+        respond: Callable[[ChatContext], str] = _echo_last_user_message,
+    ) -> None:
+        super().__init__()
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.respond = respond
+        self.calls = 0
+
+    def chat(
+        self,
+        *,
+        chat_ctx: ChatContext,
+        tools: list | None = None,
+        conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS,
+        **kwargs,
+    ) -> "_LocalLLMStream":
+        self.calls += 1
+        return _LocalLLMStream(self, chat_ctx=chat_ctx, tools=tools or [], conn_options=conn_options)
+
+
+class _LocalLLMStream(llm.LLMStream):
+    async def _run(self) -> None:
+        model: LocalLLM = self._llm
+        request_id = str(uuid.uuid4())
+        await asyncio.sleep(model.ttft)
+        for word in model.respond(self._chat_ctx).split():
+            self._event_ch.send_nowait(
+                llm.ChatChunk(id=request_id, delta=llm.ChoiceDelta(role="assistant", content=word + " "))
+            )
+            await asyncio.sleep(1 / model.tokens_per_second)
+
+
+class LocalSTT(stt.STT):
+    """
+    In-process stand-in for a streaming speech-to-text service.
+
+    Any non-silent audio counts as speech. Once a burst of speech is followed by
+    endpointing seconds of silence, the next line queued with push_transcript()
+    is returned as the final transcript, latency seconds later.
+    """
+
+    def __init__(self, latency: float = 0.2, endpointing: float = 0.3) -> None:
+        super().__init__(capabilities=stt.STTCapabilities(streaming=True, interim_results=False))
+        self.latency = latency
+        self.endpointing = endpointing
+        self.transcripts: deque[str] = deque()
+
+    def push_transcript(self, text: str) -> None:
+        self.transcripts.append(text)
+
+    def _next_transcript(self) -> str:
+        return self.transcripts.popleft() if self.transcripts else ""
+
+    async def _recognize_impl(self, buffer, *, language=None, conn_options: APIConnectOptions) -> stt.SpeechEvent:
+        await asyncio.sleep(self.latency)
+        return stt.SpeechEvent(
+            type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+            alternatives=[stt.SpeechData(language="en", text=self._next_transcript())],
+        )
+
+    def stream(self, *, language=None, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "_LocalSTTStream":
+        return _LocalSTTStream(stt=self, conn_options=conn_options)
+
+
+class _LocalSTTStream(stt.RecognizeStream):
+    async def _run(self) -> None:
+        model: LocalSTT = self._stt
+        speaking = False
+        silence = 0.0
+        pending: set[asyncio.Task] = set()
+
+        async def finish(text: str) -> None:
+            await asyncio.sleep(model.latency)
+            self._event_ch.send_nowait(stt.SpeechEvent(
+                type=stt.SpeechEventType.FINAL_TRANSCRIPT,
+                alternatives=[stt.SpeechData(language="en", text=text)],
+            ))
+            self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.END_OF_SPEECH))
+
+        async for frame in self._input_ch:
+            if isinstance(frame, self._FlushSentinel):
+                continue
+            if np.frombuffer(frame.data, dtype=np.int16).any():
+                if not speaking:
+                    speaking = True
+                    self._event_ch.send_nowait(stt.SpeechEvent(type=stt.SpeechEventType.START_OF_SPEECH))
+                silence = 0.0
+            elif speaking:
+                silence += frame.duration
+                if silence >= model.endpointing:
+                    speaking = False
+                    task = asyncio.create_task(finish(model._next_transcript()))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+
+
+class LocalTTS(tts.TTS):
+    """
+    In-process stand-in for a text-to-speech service.
+
+    Each synthesis waits ttfb seconds and then returns seconds_per_char of
+    silent PCM for every character of text.
+    """
+
+    def __init__(self, ttfb: float = 0.15, seconds_per_char: float = 0.06, sample_rate: int = 24000) -> None:
+        super().__init__(capabilities=tts.TTSCapabilities(streaming=False), sample_rate=sample_rate, num_channels=1)
+        self.ttfb = ttfb
+        self.seconds_per_char = seconds_per_char
+
+    def synthesize(self, text: str, *, conn_options: APIConnectOptions = DEFAULT_API_CONNECT_OPTIONS) -> "_LocalChunkedStream":
+        return _LocalChunkedStream(tts=self, input_text=text, conn_options=conn_options)
+
+
+class _LocalChunkedStream(tts.ChunkedStream):
+    async def _run(self, output_emitter: tts.AudioEmitter) -> None:
+        model: LocalTTS = self._tts
+        output_emitter.initialize(
+            request_id=str(uuid.uuid4()),
+            sample_rate=model.sample_rate,
+            num_channels=1,
+            mime_type="audio/pcm",
+        )
+        await asyncio.sleep(model.ttfb)
+        # 100 ms of 16-bit silence per chunk
+        chunk = bytes(model.sample_rate // 10 * 2)
+        for _ in range(max(1, int(len(self._input_text) * model.seconds_per_char * 10))):
+            output_emitter.push(chunk)
+        output_emitter.flush()
+
+
+@functools.lru_cache(maxsize=4)
+def voiced_speech(sample_rate: int = 16000, seconds: float = 2.0) -> np.ndarray:
+    """
+    Int16 PCM that a voice activity detector takes for speech.
+
+    A glottal pulse train around 120 Hz goes through the first three formants of
+    a vowel that changes every 250 ms, with a 4 Hz syllable rhythm on top.
+    """
+    rng = np.random.default_rng(0)
+    n = int(seconds * sample_rate)
+    t = np.arange(n) / sample_rate
+    pitch = 120 + 15 * np.sin(2 * np.pi * 3 * t) + np.cumsum(rng.normal(0, 0.01, n))
+    cycles = np.floor(np.cumsum(pitch / sample_rate))
+    source = np.zeros(n)
+    source[1:][np.diff(cycles) > 0] = 1.0
+
+    vowels = ((700, 1220, 2600), (300, 2300, 3000), (500, 900, 2400), (400, 1900, 2550))
+    syllable = sample_rate // 4
+    out = np.zeros(n)
+    for start in range(0, n, syllable):
+        segment = source[start:start + syllable]
+        for formant, bandwidth in zip(vowels[start // syllable % len(vowels)], (110, 120, 160)):
+            # Two-pole resonator per formant
+            r = np.exp(-np.pi * bandwidth / sample_rate)
+            a1, a2 = -2 * r * np.cos(2 * np.pi * formant / sample_rate), r * r
+            filtered = np.zeros(len(segment))
+            y1 = y2 = 0.0
+            for i, x in enumerate(segment):
+                y1, y2 = (1 - r) * x - a1 * y1 - a2 * y2, y1
+                filtered[i] = y1
+            segment = filtered
+        out[start:start + syllable] = segment
+    out *= 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    return (out / np.abs(out).max() * 0.3 * 32767).astype(np.int16)
+
+
+class LocalAudioInput(io.AudioInput):
+    """
+    A caller's microphone: silence in real-time frames, with speech queued by say().
+
+    Speech is synthetic voiced audio (voiced_speech) that Silero VAD detects
+    and LocalSTT turns into the next scripted transcript. speech_ended_at is
+    when the last speech frame was sent.
+    """
+
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20) -> None:
+        super().__init__(label="local-microphone")
+        samples = sample_rate * frame_ms // 1000
+        self.frame_duration = frame_ms / 1000
+        self._silence = rtc.AudioFrame(bytes(samples * 2), sample_rate, 1, samples)
+        speech = voiced_speech(sample_rate)
+        self._speech = [
+            rtc.AudioFrame(speech[i:i + samples].tobytes(), sample_rate, 1, samples)
+            for i in range(0, len(speech) - samples + 1, samples)
+        ]
+        self._speech_index = 0
+        self._speech_frames = 0
+        self._next_frame_at: float | None = None
+        self.speech_ended_at: float | None = None
+
+    def say(self, seconds: float) -> None:
+        self._speech_frames += max(1, int(seconds / self.frame_duration))
+
+    async def __anext__(self) -> rtc.AudioFrame:
+        # Paced like a real microphone
+        now = time.perf_counter()
+        if self._next_frame_at is None or now - self._next_frame_at > 1.0:
+            self._next_frame_at = now
+        self._next_frame_at += self.frame_duration
+        await asyncio.sleep(max(0.0, self._next_frame_at - now))
+        if self._speech_frames:
+            self._speech_frames -= 1
+            if not self._speech_frames:
+                self.speech_ended_at = time.perf_counter()
+            self._speech_index = (self._speech_index + 1) % len(self._speech)
+            return self._speech[self._speech_index]
+        return self._silence
+
+
+class LocalAudioOutput(io.AudioOutput):
+    """
+    A caller's speaker: plays captured audio back in real time and reports playback.
+
+    reply_started is set when the first frame of a segment arrives (and
+    first_frame_at records when), reply_finished when a segment has played out
+    or was interrupted; callers clear them before speaking.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(label="local-speaker", capabilities=io.AudioOutputCapabilities(pause=False))
+        self.reply_started = asyncio.Event()
+        self.reply_finished = asyncio.Event()
+        self.first_frame_at: float | None = None
+        self._segment_duration = 0.0
+        self._segment_started = False
+        self._playout_end = 0.0
+        self._playouts: set[asyncio.Task] = set()
+
+    async def capture_frame(self, frame: rtc.AudioFrame) -> None:
+        await super().capture_frame(frame)
+        if not self._segment_started:
+            self._segment_started = True
+            self.first_frame_at = time.perf_counter()
+            self.reply_started.set()
+            self.on_playback_started(created_at=time.time())
+        self._segment_duration += frame.duration
+
+    def flush(self) -> None:
+        super().flush()
+        if not self._segment_started:
+            return
+        duration = self._segment_duration
+        self._playout_end = max(self._playout_end, self.first_frame_at) + duration
+        task = asyncio.create_task(self._play(self._playout_end, duration))
+        self._playouts.add(task)
+        task.add_done_callback(self._playouts.discard)
+        self._segment_started = False
+        self._segment_duration = 0.0
+
+    async def _play(self, ends_at: float, duration: float) -> None:
+        try:
+            await asyncio.sleep(max(0.0, ends_at - time.perf_counter()))
+        except asyncio.CancelledError:
+            self.on_playback_finished(playback_position=0.0, interrupted=True)
+            raise
+        self.on_playback_finished(playback_position=duration, interrupted=False)
+        self.reply_finished.set()
+
+    def clear_buffer(self) -> None:
+        for task in list(self._playouts):
+            task.cancel()
+        if self._segment_started:
+            self._segment_started = False
+            self._segment_duration = 0.0
+            self.on_playback_finished(playback_position=0.0, interrupted=True)
+        self._playout_end = time.perf_counter()
+        self.reply_finished.set()
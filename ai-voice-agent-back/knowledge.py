@@ -0,0 +1,252 @@
+"""
+Product knowledge retrieval: an on-disk BM25 index over the bank's documents.
+"""
+import functools
+import glob
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+
+from livekit.agents import Agent, ChatContext, ChatMessage, llm
+
+from tokens import estimate_tokens
+
+STOP_WORDS = {
+    "the", "a", "an", "to", "of", "i", "me", "my", "you", "your", "is", "are", "do", "does", "can",
+    "could", "would", "will", "please", "it", "and", "or", "for", "on", "in", "at", "with", "be",
+    "what", "how", "when", "where", "why", "which", "who", "that", "this", "there", "from", "by",
+    "we", "our", "us", "have", "has", "want", "need", "tell", "about", "hi", "hello", "batsi",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase terms without stop words, with plurals folded ("loans" -> "loan")."""
+    terms = []
+    for word in re.findall(r"[a-z0-9*#]+", text.lower()):
+        if word in STOP_WORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+@dataclass
+class Passage:
+    id: str
+    source: str
+    title: str
+    text: str
+    terms: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def length(self) -> int:
+        return sum(self.terms.values())
+
+
+def _passage(source: str, n: int, title: str, text: str) -> Passage:
+    return Passage(
+        id=f"{os.path.basename(source)}#{n}",
+        source=source,
+        title=title,
+        text=text,
+        terms=dict(Counter(tokenize(f"{title} {text}"))),
+    )
+
+
+def chunk_markdown(source: str, text: str, max_words: int = 120) -> list[Passage]:
+    """One passage per heading section, split at paragraphs when a section is longer than max_words."""
+    passages = []
+    for section in re.split(r"^(?=#)", text, flags=re.MULTILINE):
+        lines = section.strip().splitlines()
+        if not lines:
+            continue
+        title = lines[0].lstrip("#").strip() if lines[0].startswith("#") else ""
+        body = "\n".join(lines[1:] if title else lines).strip()
+        chunk: list[str] = []
+        for paragraph in [p.strip() for p in body.split("\n\n") if p.strip()]:
+            if chunk and len(" ".join(chunk + [paragraph]).split()) > max_words:
+                passages.append(_passage(source, len(passages), title, "\n\n".join(chunk)))
+                chunk = []
+            chunk.append(paragraph)
+        if chunk:
+            passages.append(_passage(source, len(passages), title, "\n\n".join(chunk)))
+    return passages
+
+
+def chunk_faq(source: str, text: str) -> list[Passage]:
+    """One passage per approved answer, searchable by its example questions too."""
+    passages = []
+    for entry in json.loads(text):
+        passage = _passage(source, len(passages), entry["questions"][0].capitalize(), entry["answer"])
+        passage.terms = dict(Counter(tokenize(" ".join(entry["questions"] + [entry["answer"]]))))
+        passages.append(passage)
+    return passages
+
+
+class KnowledgeIndex:
+    """
+    BM25 search over the bank's product documents, cached on disk.
+
+    Sources are markdown files (directories are searched for *.md) and approved
+    answer files (*.json). Each is chunked into passages and the passages'
+    term counts are stored in index_path with the file's hash, so build() only
+    re-chunks files that changed since the last build and drops deleted ones.
+    Collection statistics for scoring are recomputed in memory on every build.
+    """
+
+    def __init__(self, sources: list[str], index_path: str, k1: float = 1.5, b: float = 0.75) -> None:
+        self.sources = sources
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+        self.passages: list[Passage] = []
+        self._df: Counter = Counter()
+        self._avg_length = 0.0
+
+    def _source_files(self) -> list[str]:
+        files = []
+        for source in self.sources:
+            if os.path.isdir(source):
+                files += sorted(glob.glob(os.path.join(source, "*.md")))
+            elif os.path.exists(source):
+                files.append(source)
+        return files
+
+    def build(self) -> dict:
+        """Bring the index up to date with the sources; returns what was done."""
+        try:
+            with open(self.index_path) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+
+        files, rebuilt = {}, []
+        for path in self._source_files():
+            with open(path, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if stored.get(path, {}).get("sha256") == digest:
+                files[path] = stored[path]
+                continue
+            text = data.decode()
+            passages = chunk_faq(path, text) if path.endswith(".json") else chunk_markdown(path, text)
+            files[path] = {"sha256": digest, "passages": [asdict(p) for p in passages]}
+            rebuilt.append(path)
+
+        removed = [path for path in stored if path not in files]
+        if rebuilt or removed:
+            directory = os.path.dirname(os.path.abspath(self.index_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(files, f)
+            os.replace(tmp_path, self.index_path)
+
+        self.passages = [Passage(**p) for entry in files.values() for p in entry["passages"]]
+        self._df = Counter(term for p in self.passages for term in p.terms)
+        self._avg_length = sum(p.length for p in self.passages) / len(self.passages) if self.passages else 0.0
+        stats = {"files": len(files), "rebuilt": len(rebuilt), "removed": len(removed), "passages": len(self.passages)}
+        logging.info(f"Knowledge index {self.index_path}: {stats}")
+        return stats
+
+    def search(self, query: str, k: int = 3, min_score: float = 2.0) -> list[tuple[Passage, float]]:
+        """The k best passages for query scoring at least min_score, best first."""
+        terms = set(tokenize(query))
+        n = len(self.passages)
+        scored = []
+        for passage in self.passages:
+            score = 0.0
+            for term in terms:
+                tf = passage.terms.get(term)
+                if not tf:
+                    continue
+                idf = math.log(1 + (n - self._df[term] + 0.5) / (self._df[term] + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * passage.length / self._avg_length)
+                score += idf * tf * (self.k1 + 1) / (tf + norm)
+            if score >= min_score:
+                scored.append((passage, score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:k]
+
+    def context_message(self, query: str, max_tokens: int = 200, k: int = 3) -> str | None:
+        """The best passages for query as one message within max_tokens, or None if nothing is relevant."""
+        parts, used = [], 0
+        for passage, _ in self.search(query, k=k):
+            text = f"{passage.title}: {passage.text}" if passage.title else passage.text
+            cost = estimate_tokens(text)
+            if used + cost > max_tokens:
+                continue
+            parts.append(text)
+            used += cost
+        if not parts:
+            return None
+        return "Bank information relevant to this question:\n" + "\n".join(parts)
+
+
+def inject_knowledge(index: KnowledgeIndex, turn_ctx: ChatContext, new_message: ChatMessage, max_tokens: int = 200) -> int:
+    """
+    Add the passages relevant to the user's turn to this turn's context only.
+
+    Call from Agent.on_user_turn_completed. The previous user message is part of
+    the query, so follow-ups like "how much does it cost" still find their topic.
+    The passages go after the conversation and are not kept, so the instructions
+    and history stay an unchanged prefix from turn to turn.
+
+    Returns:
+        Estimated tokens added
+    """
+    message = index.context_message(_turn_query(turn_ctx, new_message), max_tokens=max_tokens)
+    if message is None:
+        return 0
+    turn_ctx.add_message(role="system", content=message)
+    return estimate_tokens(message)
+
+
+def _turn_query(turn_ctx: ChatContext, new_message: ChatMessage) -> str:
+    previous = next(
+        (item.text_content for item in reversed(turn_ctx.items)
+         if item.type == "message" and item.role == "user" and item.id != new_message.id),
+        "",
+    )
+    return f"{previous or ''} {new_message.text_content or ''}"
+
+
+@functools.lru_cache(maxsize=4)
+def packed_instructions(instructions: str, directory: str) -> str:
+    """instructions with every markdown document in directory after them, for models that can't take passages per turn."""
+    documents = [open(path).read().strip() for path in sorted(glob.glob(os.path.join(directory, "*.md")))]
+    return f"{instructions}\n\nBank information:\n\n" + "\n\n".join(documents)
+
+
+async def add_knowledge(
+    index: KnowledgeIndex,
+    agent: Agent,
+    turn_ctx: ChatContext,
+    new_message: ChatMessage,
+    max_tokens: int = 200,
+) -> int:
+    """
+    Give the agent's model the passages relevant to the user's turn, if it can take them.
+
+    Call from Agent.on_user_turn_completed. LLMs get them in turn_ctx, as with
+    inject_knowledge(). Realtime models reply from their own session and never
+    see turn_ctx, and the only ways into that session, new instructions or new
+    context items, are kept for good: per-turn passages would pile up turn after
+    turn. Realtime agents carry the whole knowledge base in their instructions
+    instead (packed_instructions), sent once when the session opens, and get
+    nothing here.
+
+    Returns:
+        Estimated tokens added
+    """
+    if isinstance(agent.llm, llm.RealtimeModel):
+        return 0
+    return inject_knowledge(index, turn_ctx, new_message, max_tokens=max_tokens)
@@ -0,0 +1,204 @@
+"""
+Opt-in event-loop stall watchdog that names the tool or task that blocked the loop.
+"""
+import asyncio
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from types import FrameType
+
+import prometheus_client
+
+LOOP_LAG_SECONDS = prometheus_client.Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran the watchdog heartbeat",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+LOOP_STALL_SECONDS = prometheus_client.Histogram(
+    "event_loop_stall_seconds",
+    "Event loop stalls over the watchdog threshold, by what was running",
+    ["culprit"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+# Application code lives next to this module; everything else is a library frame
+WATCHDOG_FILE = os.path.abspath(__file__)
+APP_DIR = os.path.dirname(WATCHDOG_FILE)
+
+
+class LoopWatchdog:
+    """
+    Measures event-loop lag continuously and attributes stalls.
+
+    A heartbeat scheduled on the loop every interval records when it ran; a
+    background thread checks it and, once the loop has been stuck for longer
+    than threshold, samples the loop thread's stack. When the late heartbeat
+    finally runs, the stall is attributed to the innermost registered function
+    tool on that stack, else the running task if it was given a name, else the
+    innermost application frame, and reported as a metric and a log.
+
+    The thread exits on stop(), or by itself once the loop is closed.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        threshold: float = 0.1,
+        interval: float = 0.02,
+        max_logs_per_minute: int = 10,
+    ) -> None:
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval
+        self.max_logs_per_minute = max_logs_per_minute
+        self.stalls: dict[str, list[float]] = {}
+        # Jobs on this loop that called start_watchdog() and have not yet called stop_watchdog()
+        self.users = 0
+
+        self._tools: dict[object, str] = {}
+        self._last_tick = time.monotonic()
+        self._tick_seq = 0
+        self._sample: tuple[int, str, str] | None = None
+        self._loop_thread: int | None = None
+        self._log_times: list[float] = []
+        self._stop = threading.Event()
+        self._timer: asyncio.TimerHandle | None = None
+
+    def register_tools(self, tools) -> None:
+        """Name stalls inside these function tools after the tool."""
+        for tool in tools:
+            func = inspect.unwrap(tool)
+            self._tools[func.__code__] = getattr(getattr(tool, "info", None), "name", func.__name__)
+
+    def start(self) -> None:
+        self.loop.call_soon_threadsafe(self._arm)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _arm(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._timer = self.loop.call_later(self.interval, self._on_tick)
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def _on_tick(self) -> None:
+        now = time.monotonic()
+        lag = max(0.0, now - self._last_tick - self.interval)
+        sample, self._sample = self._sample, None
+        seq = self._tick_seq
+        self._tick_seq += 1
+        self._last_tick = now
+        if not self._stop.is_set():
+            self._timer = self.loop.call_later(self.interval, self._on_tick)
+
+        LOOP_LAG_SECONDS.observe(lag)
+        if lag < self.threshold:
+            return
+        if sample is not None and sample[0] == seq:
+            culprit, stack = sample[1], sample[2]
+        else:
+            culprit, stack = "unknown", ""
+        self._report(culprit, lag, stack)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self.loop.is_closed():
+                # Nobody stopped us; don't keep the loop alive past its own end
+                self._stop.set()
+                if _watchdogs.get(self.loop) is self:
+                    _watchdogs.pop(self.loop, None)
+                return
+            seq = self._tick_seq
+            stuck_for = time.monotonic() - self._last_tick - self.interval
+            # One sample per stall, taken while the loop is still stuck in it
+            if stuck_for >= self.threshold and (self._sample is None or self._sample[0] != seq):
+                self._sample = (seq, *self._take_sample())
+
+    def _take_sample(self) -> tuple[str, str]:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return "unknown", ""
+        task = None
+        try:
+            task = asyncio.current_task(self.loop)
+        except RuntimeError:
+            pass
+        task_name = task.get_name() if task is not None else None
+        culprit = self.attribute(frame, task_name)
+        stack = "".join(traceback.format_list(traceback.extract_stack(frame, limit=15)))
+        return culprit, stack
+
+    def attribute(self, frame: FrameType, task_name: str | None) -> str:
+        """Name what a stack belongs to: tool:<name>, task:<name> or the innermost app function."""
+        app_function = None
+        while frame is not None:
+            tool = self._tools.get(frame.f_code)
+            if tool is not None:
+                return f"tool:{tool}"
+            filename = os.path.abspath(frame.f_code.co_filename)
+            if app_function is None and filename.startswith(APP_DIR) and filename != WATCHDOG_FILE:
+                module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+                app_function = f"{module}.{frame.f_code.co_name}"
+            frame = frame.f_back
+        # asyncio names unnamed tasks Task-<n>, which says nothing about what it was
+        if task_name and not task_name.startswith("Task-"):
+            return f"task:{task_name}"
+        return app_function or "unknown"
+
+    def _report(self, culprit: str, duration: float, stack: str) -> None:
+        LOOP_STALL_SECONDS.labels(culprit=culprit).observe(duration)
+        self.stalls.setdefault(culprit, []).append(duration)
+
+        now = time.monotonic()
+        self._log_times = [t for t in self._log_times if now - t < 60]
+        if len(self._log_times) >= self.max_logs_per_minute:
+            return
+        self._log_times.append(now)
+        logging.warning(f"Event loop blocked for {duration * 1000:.0f} ms by {culprit}\n{stack}")
+
+
+_watchdogs: dict[asyncio.AbstractEventLoop, LoopWatchdog] = {}
+
+
+def start_watchdog(tools=()) -> LoopWatchdog | None:
+    """
+    Watch the running loop if LOOP_WATCHDOG_MS is set, once per loop.
+
+    Each call must be paired with stop_watchdog() when the caller's job ends.
+
+    Returns:
+        The loop's watchdog, or None when the watchdog is disabled
+    """
+    threshold_ms = float(os.getenv("LOOP_WATCHDOG_MS", "0") or 0)
+    if threshold_ms <= 0:
+        return None
+    loop = asyncio.get_running_loop()
+    watchdog = _watchdogs.get(loop)
+    if watchdog is None:
+        threshold = threshold_ms / 1000
+        watchdog = _watchdogs[loop] = LoopWatchdog(loop, threshold=threshold, interval=min(0.02, threshold / 5))
+        watchdog.start()
+        logging.info(f"Event loop watchdog started (threshold {threshold_ms:.0f} ms)")
+    watchdog.users += 1
+    watchdog.register_tools(tools)
+    return watchdog
+
+
+def stop_watchdog() -> None:
+    """Release the running loop's watchdog; the last job on the loop to release it stops its thread."""
+    loop = asyncio.get_running_loop()
+    watchdog = _watchdogs.get(loop)
+    if watchdog is None:
+        return
+    watchdog.users -= 1
+    if watchdog.users <= 0:
+        watchdog.stop()
+        _watchdogs.pop(loop, None)
+        logging.info("Event loop watchdog stopped")
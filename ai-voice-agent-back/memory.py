@@ -0,0 +1,351 @@
+"""
+Loading and saving conversation memories with Mem0.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import TYPE_CHECKING
+
+from livekit.agents import ChatContext
+from mem0 import AsyncMemoryClient
+
+from tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from sessions import SessionState
+
+
+# Compiled once; tried in order on the user's reply to the greeting
+NAME_PATTERNS = [
+    re.compile(r"(?:my name is|i'm|i am|it's|name is|this is|call me)\s+([a-zA-Z]+)", re.IGNORECASE),
+    re.compile(r"^([a-zA-Z]+)$", re.IGNORECASE),  # Just a single name
+    re.compile(r"([a-zA-Z]+)\s*$", re.IGNORECASE),  # Name at the end
+]
+
+
+def extract_name(content: str) -> str:
+    """
+    Extract just the name from the user's reply to the greeting.
+
+    e.g., "My name is Gregory" -> "Gregory"
+    e.g., "I'm John" -> "John"
+    e.g., "Gregory" -> "Gregory"
+    """
+    content = content.strip()
+    for pattern in NAME_PATTERNS:
+        match = pattern.search(content)
+        if match:
+            return match.group(1).strip()
+    return content
+
+
+# Ids of injected memory messages start with this, so saving can skip them without reading them
+MEMORY_ITEM_PREFIX = "memory_"
+
+
+def _memory_results(response) -> list[dict]:
+    # Depending on the API version mem0 returns a list or {"results": [...]}
+    if isinstance(response, dict):
+        return response.get("results", [])
+    return response or []
+
+
+class MemoryRetriever:
+    """
+    Ranks a user's memories against the live conversation and injects the best ones.
+
+    Instead of loading every stored memory, each retrieval runs a mem0 search for
+    the current topic, keeps the top_k results that have not been injected yet and
+    fit in what is left of the session's token budget, and adds only those to the
+    assistant's context as one small system message.
+    """
+
+    def __init__(
+        self,
+        mem0: AsyncMemoryClient,
+        state: "SessionState",
+        top_k: int = 5,
+        max_tokens: int = 400,
+    ) -> None:
+        self.mem0 = mem0
+        self.state = state
+        self.top_k = top_k
+        self.max_tokens = max_tokens
+        self.used_tokens = 0
+        self.injected: dict[str, dict] = {}
+        self.injections = 0
+        self._refresh_task: asyncio.Task | None = None
+        self._refresh_query = ""
+        self._next_task: asyncio.Task | None = None
+        self._next_query = ""
+
+    async def retrieve(self, query: str) -> int:
+        """
+        Search the user's memories for query and inject the new relevant ones.
+
+        Returns:
+            The number of memories added to the context
+        """
+        user_name = self.state.user_name
+        if not user_name or self.used_tokens >= self.max_tokens:
+            return 0
+
+        try:
+            start = time.perf_counter()
+            results = _memory_results(await self.mem0.search(query, user_id=user_name, top_k=self.top_k))
+            search_time = time.perf_counter() - start
+        except Exception as e:
+            logging.error(f"Failed to retrieve memories for {user_name}: {e}")
+            return 0
+
+        # Results come back ranked by relevance; keep the best unseen ones that fit the budget
+        selected = []
+        for result in results[:self.top_k]:
+            memory_id = result.get("id") or result["memory"]
+            if memory_id in self.injected:
+                continue
+            cost = estimate_tokens(result["memory"]) + 2
+            if self.used_tokens + cost > self.max_tokens:
+                break
+            self.used_tokens += cost
+            self.injected[memory_id] = {
+                "memory": result["memory"],
+                "updated_at": result.get("updated_at", "")
+            }
+            selected.append(result)
+
+        if not selected:
+            logging.info(f"No new relevant memories for {user_name} ({len(results)} results in {search_time * 1000:.0f} ms)")
+            return 0
+
+        self.state.memory_str = json.dumps(list(self.injected.values()))
+        logging.info(
+            f"Injecting {len(selected)} of {len(results)} memories for {user_name} "
+            f"(search {search_time * 1000:.0f} ms, {self.used_tokens}/{self.max_tokens} tokens used)"
+        )
+
+        # Format memories in a natural, readable way for the AI
+        memory_lines = [f"- {result['memory']}" for result in selected]
+        memory_content = f"""Previous conversation memories about {user_name}:
+
+{chr(10).join(memory_lines)}
+
+Use these memories to personalize your responses and remember past conversations with {user_name}."""
+
+        # Add memories to the chat context using the proper API
+        assistant = self.state.assistant
+        if hasattr(assistant, 'chat_ctx') and assistant.chat_ctx is not None:
+            ctx_copy = assistant.chat_ctx.copy()
+            self.injections += 1
+            ctx_copy.add_message(
+                id=f"{MEMORY_ITEM_PREFIX}{self.state.job_id}_{self.injections}",
+                role="system",
+                content=memory_content
+            )
+            # Update the agent's chat context (MUST await this!)
+            await assistant.update_chat_ctx(ctx_copy)
+        return len(selected)
+
+    def prefetch(self) -> asyncio.Task:
+        """Start retrieving the memories most useful for opening the conversation."""
+        query = f"{self.state.user_name}'s preferences, recent banking issues and open topics"
+        return self.refresh(query)
+
+    def refresh(self, query: str) -> asyncio.Task:
+        """
+        Retrieve in the background, one search at a time.
+
+        The query already being searched shares that search. Other queries that
+        arrive meanwhile are coalesced into one follow-up search for the newest
+        of them, which starts when the current one finishes, so a topic raised
+        mid-search is not lost and injections never race each other.
+        """
+        running = self._refresh_task
+        if running is None or running.done():
+            self._refresh_task = asyncio.create_task(self.retrieve(query), name="memory_refresh")
+            self._refresh_query = query
+            return self._refresh_task
+        if " ".join(query.lower().split()) == " ".join(self._refresh_query.lower().split()):
+            return running
+        self._next_query = query
+        if self._next_task is None:
+            self._next_task = asyncio.create_task(self._refresh_after(running), name="memory_refresh")
+        return self._next_task
+
+    async def _refresh_after(self, running: asyncio.Task) -> int:
+        await asyncio.wait([running])
+        # From here on this is the running search, and new queries queue behind it
+        self._refresh_task, self._refresh_query = self._next_task, self._next_query
+        self._next_task = None
+        return await self.retrieve(self._refresh_query)
+
+
+def is_memory_item(item) -> bool:
+    """Whether a chat item is a memory message injected by MemoryRetriever."""
+    return item.id.startswith(MEMORY_ITEM_PREFIX)
+
+
+async def shutdown_hook(
+    chat_ctx: ChatContext,
+    mem0: AsyncMemoryClient,
+    user_id: str,
+    skip_ids: set[str] | None = None,
+    chunk_size: int = 50,
+    max_concurrency: int = 4,
+) -> list[str]:
+    """
+    Save the chat context to memory.
+
+    Messages are formatted as the items are walked and uploaded in chunks of
+    chunk_size, with at most max_concurrency uploads in flight, so a long call
+    never builds its whole transcript into one payload.
+
+    Args:
+        chat_ctx: The chat context containing conversation history
+        mem0: The Mem0 client instance
+        user_id: The user identifier for storing memories
+        skip_ids: Ids of chat items that were already saved and must not be sent again
+        chunk_size: The maximum number of messages per mem0.add() call
+        max_concurrency: The maximum number of uploads in flight
+
+    Returns:
+        The ids of the chat items that were saved, empty if nothing was saved
+    """
+    slots = asyncio.Semaphore(max_concurrency)
+    uploads: list[asyncio.Task] = []
+
+    async def upload(messages: list[dict], item_ids: list[str]) -> list[str]:
+        try:
+            result = await mem0.add(messages, user_id=user_id)
+            logging.debug(f"Memory chunk saved: {result}")
+            return item_ids
+        except Exception as e:
+            logging.error(f"Failed to save {len(messages)} messages to memory: {e}")
+            return []
+        finally:
+            slots.release()
+
+    async def send(messages: list[dict], item_ids: list[str]) -> None:
+        # Wait for a free slot before formatting more, so only a few chunks are ever held
+        await slots.acquire()
+        uploads.append(asyncio.create_task(upload(messages, item_ids), name="memory_upload"))
+
+    messages_formatted = []
+    item_ids = []
+    for item in chat_ctx.items:
+        if skip_ids and item.id in skip_ids:
+            continue
+
+        # Only save user and assistant messages (skip system messages and injected memories)
+        if getattr(item, 'role', None) not in ['user', 'assistant'] or is_memory_item(item):
+            continue
+
+        # Handle content that could be a list or string
+        content_str = ''.join(str(c) for c in item.content) if isinstance(item.content, list) else str(item.content)
+
+        messages_formatted.append({
+            "role": item.role,
+            "content": content_str.strip()
+        })
+        item_ids.append(item.id)
+        if len(messages_formatted) >= chunk_size:
+            await send(messages_formatted, item_ids)
+            messages_formatted, item_ids = [], []
+
+    if messages_formatted:
+        await send(messages_formatted, item_ids)
+    if not uploads:
+        logging.info("No new messages to save to memory.")
+        return []
+
+    saved_ids = [item_id for chunk_ids in await asyncio.gather(*uploads) for item_id in chunk_ids]
+    logging.info(f"Saved {len(saved_ids)} messages to memory for user {user_id} in {len(uploads)} chunks")
+    return saved_ids
+
+
+class ConversationFlusher:
+    """
+    Single entry point for saving one session's conversation to Mem0.
+
+    Disconnect handlers, session close, the shutdown callback and the signal
+    handler all call flush(); flushes are serialised and each one only uploads
+    the items added since the last successful flush, so a session closing
+    through several paths at once still saves every message once.
+    Long calls are checkpointed periodically so the final flush stays small.
+    """
+
+    def __init__(
+        self,
+        mem0: AsyncMemoryClient,
+        state: "SessionState",
+        checkpoint_interval: float = 300.0,
+        chunk_size: int = 50,
+        max_concurrency: int = 4,
+    ) -> None:
+        self.mem0 = mem0
+        self.state = state
+        self.checkpoint_interval = checkpoint_interval
+        self.chunk_size = chunk_size
+        self.max_concurrency = max_concurrency
+        self.flushes = 0
+        self._flushed_ids: set[str] = set()
+        self._lock = asyncio.Lock()
+        self._checkpoint_task: asyncio.Task | None = None
+
+    async def flush(self, reason: str) -> int:
+        """
+        Save the items added since the last successful flush.
+
+        Args:
+            reason: What triggered the flush, for the logs
+
+        Returns:
+            The number of chat items saved
+        """
+        user_id = self.state.user_name
+        if not user_id:
+            logging.info(f"Skipping memory flush ({reason}): user has not been identified")
+            return 0
+
+        async with self._lock:
+            assistant = self.state.assistant
+            if not hasattr(assistant, 'chat_ctx') or assistant.chat_ctx is None:
+                return 0
+
+            saved_ids = await shutdown_hook(
+                assistant.chat_ctx,
+                self.mem0,
+                user_id,
+                skip_ids=self._flushed_ids,
+                chunk_size=self.chunk_size,
+                max_concurrency=self.max_concurrency,
+            )
+            if saved_ids:
+                self._flushed_ids.update(saved_ids)
+                self.flushes += 1
+                logging.info(f"Flushed {len(saved_ids)} new messages for {user_id} ({reason})")
+            return len(saved_ids)
+
+    def is_flushed(self, item_id: str) -> bool:
+        return item_id in self._flushed_ids
+
+    def start_checkpoints(self) -> None:
+        if self._checkpoint_task is None and self.checkpoint_interval > 0:
+            self._checkpoint_task = asyncio.create_task(self._checkpoint_loop(), name="memory_checkpoint")
+
+    async def _checkpoint_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self.flush("checkpoint")
+            except Exception as e:
+                logging.error(f"Memory checkpoint failed: {e}")
+
+    async def aclose(self, reason: str = "session closed") -> None:
+        """Stop checkpointing and save whatever is left."""
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            self._checkpoint_task = None
+        await self.flush(reason)
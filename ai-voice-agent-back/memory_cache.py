@@ -0,0 +1,145 @@
+"""
+Read-through cache in front of the Mem0 client.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class CachedMemoryClient:
+    """
+    Wraps AsyncMemoryClient and caches get_all() and search() results per user.
+
+    Entries are fresh for ttl seconds. For a further stale_ttl seconds a read
+    returns the cached value immediately and refreshes it in the background,
+    and if Mem0 is slow or unavailable on a miss the last known value is served
+    instead of failing. Our own add() calls invalidate that user's entries, and
+    the least recently used users are evicted beyond max_users.
+    Every other attribute is passed straight through to the wrapped client.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        ttl: float = 300.0,
+        stale_ttl: float = 3600.0,
+        max_users: int = 1000,
+        timeout: float = 3.0,
+    ) -> None:
+        self.client = client
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_users = max_users
+        self.timeout = timeout
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        self._users: OrderedDict[str, dict[Hashable, tuple[float, Any]]] = OrderedDict()
+        self._inflight: dict[tuple[asyncio.AbstractEventLoop, str, Hashable], tuple[float, asyncio.Task]] = {}
+        # When each user's entries were last invalidated, so fetches that started
+        # before one of our add() calls do not repopulate the cache with old data
+        self._invalidated_at: OrderedDict[str, float] = OrderedDict()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    async def get_all(self, user_id: str, **kwargs) -> Any:
+        key = ("get_all", tuple(sorted(kwargs.items())))
+        return await self._read(user_id, key, lambda: self.client.get_all(user_id=user_id, **kwargs))
+
+    async def search(self, query: str, user_id: str, **kwargs) -> Any:
+        key = ("search", " ".join(query.lower().split()), tuple(sorted(kwargs.items())))
+        return await self._read(user_id, key, lambda: self.client.search(query, user_id=user_id, **kwargs))
+
+    async def add(self, messages: list[dict], user_id: str, **kwargs) -> Any:
+        result = await self.client.add(messages, user_id=user_id, **kwargs)
+        # Mem0 will extract new memories from these messages, so cached reads are outdated
+        self.invalidate(user_id)
+        return result
+
+    def invalidate(self, user_id: str | None = None) -> None:
+        """Drop the cached entries for one user, or for everyone when no user is given."""
+        now = time.monotonic()
+        if user_id is None:
+            for cached_user in self._users:
+                self._invalidated_at[cached_user] = now
+            self._users.clear()
+        else:
+            self._users.pop(user_id, None)
+            self._invalidated_at[user_id] = now
+            self._invalidated_at.move_to_end(user_id)
+        while len(self._invalidated_at) > self.max_users:
+            self._invalidated_at.popitem(last=False)
+
+    def stats(self) -> dict:
+        reads = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": (self.hits + self.stale_hits) / reads if reads else 0.0,
+            "users": len(self._users),
+        }
+
+    async def _read(self, user_id: str, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entries = self._users.get(user_id)
+        entry = entries.get(key) if entries else None
+        if entry is not None:
+            self._users.move_to_end(user_id)
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                # Serve what we have and refresh it for the next reader
+                self.stale_hits += 1
+                self._fetch(user_id, key, fetch)
+                return entry[1]
+
+        self.misses += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._fetch(user_id, key, fetch)), self.timeout)
+        except Exception as e:
+            self.errors += 1
+            if entry is None:
+                raise
+            logging.warning(f"Mem0 read failed for {user_id}, serving cached result: {e!r}")
+            return entry[1]
+
+    def _fetch(self, user_id: str, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        # Concurrent reads of the same entry share one request
+        inflight_key = (asyncio.get_running_loop(), user_id, key)
+        inflight = self._inflight.get(inflight_key)
+        if inflight is not None and inflight[0] >= self._invalidated_at.get(user_id, 0.0):
+            return inflight[1]
+
+        started = time.monotonic()
+        task = asyncio.ensure_future(self._fetch_and_store(user_id, key, fetch, started))
+        self._inflight[inflight_key] = (started, task)
+        task.add_done_callback(lambda t: self._on_fetch_done(inflight_key, t))
+        return task
+
+    async def _fetch_and_store(
+        self, user_id: str, key: Hashable, fetch: Callable[[], Awaitable[Any]], started: float
+    ) -> Any:
+        value = await fetch()
+        if started < self._invalidated_at.get(user_id, 0.0):
+            return value
+        self._users.setdefault(user_id, {})[key] = (time.monotonic(), value)
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return value
+
+    def _on_fetch_done(self, inflight_key: tuple, task: asyncio.Task) -> None:
+        inflight = self._inflight.get(inflight_key)
+        if inflight is not None and inflight[1] is task:
+            del self._inflight[inflight_key]
+        if not task.cancelled() and task.exception() is not None:
+            logging.warning(f"Mem0 refresh for {inflight_key[1]} failed: {task.exception()!r}")
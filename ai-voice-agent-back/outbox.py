@@ -0,0 +1,304 @@
+"""
+Durable outbox for email: messages are spooled to SQLite and delivered by
+background threads over persistent, authenticated SMTP connections.
+"""
+import contextlib
+import json
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sender TEXT NOT NULL,
+    recipients TEXT NOT NULL,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    sent_at REAL,
+    last_error TEXT,
+    owner TEXT,
+    claimed_at REAL
+)
+"""
+
+# Rows a delivery thread may take: due pending mail, and claims whose lease ran out
+CLAIMABLE = (
+    "(status = 'pending' AND next_attempt_at <= :now) "
+    "OR (status = 'sending' AND (claimed_at IS NULL OR claimed_at <= :now - :lease))"
+)
+
+
+def migrate_add_claim_columns(db: sqlite3.Connection) -> None:
+    """Add owner and claimed_at to an outbox table created before claims had leases."""
+    columns = {row[1] for row in db.execute("PRAGMA table_info(outbox)")}
+    if "owner" not in columns:
+        db.execute("ALTER TABLE outbox ADD COLUMN owner TEXT")
+    if "claimed_at" not in columns:
+        db.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+
+
+class SMTPOutbox:
+    """
+    Spool outgoing mail and deliver it in the background.
+
+    Each delivery thread owns one SMTP connection that stays logged in between
+    messages, so STARTTLS and AUTH are paid once per connection rather than per
+    email. Failed deliveries are retried with exponential backoff.
+
+    Every job process opens its own outbox on the same database, so a claim is
+    a conditional UPDATE that only one of them can win, stamped with the
+    claiming outbox's owner id and time. A claim older than lease_timeout is
+    taken to belong to a process that died mid-send and is picked up again;
+    claims held by live processes are left alone.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        starttls: bool = True,
+        pool_size: int = 2,
+        max_attempts: int = 5,
+        backoff: float = 2.0,
+        idle_timeout: float = 60.0,
+        lease_timeout: float = 300.0,
+    ) -> None:
+        self.path = path
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.pool_size = pool_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.lease_timeout = lease_timeout
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self.delivered = 0
+        self.failed = 0
+        self.last_delivery_latency: float | None = None
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+        with self._connect() as db:
+            db.execute(SCHEMA)
+            migrate_add_claim_columns(db)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.pool_size):
+            thread = threading.Thread(target=self._run, name=f"smtp-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"SMTP outbox started with {self.pool_size} connections, {self.queue_depth()} queued")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, recipients: list[str], message: str) -> int:
+        """
+        Add a message to the spool and wake a delivery thread.
+
+        Args:
+            recipients: Envelope recipients (To and Cc)
+            message: The full RFC 5322 message text
+
+        Returns:
+            The outbox id of the queued message
+        """
+        now = time.time()
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO outbox (sender, recipients, message, created_at, next_attempt_at) VALUES (?, ?, ?, ?, ?)",
+                (self.user, json.dumps(recipients), message, now, now),
+            )
+            message_id = cursor.lastrowid
+        self._wakeup.set()
+        return message_id
+
+    def queue_depth(self) -> int:
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "last_delivery_latency": self.last_delivery_latency,
+        }
+
+    def _claim(self) -> tuple | None:
+        """Take the oldest claimable message, or None. Safe across threads and processes."""
+        while True:
+            params = {"now": time.time(), "lease": self.lease_timeout, "owner": self.owner}
+            with self._connect() as db:
+                rows = db.execute(
+                    "SELECT id, sender, recipients, message, attempts, created_at FROM outbox "
+                    f"WHERE {CLAIMABLE} ORDER BY id LIMIT 1",
+                    params,
+                ).fetchall()
+                if not rows:
+                    return None
+                # Only one claimer's UPDATE can still match; the others see rowcount 0 and look again
+                claimed = db.execute(
+                    "UPDATE outbox SET status = 'sending', owner = :owner, claimed_at = :now "
+                    f"WHERE id = :id AND ({CLAIMABLE})",
+                    {**params, "id": rows[0][0]},
+                ).rowcount
+            if claimed:
+                return rows[0]
+
+    def _next_due_in(self) -> float:
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT MIN(CASE WHEN status = 'pending' THEN next_attempt_at "
+                "ELSE COALESCE(claimed_at, 0) + ? END) FROM outbox WHERE status IN ('pending', 'sending')",
+                (self.lease_timeout,),
+            ).fetchone()
+        if row[0] is None:
+            return self.idle_timeout
+        return max(0.0, min(self.idle_timeout, row[0] - time.time()))
+
+    def _finish(self, message_id: int, assignments: str, params: tuple) -> None:
+        """Record the outcome of a delivery, unless the claim expired and another outbox took the message."""
+        with self._connect() as db:
+            updated = db.execute(
+                f"UPDATE outbox SET {assignments}, owner = NULL WHERE id = ? AND owner = ?",
+                (*params, message_id, self.owner),
+            ).rowcount
+        if not updated:
+            logging.warning(f"Lost the claim on email {message_id} to another outbox; leaving its status to that one")
+
+    def _open_connection(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        server.login(self.user, self.password)
+        return server
+
+    def _close_connection(self, server: smtplib.SMTP | None) -> None:
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _send(self, server: smtplib.SMTP | None, sender: str, recipients: list[str], message: str) -> smtplib.SMTP:
+        """Send over the existing connection, reconnecting once if the server dropped it."""
+        if server is not None:
+            try:
+                server.sendmail(sender, recipients, message)
+                return server
+            except smtplib.SMTPServerDisconnected:
+                logging.info("SMTP connection was closed by the server, reconnecting...")
+        server = self._open_connection()
+        server.sendmail(sender, recipients, message)
+        return server
+
+    def _run(self) -> None:
+        server = None
+        last_used = 0.0
+        while not self._stopping.is_set():
+            row = self._claim()
+            if row is None:
+                # Drop connections that have been idle long enough for the server to time them out
+                if server is not None and time.monotonic() - last_used > self.idle_timeout:
+                    self._close_connection(server)
+                    server = None
+                self._wakeup.wait(self._next_due_in())
+                self._wakeup.clear()
+                continue
+
+            message_id, sender, recipients, message, attempts, created_at = row
+            try:
+                server = self._send(server, sender, json.loads(recipients), message)
+                last_used = time.monotonic()
+                self._finish(message_id, "status = 'sent', sent_at = ?", (time.time(),))
+                self.delivered += 1
+                self.last_delivery_latency = time.time() - created_at
+                logging.info(
+                    f"Delivered email {message_id} to {recipients} "
+                    f"{self.last_delivery_latency:.2f}s after queueing (queue depth {self.queue_depth()})"
+                )
+            except Exception as e:
+                self._close_connection(server)
+                server = None
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    status, next_attempt_at = "failed", time.time()
+                    self.failed += 1
+                    logging.error(f"Giving up on email {message_id} after {attempts} attempts: {e}")
+                else:
+                    status, next_attempt_at = "pending", time.time() + self.backoff * 2 ** (attempts - 1)
+                    logging.warning(f"Delivery of email {message_id} failed (attempt {attempts}), retrying: {e}")
+                self._finish(
+                    message_id,
+                    "status = ?, attempts = ?, next_attempt_at = ?, last_error = ?",
+                    (status, attempts, next_attempt_at, str(e)),
+                )
+        self._close_connection(server)
+
+
+_outbox: SMTPOutbox | None = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> SMTPOutbox | None:
+    """
+    Return the process's outbox, started, or None when Gmail credentials are not configured.
+
+    Called from prewarm, so each worker process starts delivering mail spooled
+    before it started, including claims left by a process that died, without
+    waiting for its first send_email.
+    """
+    global _outbox
+    gmail_user = os.getenv("GMAIL_USER")
+    gmail_password = os.getenv("GMAIL_APP_PASSWORD")
+    if not gmail_user or not gmail_password:
+        return None
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = SMTPOutbox(
+                path=os.getenv("OUTBOX_PATH", "outbox.db"),
+                host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+                port=int(os.getenv("SMTP_PORT", "587")),
+                user=gmail_user,
+                password=gmail_password,
+                starttls=os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+                pool_size=int(os.getenv("OUTBOX_POOL_SIZE", "2")),
+                lease_timeout=float(os.getenv("OUTBOX_LEASE_TIMEOUT", "300")),
+            )
+            _outbox.start()
+        return _outbox
@@ -0,0 +1,181 @@
+"""
+Pre-rendered audio for fixed phrases, so they play without an LLM or TTS round trip.
+"""
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import time
+from typing import AsyncIterator
+
+import prometheus_client
+from livekit import rtc
+from livekit.agents import AgentSession, tts
+
+FIRST_AUDIO_SECONDS = prometheus_client.Histogram(
+    "phrase_first_audio_seconds",
+    "Time from asking for a stock phrase to its first audio frame playing",
+    ["phrase", "source"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0),
+)
+
+
+def tts_identity(model: tts.TTS) -> str:
+    """Provider, model, voice and output format: everything that changes how a phrase sounds."""
+    # Plugins keep the voice in their options rather than a public property
+    voice = getattr(getattr(model, "_opts", None), "voice", None)
+    return f"{model.provider}|{model.model}|{voice}|{model.sample_rate}|{model.num_channels}"
+
+
+class PhraseAudio:
+    """One phrase's PCM, memory-mapped from disk and played as 20 ms frames."""
+
+    def __init__(self, path: str, sample_rate: int, num_channels: int, frame_ms: int = 20) -> None:
+        self.path = path
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.samples_per_frame = sample_rate * frame_ms // 1000
+        with open(path, "rb") as f:
+            # The mapping stays valid after the file is closed; pages are shared by every process reading it
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def duration(self) -> float:
+        return len(self._map) / 2 / self.num_channels / self.sample_rate
+
+    async def frames(self) -> AsyncIterator[rtc.AudioFrame]:
+        frame_bytes = self.samples_per_frame * self.num_channels * 2
+        view = memoryview(self._map)
+        try:
+            for offset in range(0, len(view), frame_bytes):
+                chunk = view[offset:offset + frame_bytes]
+                yield rtc.AudioFrame(
+                    data=bytes(chunk),
+                    sample_rate=self.sample_rate,
+                    num_channels=self.num_channels,
+                    samples_per_channel=len(chunk) // 2 // self.num_channels,
+                )
+        finally:
+            view.release()
+
+
+class PhraseAudioCache:
+    """
+    Synthesized audio for stock phrases, keyed by text and TTS voice.
+
+    Each phrase is rendered once by the TTS it will be spoken with and stored as
+    raw 16-bit PCM in directory, named by a hash of the text and the TTS's
+    provider, model, voice and format, so a voice change renders it again
+    instead of playing the old recording. Files are written atomically and
+    memory-mapped, so every worker process and session shares one copy.
+    say() plays a cached phrase straight away; on a miss it falls back to live
+    TTS and renders the phrase in the background for the next caller.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._audio: dict[str, PhraseAudio] = {}
+        self._rendering: dict[str, asyncio.Task] = {}
+
+    def key(self, text: str, model: tts.TTS) -> str:
+        return hashlib.sha256(f"{tts_identity(model)}|{text}".encode()).hexdigest()[:32]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def get(self, text: str, model: tts.TTS) -> PhraseAudio | None:
+        """The phrase's audio if it has been rendered for this TTS, by any process."""
+        key = self.key(text, model)
+        audio = self._audio.get(key)
+        if audio is None and os.path.exists(self._path(key)):
+            audio = self._audio[key] = PhraseAudio(self._path(key), model.sample_rate, model.num_channels)
+        return audio
+
+    async def render(self, text: str, model: tts.TTS) -> PhraseAudio:
+        """Synthesize the phrase with model and store it."""
+        key = self.key(text, model)
+        start = time.perf_counter()
+        pcm = bytearray()
+        async with model.synthesize(text) as stream:
+            async for event in stream:
+                frame = event.frame
+                if frame.sample_rate != model.sample_rate or frame.num_channels != model.num_channels:
+                    raise ValueError(
+                        f"{model.provider} returned {frame.sample_rate} Hz x{frame.num_channels}, "
+                        f"expected {model.sample_rate} Hz x{model.num_channels}"
+                    )
+                pcm += frame.data.cast("B")
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename, so another process never maps a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pcm)
+        os.replace(tmp_path, self._path(key))
+        self._audio.pop(key, None)
+        audio = self.get(text, model)
+        logging.info(
+            f"Rendered phrase audio {key} in {(time.perf_counter() - start) * 1000:.0f} ms "
+            f"({audio.duration:.1f}s, {len(pcm) / 1024:.0f} KiB): {text[:60]!r}"
+        )
+        return audio
+
+    async def prerender(self, texts: list[str], model: tts.TTS) -> int:
+        """Render the phrases that are not cached yet; returns how many were rendered."""
+        missing = [text for text in texts if self.get(text, model) is None]
+        results = await asyncio.gather(*(self.render(text, model) for text in missing), return_exceptions=True)
+        for text, result in zip(missing, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Could not render phrase audio for {text[:60]!r}: {result}")
+        return sum(not isinstance(result, Exception) for result in results)
+
+    def _render_in_background(self, text: str, model: tts.TTS) -> None:
+        key = self.key(text, model)
+        if key in self._rendering:
+            return
+        task = asyncio.create_task(self.prerender([text], model), name="phrase_render")
+        self._rendering[key] = task
+        task.add_done_callback(lambda _: self._rendering.pop(key, None))
+
+    def say(self, session: AgentSession, text: str, model: tts.TTS, phrase: str = "phrase", **kwargs):
+        """
+        Speak text, from the cache when it has been rendered for model.
+
+        Args:
+            session: Session to speak in
+            text: The exact phrase
+            model: TTS the session would otherwise speak it with
+            phrase: Label for the time-to-first-audio metric
+            kwargs: Passed on to session.say()
+
+        Returns:
+            The speech handle
+        """
+        requested_at = time.perf_counter()
+        audio = self.get(text, model)
+        if audio is not None:
+            self.hits += 1
+            source = "cache"
+            handle = session.say(text, audio=audio.frames(), **kwargs)
+        else:
+            self.misses += 1
+            source = "tts"
+            handle = session.say(text, **kwargs)
+            self._render_in_background(text, model)
+
+        def on_speaking(ev):
+            if ev.new_state != "speaking":
+                return
+            session.off("agent_state_changed", on_speaking)
+            seconds = time.perf_counter() - requested_at
+            FIRST_AUDIO_SECONDS.labels(phrase=phrase, source=source).observe(seconds)
+            logging.info(f"First audio of {phrase} after {seconds * 1000:.0f} ms ({source})")
+        session.on("agent_state_changed", on_speaking)
+        return handle
+
+
+phrase_audio = PhraseAudioCache(os.getenv("PHRASE_AUDIO_DIR", ".phrase_audio"))
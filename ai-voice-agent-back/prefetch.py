@@ -0,0 +1,192 @@
+"""
+Speculative tool prefetch: start weather and search lookups from interim transcripts.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import TYPE_CHECKING
+
+import prometheus_client
+
+from tool_runtime import runtime
+from tools import PREFETCHABLE_TOOLS
+
+if TYPE_CHECKING:
+    from sessions import SessionState
+
+
+WEATHER_PATTERN = re.compile(
+    r"\b(?:weather|temperature|forecast|raining|rain|snowing|sunny|hot|cold|humid|umbrella)\b"
+    r".*?\b(?:in|at|for)\s+(?P<city>[a-z][\w'.-]*(?:\s+[a-z][\w'.-]*){0,3})",
+    re.IGNORECASE,
+)
+SEARCH_PATTERN = re.compile(
+    r"\b(?:search(?:\s+(?:the\s+web|online|the\s+internet))?(?:\s+for)?|look\s+up|google"
+    r"|find\s+(?:me\s+)?(?:information|info)\s+(?:on|about)|research)\s+(?P<query>.+)",
+    re.IGNORECASE,
+)
+# Words that end a city name in speech: "in New York right now", "in Harare today please"
+TRAILING_WORDS = {
+    "today", "tomorrow", "tonight", "now", "right", "this", "week", "weekend", "morning",
+    "afternoon", "evening", "please", "currently", "at", "like", "then", "and", "or", "for", "me",
+}
+
+PREFETCHES = prometheus_client.Counter(
+    "tool_prefetch_total",
+    "Speculative tool lookups: hit (the model asked for it), wasted (it did not), "
+    "or miss (the model called a prefetchable tool nothing had been started for)",
+    ["tool", "outcome"],
+)
+PREFETCH_SAVED_SECONDS = prometheus_client.Histogram(
+    "tool_prefetch_saved_seconds",
+    "Lookup time already spent when the model called the tool",
+    ["tool"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0),
+)
+
+
+def _clean(text: str) -> str:
+    words = re.sub(r"[^\w\s'-]", " ", text).split()
+    while words and words[-1].lower() in TRAILING_WORDS:
+        words.pop()
+    if words and words[0].lower() == "the":
+        words.pop(0)
+    return " ".join(words)
+
+
+def detect_intents(transcript: str) -> list[tuple[str, str]]:
+    """
+    Tool calls a transcript is likely to lead to.
+
+    Returns:
+        (tool name, argument) pairs, e.g. ("get_weather", "New York")
+    """
+    intents = []
+    if match := WEATHER_PATTERN.search(transcript):
+        if city := _clean(match.group("city")):
+            intents.append(("get_weather", city))
+    if match := SEARCH_PATTERN.search(transcript):
+        query = _clean(match.group("query"))
+        if len(query) >= 3:
+            intents.append(("search_web", query))
+    return intents
+
+
+class SpeculativePrefetcher:
+    """
+    Starts likely tool lookups while the caller is still talking.
+
+    Interim transcripts are matched for weather and search intents; once an
+    intent reads the same in two transcripts in a row (or in a final one) its
+    lookup starts in the background and lands in the tool's own result cache,
+    so the model's later call returns without waiting. Lookups are capped per
+    user turn and run through runtime.speculate(), under the tool's session
+    slots, deadline and circuit breaker like its calls. When the model calls a
+    prefetchable tool, the call counts as a hit if a lookup with the same cache
+    key had been started, and the lookup time already spent is recorded as
+    saved.
+    """
+
+    def __init__(self, state: "SessionState", max_per_turn: int = 2, ttl: float = 60.0) -> None:
+        self.state = state
+        self.max_per_turn = max_per_turn
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+        self.saved: list[float] = []
+        # (tool, cache key) -> [started_at, finished_at]; wall clock, like function call timestamps
+        self._started: dict[tuple[str, str], list] = {}
+        self._previous: set[tuple[str, str]] = set()
+        self._turn_count = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    def on_user_input_transcribed(self, ev) -> None:
+        candidates = set(detect_intents(ev.transcript))
+        for tool, argument in candidates:
+            # A half-heard city ("weather in New") must not trigger a lookup
+            if ev.is_final or (tool, argument) in self._previous:
+                self._start(tool, argument)
+        self._previous = candidates
+        if ev.is_final:
+            self._previous = set()
+            self._turn_count = 0
+
+    def _start(self, tool: str, argument: str) -> None:
+        _, cache_key, prefetch = PREFETCHABLE_TOOLS[tool]
+        key = (tool, cache_key(argument))
+        if key in self._started or self._turn_count >= self.max_per_turn:
+            return
+        if runtime.breakers[tool].state == "open":
+            return
+        self._expire()
+        self._turn_count += 1
+        timing = self._started[key] = [time.time(), None]
+        logging.info(f"Prefetching {tool}({argument!r}) from interim transcript")
+
+        async def run():
+            try:
+                outcome = await prefetch(argument)
+                if outcome != "ok":
+                    # Nothing is cached on failure, so the real call simply tries again
+                    logging.debug(f"Prefetch of {tool}({argument!r}) ended {outcome}")
+            finally:
+                timing[1] = time.time()
+
+        task = asyncio.create_task(run(), name="tool_prefetch")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _expire(self) -> None:
+        now = time.time()
+        for key, (started_at, _) in list(self._started.items()):
+            if now - started_at > self.ttl:
+                del self._started[key]
+                self.wasted += 1
+                PREFETCHES.labels(tool=key[0], outcome="wasted").inc()
+
+    def on_function_tools_executed(self, ev) -> None:
+        for call in ev.function_calls:
+            if call.name not in PREFETCHABLE_TOOLS:
+                continue
+            arg_name, cache_key, _ = PREFETCHABLE_TOOLS[call.name]
+            try:
+                argument = json.loads(call.arguments or "{}").get(arg_name)
+            except (json.JSONDecodeError, AttributeError):
+                argument = None
+            timing = self._started.get((call.name, cache_key(argument))) if argument else None
+            if timing is None or timing[0] > call.created_at:
+                self.misses += 1
+                PREFETCHES.labels(tool=call.name, outcome="miss").inc()
+                continue
+            del self._started[(call.name, cache_key(argument))]
+            started_at, finished_at = timing
+            saved = max(0.0, min(finished_at or call.created_at, call.created_at) - started_at)
+            self.hits += 1
+            self.saved.append(saved)
+            PREFETCHES.labels(tool=call.name, outcome="hit").inc()
+            PREFETCH_SAVED_SECONDS.labels(tool=call.name).observe(saved)
+            logging.info(f"Prefetch hit for {call.name}({argument!r}), {saved * 1000:.0f} ms saved")
+
+    def summary(self) -> dict:
+        """Hit rate over prefetchable tool calls and speculative lookups, and latency saved."""
+        calls = self.hits + self.misses
+        speculated = self.hits + self.wasted + len(self._started)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "wasted": self.wasted + len(self._started),
+            "hit_rate": round(self.hits / calls, 2) if calls else None,
+            "precision": round(self.hits / speculated, 2) if speculated else None,
+            "saved_ms": round(sum(self.saved) * 1000),
+        }
+
+    async def aclose(self) -> dict:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for tool, _ in self._started:
+            PREFETCHES.labels(tool=tool, outcome="wasted").inc()
+        return self.summary()
@@ -0,0 +1,74 @@
+"""
+Per-session state, so one worker process can host many concurrent calls.
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable
+
+from livekit.agents import Agent
+
+if TYPE_CHECKING:
+    from audio_frontend import AdaptiveNoiseCancellation
+    from context_window import ContextCompactor
+    from memory import ConversationFlusher, MemoryRetriever
+    from prefetch import SpeculativePrefetcher
+    from turn_metrics import TurnMetrics
+    from video_sampler import VideoSampler
+
+
+@dataclass
+class SessionState:
+    """Everything one call needs to remember about itself."""
+
+    job_id: str
+    room_name: str
+    assistant: Agent | None = None
+    user_name: str | None = None
+    memory_str: str = ''
+    model_type: str = "openai"
+    video_enabled: bool = False
+    flusher: "ConversationFlusher | None" = None
+    retriever: "MemoryRetriever | None" = None
+    compactor: "ContextCompactor | None" = None
+    turn_metrics: "TurnMetrics | None" = None
+    prefetcher: "SpeculativePrefetcher | None" = None
+    audio_frontend: "AdaptiveNoiseCancellation | None" = None
+    video_sampler: "VideoSampler | None" = None
+    # Per-turn bookkeeping for a user message; set by attach_conversation
+    on_user_message: Callable[[str], None] | None = None
+    started_at: float = field(default_factory=time.time)
+
+
+class SessionRegistry:
+    """Active sessions in this worker process, keyed by job id."""
+
+    def __init__(self) -> None:
+        self._sessions: dict[str, SessionState] = {}
+
+    def create(self, job_id: str, room_name: str) -> SessionState:
+        if job_id in self._sessions:
+            logging.warning(f"Replacing existing session state for job {job_id}")
+        state = SessionState(job_id=job_id, room_name=room_name)
+        self._sessions[job_id] = state
+        logging.info(f"Registered session {job_id} in room {room_name} ({len(self._sessions)} active)")
+        return state
+
+    def get(self, job_id: str) -> SessionState | None:
+        return self._sessions.get(job_id)
+
+    def remove(self, job_id: str) -> None:
+        if self._sessions.pop(job_id, None) is not None:
+            logging.info(f"Removed session {job_id} ({len(self._sessions)} active)")
+
+    def sessions(self) -> list[SessionState]:
+        return list(self._sessions.values())
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._sessions
+
+
+registry = SessionRegistry()
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Callable
+
+os.environ.setdefault("TURN_METRICS_PATH", "")
+
+from livekit.agents import Agent, AgentSession, ChatContext, ChatMessage
+
+from answer_cache import AnswerCache, answer_from_cache
+from conversation import attach_conversation, close_conversation
+from fakes import LocalAudioInput, LocalAudioOutput, LocalLLM, LocalMem0, LocalSTT, LocalTTS
+from phrase_audio import PhraseAudioCache
+from prompts import AGENT_INSTRUCTION
+from sessions import registry
+from turn_metrics import TurnMetrics, process_stats
+
+FAQ_QUESTIONS = [
+    ("Hi Batsi, what's the USSD code?", "ussd_banking"),
+    ("What time do you open on Saturday?", "branch_hours"),
+    ("When does the branch close today", "branch_hours"),
+    ("I want to open an instant account", "instant_account"),
+    ("I lost my card", "block_card"),
+    ("Can you block my ATM card please", "block_card"),
+    ("How do I dial for mobile banking", "ussd_banking"),
+    ("my card got stolen yesterday", "block_card"),
+]
+OTHER_QUESTIONS = [
+    "What's the weather in Harare",
+    "What is my account balance",
+    "How much is a personal loan",
+    "My name is Tendai",
+    "What are the fees on a debit card",
+    "why was my card declined",
+    "what is the code for ecocash",
+    "what time is it",
+]
+
+
+def check_matching(cache: AnswerCache):
+    for question, expected in FAQ_QUESTIONS:
+        hit = cache.lookup(question)
+        print(f"{'ok ' if hit and hit.entry_id == expected else 'MISS'} {question!r:45} -> {hit.entry_id if hit else None}")
+    for question in OTHER_QUESTIONS:
+        hit = cache.lookup(question)
+        print(f"{'ok ' if hit is None else 'FALSE'} {question!r:45} -> {hit.entry_id if hit else None}")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        cache.lookup("What time do you open on Saturday?")
+    print(f"Lookup: {(time.perf_counter() - start):.3f} ms average over 1000")
+
+
+def check_invalidation(cache: AnswerCache, path: str):
+    cache.invalidate("branch_hours")
+    print(f"After invalidate('branch_hours'): {cache.lookup('What are your opening hours?')}")
+
+    # Edited answers are picked up from the file once the loaded entries expire
+    cache.ttl = 0.05
+    cache.load(path)
+    with open(path) as f:
+        entries = json.load(f)
+    entries[1]["answer"] = "Branches are closed for the public holiday today."
+    with open(path, "w") as f:
+        json.dump(entries, f)
+    time.sleep(0.1)
+    print(f"After editing the file: {cache.lookup('What are your opening hours?').answer}")
+
+
+class FaqAssistant(Agent):
+    def __init__(
+        self,
+        cache: AnswerCache,
+        on_user_message: Callable[[str], None] | None = None,
+        phrases: PhraseAudioCache | None = None,
+    ) -> None:
+        super().__init__(instructions=AGENT_INSTRUCTION, chat_ctx=ChatContext())
+        self.cache = cache
+        self.on_user_message = on_user_message
+        self.phrases = phrases
+
+    async def on_user_turn_completed(self, turn_ctx: ChatContext, new_message: ChatMessage) -> None:
+        await answer_from_cache(
+            self.cache, self, new_message, backend="openai", on_user_message=self.on_user_message, phrases=self.phrases
+        )
+
+
+async def check_session(cache: AnswerCache, phrases: PhraseAudioCache):
+    """Speech end -> first reply audio, from the LLM and from the cache's pre-rendered answers."""
+    stt = LocalSTT(latency=0.05)
+    tts = LocalTTS(ttfb=0.15)
+    # As the worker does at start
+    await phrases.prerender(cache.answers, tts)
+    session = AgentSession(stt=stt, llm=LocalLLM(ttft=0.6), tts=tts, turn_detection="stt")
+    microphone, speaker = LocalAudioInput(), LocalAudioOutput()
+    session.input.audio = microphone
+    session.output.audio = speaker
+    agent = FaqAssistant(cache, phrases=phrases)
+    # LLM time to first token from earlier turns is what a cache hit is credited with saving
+    state = SimpleNamespace(job_id="faq", room_name="faq", model_type="openai", started_at=time.time())
+    session.on("metrics_collected", TurnMetrics(state).on_metrics_collected)
+    await session.start(agent=agent)
+    try:
+        for text in ("How much is a personal loan", "I lost my card", "What is the USSD code"):
+            speaker.reply_started.clear()
+            speaker.reply_finished.clear()
+            stt.push_transcript(text)
+            microphone.say(0.3 * len(text.split()))
+            await asyncio.wait_for(speaker.reply_started.wait(), 10)
+            print(f"{text!r:30} first audio {(speaker.first_frame_at - microphone.speech_ended_at) * 1000:4.0f} ms")
+            await asyncio.wait_for(speaker.reply_finished.wait(), 30)
+        await asyncio.sleep(0.2)
+        roles = [f"{item.role}" for item in agent.chat_ctx.items if item.type == "message" and item.role != "system"]
+        print(f"Conversation kept: {' '.join(roles)}")
+    finally:
+        await session.aclose()
+    print(f"Summary: {cache.summary()}, pre-rendered answers played {phrases.hits}")
+    assert phrases.hits == 2 and phrases.misses == 0, (phrases.hits, phrases.misses)
+
+
+async def check_conversation_state(cache: AnswerCache):
+    """A turn answered from the cache still reaches memory retrieval, like any other user turn."""
+    mem0 = LocalMem0(latency=0.01, jitter=0)
+    mem0.memories["Tendai"] = [{"id": "m1", "memory": "Reported a lost card at the Mbare branch", "updated_at": ""}]
+    state = registry.create("faq-state", "faq-state")
+    state.user_name = "Tendai"
+    stt = LocalSTT(latency=0.05)
+    session = AgentSession(stt=stt, llm=LocalLLM(ttft=0.1), tts=LocalTTS(ttfb=0.05), turn_detection="stt")
+    microphone, speaker = LocalAudioInput(), LocalAudioOutput()
+    session.input.audio = microphone
+    session.output.audio = speaker
+    attach_conversation(session, state, mem0, summarizer=LocalLLM())
+    state.assistant = FaqAssistant(cache, on_user_message=state.on_user_message)
+    await session.start(agent=state.assistant)
+    try:
+        stt.push_transcript("I lost my card")
+        microphone.say(1.0)
+        await asyncio.wait_for(speaker.reply_finished.wait(), 30)
+        # The retrieval started by the turn, if any
+        if state.retriever._refresh_task is not None:
+            await state.retriever._refresh_task
+        messages = [item for item in state.assistant.chat_ctx.items if item.type == "message"]
+        print(f"Cached turn: question kept {any(m.text_content == 'I lost my card' for m in messages)}, "
+              f"memories injected {state.retriever.injections}, memory_str {state.memory_str}")
+        assert state.retriever.injections == 1, "the cached turn never reached memory retrieval"
+    finally:
+        await session.aclose()
+        await close_conversation(state)
+        registry.remove(state.job_id)
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "faq_answers.json")
+        with open("faq_answers.json") as src, open(path, "w") as dst:
+            dst.write(src.read())
+
+        cache = AnswerCache()
+        cache.load(path)
+        check_matching(cache)
+        check_invalidation(cache, path)
+
+        cache = AnswerCache()
+        cache.load("faq_answers.json")
+        process_stats.clear()
+        await check_session(cache, PhraseAudioCache(os.path.join(directory, "phrase_audio")))
+        await check_conversation_state(cache)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("livekit.agents").setLevel(logging.ERROR)
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+import logging
+import time
+
+import numpy as np
+from livekit import rtc
+
+from audio_frontend import AdaptiveNoiseCancellation, MeteredFilter, NoiseMeter
+
+SAMPLE_RATE = 48000
+
+
+def noisy_speech(seconds: float, noise_dbfs: float, seed: int = 0) -> list[rtc.AudioFrame]:
+    """50 ms frames of a voiced tone in bursts, over white noise at noise_dbfs."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    speech = 0.2 * np.sin(2 * np.pi * 180 * t) * (np.sin(2 * np.pi * 0.5 * t) > 0)
+    noise = rng.standard_normal(len(t)) * 10 ** (noise_dbfs / 20)
+    pcm = (np.clip(speech + noise, -1, 1) * 32767).astype(np.int16)
+    size = SAMPLE_RATE // 20
+    return [rtc.AudioFrame(pcm[i:i + size].tobytes(), SAMPLE_RATE, 1, size) for i in range(0, len(pcm) - size + 1, size)]
+
+
+def check_tier_policy():
+    cases = [
+        ("quiet room", -70, 0.3, "bypass"),
+        ("office", -55, 0.3, "light"),
+        ("street", -40, 0.3, "bvc"),
+        ("street, busy worker", -40, 0.8, "light"),
+        ("street, overloaded worker", -40, 0.95, "bypass"),
+    ]
+    for label, noise_dbfs, cpu, expected in cases:
+        frontend = AdaptiveNoiseCancellation(session=None)
+        frontend._cpu = cpu
+        processor = MeteredFilter(frontend.meter, suppress=False)
+        frames = noisy_speech(10, noise_dbfs)
+        # Calls start on BVC and stay there until the meter has a full window
+        for frame in frames[:100]:
+            processor._process(frame)
+        assert frontend.choose()[0] == ("bypass" if cpu >= frontend.cpu_shed else "bvc"), label
+        for frame in frames[100:]:
+            processor._process(frame)
+        tier, reason = frontend.choose()
+        print(f"{label:28} floor {frontend.noise_floor:6.1f} dBFS, CPU {cpu:.0%} -> {tier} ({reason})")
+        assert tier == expected, (label, tier)
+
+
+def benchmark_filters():
+    frames = noisy_speech(10, -40)
+    for tier, suppress in (("bypass", False), ("light", True)):
+        meter = NoiseMeter()
+        processor = MeteredFilter(meter, suppress=suppress)
+        start = time.process_time()
+        cleaned = [processor._process(frame) for frame in frames]
+        cpu = time.process_time() - start
+
+        # What is left in the gaps between bursts is what the filter let through
+        after = NoiseMeter()
+        for frame in cleaned:
+            after.update(frame)
+        print(f"{tier:7} {cpu / 10 * 100:5.2f}% of a core, noise floor {meter.floor_dbfs:6.1f} -> {after.floor_dbfs:6.1f} dBFS")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    check_tier_policy()
+    benchmark_filters()
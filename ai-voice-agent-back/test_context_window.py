@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+import time
+
+from livekit.agents import Agent, ChatContext
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from backends import build_llm
+from context_window import SUMMARY_ID, ContextCompactor, context_tokens
+from fakes import LocalLLM, LocalMem0
+from memory import ConversationFlusher
+from sessions import registry
+
+NUM_TURNS = 60
+MAX_TOKENS = 800
+
+
+def summarize(chat_ctx: ChatContext) -> str:
+    # Pretend summary: the customer's first words from each turn
+    conversation = chat_ctx.items[-1].text_content
+    lines = [line.split(":", 1)[1].split(".")[0] for line in conversation.splitlines() if line.startswith("Customer")]
+    return "The customer asked about" + ";".join(lines[-8:])
+
+
+async def long_call():
+    mem0 = LocalMem0(latency=0.02, jitter=0.01)
+    state = registry.create("job-long", "room-long")
+    state.user_name = "Tendai"
+    state.assistant = Agent(instructions="You are Batsi.", chat_ctx=ChatContext())
+    state.flusher = ConversationFlusher(mem0, state, checkpoint_interval=0)
+    state.compactor = ContextCompactor(state, LocalLLM(ttft=0.2, tokens_per_second=200, respond=summarize), max_tokens=MAX_TOKENS)
+
+    sizes = []
+    for turn in range(NUM_TURNS):
+        chat_ctx = state.assistant.chat_ctx.copy()
+        chat_ctx.add_message(role="user", content=f"Question {turn}. I want to know more about my Diaspora Account transfer limits and the fees for sending USD from abroad.")
+        chat_ctx.add_message(role="assistant", content=f"Answer {turn}. Diaspora Account transfers are free up to 1000 USD a month, after that a small fee applies per transfer.")
+        await state.assistant.update_chat_ctx(chat_ctx)
+        sizes.append(context_tokens(state.assistant.chat_ctx))
+
+        # Compaction runs in the background while the next turn is being spoken
+        start = time.perf_counter()
+        state.compactor.maybe_compact()
+        assert time.perf_counter() - start < 0.01, "compaction must not block the turn"
+        await asyncio.sleep(0.3)
+
+    await state.flusher.flush("end of call")
+    saved = sum(len(memories) for memories in mem0.memories.values())
+    summary = state.assistant.chat_ctx.get_by_id(SUMMARY_ID)
+    print(f"Prompt size per turn (tokens): first {sizes[0]}, max {max(sizes)}, last {sizes[-1]}, budget {MAX_TOKENS}")
+    print(f"Compactions: {state.compactor.compactions}, items left in context: {len(state.assistant.chat_ctx.items)}")
+    print(f"User messages saved to mem0: {saved} of {NUM_TURNS}")
+    print(f"Summary: {summary.text_content[:160]}...")
+    # The recent turns are kept verbatim on top of the budget
+    assert sizes[-1] <= MAX_TOKENS + state.compactor.keep_turns * sizes[0], "context not kept within budget"
+    assert state.compactor.compactions > 0 and summary is not None
+    assert saved == NUM_TURNS, "turns were folded before mem0 saw them"
+    registry.remove(state.job_id)
+
+
+async def realtime_call():
+    """The realtime session can't drop items or keep a summary, so nothing is compacted."""
+    state = registry.create("job-realtime", "room-realtime")
+    state.assistant = Agent(instructions="You are Batsi.", llm=build_llm("google"), chat_ctx=ChatContext())
+    state.compactor = ContextCompactor(state, LocalLLM(), max_tokens=10)
+    chat_ctx = state.assistant.chat_ctx.copy()
+    chat_ctx.add_message(role="user", content="Question 1. I want to know more about my Diaspora Account transfer limits.")
+    await state.assistant.update_chat_ctx(chat_ctx)
+    task = state.compactor.maybe_compact()
+    print(f"Realtime assistant over budget ({state.compactor.tokens()} tokens): compaction {'started' if task else 'skipped'}")
+    assert task is None
+    registry.remove(state.job_id)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(long_call())
+    asyncio.run(realtime_call())
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+import time
+import tracemalloc
+
+from livekit.agents import ChatContext
+
+from fakes import LocalMem0
+from memory import MEMORY_ITEM_PREFIX, shutdown_hook
+
+# One hour of conversation: a turn every 5 seconds, memories injected every 10 turns
+NUM_TURNS = 720
+
+
+def hour_long_call() -> ChatContext:
+    chat_ctx = ChatContext()
+    for turn in range(NUM_TURNS):
+        if turn % 10 == 0:
+            chat_ctx.add_message(
+                id=f"{MEMORY_ITEM_PREFIX}{turn}",
+                role="system",
+                content="Previous conversation memories about Tendai:\n\n" + "- Tendai has a Diaspora Account\n" * 5,
+            )
+        chat_ctx.add_message(role="user", content=f"Turn {turn}: can you check why my ZIPIT transfer of 50 USD to my brother has not arrived yet?")
+        chat_ctx.add_message(role="assistant", content=f"Turn {turn}: ZIPIT transfers usually arrive within minutes, let me help you trace that payment.")
+    return chat_ctx
+
+
+async def measure(chat_ctx: ChatContext, label: str, **kwargs):
+    # mem0 extraction time grows with the number of messages in a request
+    mem0 = LocalMem0(latency=0.3, jitter=0.05, add_latency_per_message=0.005)
+    tracemalloc.start()
+    start = time.perf_counter()
+    saved = await shutdown_hook(chat_ctx, mem0, "Tendai", **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label}: saved {len(saved)} messages in {mem0.calls} calls, {elapsed:.2f}s, peak {peak / 1024:.0f} KiB")
+
+
+async def benchmark_flush():
+    chat_ctx = hour_long_call()
+    print(f"1-hour call: {len(chat_ctx.items)} chat items")
+    await measure(chat_ctx, "Single payload       ", chunk_size=10**9, max_concurrency=1)
+    await measure(chat_ctx, "Chunks of 20, 1 slot ", chunk_size=20, max_concurrency=1)
+    await measure(chat_ctx, "Chunks of 50, 4 slots", chunk_size=50, max_concurrency=4)
+    await measure(chat_ctx, "Chunks of 50, 8 slots", chunk_size=50, max_concurrency=8)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(benchmark_flush())
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+
+from livekit.agents import Agent, ChatContext
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from test_local_model import OllamaStub, start_stub, ttft
+from backends import build_llm
+from fakes import LocalLLM
+from knowledge import KnowledgeIndex, add_knowledge, inject_knowledge, packed_instructions
+from prompts import AGENT_INSTRUCTION
+from tokens import estimate_tokens
+
+QUESTIONS = [
+    "How much can I borrow with a personal loan?",
+    "I think someone stole my card, what do I do?",
+    "What time do you open on Saturday?",
+    "Can I link my EcoCash wallet to my account?",
+    "How do I send money to someone at another bank?",
+    "My name is Tendai.",
+]
+
+
+def check_incremental_rebuild():
+    workdir = tempfile.mkdtemp()
+    try:
+        shutil.copytree("knowledge", os.path.join(workdir, "knowledge"))
+        sources = [os.path.join(workdir, "knowledge"), "faq_answers.json"]
+        index_path = os.path.join(workdir, "index.json")
+
+        print("first build:     ", KnowledgeIndex(sources, index_path).build())
+        print("unchanged:       ", KnowledgeIndex(sources, index_path).build())
+
+        with open(os.path.join(workdir, "knowledge", "services.md"), "a") as f:
+            f.write("\n## Forex\nForeign currency can be bought at any branch with a valid passport.\n")
+        index = KnowledgeIndex(sources, index_path)
+        print("one file edited: ", index.build())
+        assert index.search("buy foreign currency")[0][0].title == "Forex"
+
+        os.remove(os.path.join(workdir, "knowledge", "bank.md"))
+        print("one file removed:", KnowledgeIndex(sources, index_path).build())
+    finally:
+        shutil.rmtree(workdir)
+
+
+def check_retrieval(index: KnowledgeIndex):
+    for question in QUESTIONS:
+        found = ", ".join(f"{p.id} ({score:.1f})" for p, score in index.search(question)) or "nothing"
+        print(f"{question:50} -> {found}")
+
+
+async def check_both_backends(index: KnowledgeIndex):
+    # The realtime model keeps everything it is sent, so it gets the documents once and nothing per turn
+    backends = (
+        ("openai", Agent(instructions=AGENT_INSTRUCTION, llm=LocalLLM())),
+        ("google", Agent(instructions=packed_instructions(AGENT_INSTRUCTION, "knowledge"), llm=build_llm("google"))),
+    )
+    for backend, agent in backends:
+        instructions = agent.instructions
+        for question, expect_passages in (("How much can I borrow with a personal loan?", True), ("My name is Tendai.", False)):
+            turn_ctx = ChatContext()
+            message = turn_ctx.add_message(role="user", content=question)
+            tokens = await add_knowledge(index, agent, turn_ctx, message)
+            in_ctx = any(item.role == "system" for item in turn_ctx.items if item.type == "message")
+            print(f"{backend:7} {question:45} +{tokens:3} tokens per turn, in turn_ctx: {in_ctx}")
+            assert agent.instructions == instructions, "instructions must not change per turn"
+            if backend == "google":
+                assert not in_ctx and tokens == 0 and "Loans" in agent.instructions
+            else:
+                assert in_ctx == expect_passages
+
+
+def packed_ctx(question: str) -> ChatContext:
+    chat_ctx = ChatContext()
+    chat_ctx.add_message(role="system", content=packed_instructions(AGENT_INSTRUCTION, "knowledge"))
+    chat_ctx.add_message(role="user", content=question)
+    return chat_ctx
+
+
+def retrieved_ctx(index: KnowledgeIndex, question: str) -> ChatContext:
+    chat_ctx = ChatContext()
+    chat_ctx.add_message(role="system", content=AGENT_INSTRUCTION)
+    message = chat_ctx.add_message(role="user", content=question)
+    inject_knowledge(index, chat_ctx, message)
+    return chat_ctx
+
+
+def prompt_tokens(chat_ctx: ChatContext) -> int:
+    return sum(estimate_tokens(item.text_content or "") for item in chat_ctx.items if item.type == "message")
+
+
+async def benchmark_prompt_size(index: KnowledgeIndex):
+    packed = [prompt_tokens(packed_ctx(q)) for q in QUESTIONS]
+    retrieved = [prompt_tokens(retrieved_ctx(index, q)) for q in QUESTIONS]
+    print(f"\nPrompt tokens per turn: packed {sum(packed) / len(packed):.0f}, "
+          f"retrieved {sum(retrieved) / len(retrieved):.0f} "
+          f"({1 - sum(retrieved) / sum(packed):.0%} fewer)")
+
+    # Cold: the prompt cache slot was taken by another request (a summary, another session).
+    # Warm: the instructions are cached and only what follows them is processed
+    stub = OllamaStub(load_time=0)
+    runner = await start_stub(stub)
+    model = build_llm("openai")
+    try:
+        for label, build in (("packed", packed_ctx), ("retrieved", lambda q: retrieved_ctx(index, q))):
+            cold = []
+            for question in QUESTIONS:
+                stub.evict()
+                cold.append(await ttft(model, build(question)))
+            await ttft(model, build("Hello"))
+            warm = [await ttft(model, build(question)) for question in QUESTIONS]
+            print(f"{label:10} ttft cold {sum(cold) / len(cold) * 1000:5.0f} ms, "
+                  f"warm {sum(warm) / len(warm) * 1000:5.0f} ms (mean)")
+    finally:
+        await model.aclose()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    check_incremental_rebuild()
+    index = KnowledgeIndex(["knowledge", "faq_answers.json"], os.path.join(tempfile.mkdtemp(), "index.json"))
+    index.build()
+    check_retrieval(index)
+    asyncio.run(check_both_backends(index))
+    asyncio.run(benchmark_prompt_size(index))
@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import gc
+import logging
+import multiprocessing
+import os
+import random
+import time
+
+import psutil
+from livekit.agents import Agent, AgentSession, ChatContext
+from livekit.agents.inference_runner import _InferenceRunner
+from livekit.agents.ipc.inference_proc_executor import InferenceProcExecutor
+from livekit.plugins import silero
+from livekit.plugins.turn_detector.base import EOUModelBase
+from livekit.plugins.turn_detector.multilingual import MultilingualModel
+
+os.environ.setdefault("TURN_METRICS_PATH", "")
+
+from conversation import attach_conversation, close_conversation
+from loop_watchdog import start_watchdog, stop_watchdog
+from fakes import LocalAudioInput, LocalAudioOutput, LocalLLM, LocalMem0, LocalSTT, LocalTTS
+from phrase_audio import phrase_audio
+from prompts import AGENT_INSTRUCTION, GREETING
+from sessions import registry
+from test_sessions import caller_name
+from turn_metrics import percentile, process_stats
+
+CALLER_SCRIPT = [
+    "My name is {name}",
+    "I would like to open a Diaspora Account",
+    "What documents do I need to bring to the branch",
+    "How much are the monthly fees on that account",
+    "Can I link it to my EcoCash wallet",
+    "Thank you that is all for today",
+]
+# Stages every scripted turn goes through; a capacity figure missing one of them is not worth reporting
+MEASURED_STAGES = ("stt", "eou", "llm_ttft", "tts_ttfb")
+
+
+async def start_inference() -> InferenceProcExecutor:
+    """The turn detector's inference process, started as the worker starts it."""
+    executor = InferenceProcExecutor(
+        runners=_InferenceRunner.registered_runners,
+        initialize_timeout=5 * 60,
+        close_timeout=5,
+        memory_warn_mb=2000,
+        memory_limit_mb=0,
+        ping_interval=5,
+        ping_timeout=60,
+        high_ping_threshold=2.5,
+        mp_ctx=multiprocessing.get_context("spawn"),
+        loop=asyncio.get_running_loop(),
+        http_proxy=None,
+    )
+    await executor.start()
+    await executor.initialize()
+    return executor
+
+
+class LoadTestTurnDetector(MultilingualModel):
+    """my_agent's turn detector, on our own inference process: outside a job there is no job context to take it from."""
+
+    def __init__(self, executor: InferenceProcExecutor) -> None:
+        EOUModelBase.__init__(self, model_type="multilingual", inference_executor=executor)
+
+
+def cpu_seconds(process: psutil.Process) -> float:
+    """CPU used by the worker and its children (the turn detector's inference process)."""
+    total = sum(process.cpu_times()[:2])
+    for child in process.children(recursive=True):
+        try:
+            total += sum(child.cpu_times()[:2])
+        except psutil.NoSuchProcess:
+            pass
+    return total
+
+
+async def run_caller(i: int, mem0: LocalMem0, args, vad: silero.VAD, turn_detection) -> list[float]:
+    """
+    One simulated call through the same per-session wiring as my_agent, with local providers.
+
+    Silero VAD and the multilingual turn detector are the real ones, shared by
+    every session as in my_agent; only the network services are stand-ins.
+    """
+    state = registry.create(f"load-{i}", f"room-{i}")
+    state.model_type = "openai"
+    state.assistant = Agent(instructions=AGENT_INSTRUCTION, chat_ctx=ChatContext())
+
+    local_stt = LocalSTT(latency=args.stt_latency)
+    session = AgentSession(
+        stt=local_stt,
+        llm=LocalLLM(ttft=args.llm_ttft),
+        tts=LocalTTS(ttfb=args.tts_ttfb),
+        vad=vad,
+        turn_detection=turn_detection,
+    )
+    attach_conversation(session, state, mem0, summarizer=LocalLLM(ttft=args.llm_ttft))
+    microphone = LocalAudioInput()
+    speaker = LocalAudioOutput()
+    session.input.audio = microphone
+    session.output.audio = speaker
+
+    # Callers do not all dial in at the same instant
+    await asyncio.sleep(random.uniform(0, args.ramp))
+    await session.start(agent=state.assistant)
+    await phrase_audio.say(session, GREETING, session.tts, phrase="greeting")
+
+    # Speech end -> first reply audio, as the caller hears it
+    latencies = []
+    try:
+        for line in CALLER_SCRIPT[:args.turns]:
+            await asyncio.sleep(random.uniform(0.3, 1.0))
+            text = line.format(name=caller_name(i))
+            speaker.reply_started.clear()
+            speaker.reply_finished.clear()
+            local_stt.push_transcript(text)
+            microphone.say(0.3 * len(text.split()))
+            await asyncio.wait_for(speaker.reply_started.wait(), 30)
+            latencies.append(speaker.first_frame_at - microphone.speech_ended_at)
+            await asyncio.wait_for(speaker.reply_finished.wait(), 60)
+    except asyncio.TimeoutError:
+        logging.warning(f"Caller {i} got no reply")
+    finally:
+        await session.aclose()
+        await close_conversation(state)
+        registry.remove(state.job_id)
+    return latencies
+
+
+async def monitor(lag: list[float], rss: list[int], interval: float = 0.05):
+    process = psutil.Process()
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag.append(time.perf_counter() - start - interval)
+        rss.append(process.memory_info().rss)
+
+
+async def run_level(num_sessions: int, args, vad: silero.VAD, turn_detection) -> dict:
+    gc.collect()
+    process = psutil.Process()
+    process_stats.clear()
+    mem0 = LocalMem0(latency=args.mem0_latency, jitter=args.mem0_latency / 2)
+    rss_before = process.memory_info().rss
+    cpu_before = cpu_seconds(process)
+    lag, rss = [], []
+    monitor_task = asyncio.create_task(monitor(lag, rss))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_caller(i, mem0, args, vad, turn_detection) for i in range(num_sessions)))
+    wall = time.perf_counter() - start
+    monitor_task.cancel()
+
+    cpu = cpu_seconds(process) - cpu_before
+    latencies = [latency for result in results for latency in result]
+    return {
+        "sessions": num_sessions,
+        "turns": len(latencies),
+        "cpu_utilisation": cpu / wall,
+        # CPU one session needs on average, extrapolated to how many fit on one core
+        "sessions_per_core": num_sessions / (cpu / wall) if cpu else float("inf"),
+        "mb_per_session": (max(rss) - rss_before) / num_sessions / 2**20 if rss else 0.0,
+        "loop_lag_ms": {q: round(percentile(lag, q) * 1000, 1) for q in (0.5, 0.99)} | {"max": round(max(lag) * 1000, 1)},
+        "reply_ms": {q: round(percentile(latencies, q) * 1000) for q in (0.5, 0.95, 0.99)} if latencies else {},
+        "stages": process_stats.summary(),
+    }
+
+
+async def load_test(args):
+    vad = silero.VAD.load()
+    executor = None
+    if args.no_turn_detector:
+        turn_detection = "vad"
+        print("Without the turn detector: sessions per core will be optimistic")
+    else:
+        try:
+            executor = await start_inference()
+            turn_detection = LoadTestTurnDetector(executor)
+        except Exception as e:
+            if executor is not None:
+                await executor.aclose()
+            raise SystemExit(
+                f"Could not start the turn detector ({e}). Download its model with "
+                "`python agent.py download-files`, or pass --no-turn-detector"
+            )
+    # Set LOOP_WATCHDOG_MS to also see what blocked the loop during the run
+    watchdog = start_watchdog()
+    try:
+        await ramp(args, vad, turn_detection, watchdog)
+    finally:
+        stop_watchdog()
+        if executor is not None:
+            await executor.aclose()
+
+
+async def ramp(args, vad: silero.VAD, turn_detection, watchdog):
+    for num_sessions in args.sessions:
+        report = await run_level(num_sessions, args, vad, turn_detection)
+        # A stage that measured nothing means the harness skipped work a real call does
+        missing = [stage for stage in MEASURED_STAGES if not report["stages"].get(f"{stage}/openai", {}).get("p50")]
+        if missing:
+            raise SystemExit(f"No latency measured for {', '.join(missing)}; not reporting capacity")
+        print(
+            f"{report['sessions']:4d} sessions, {report['turns']} turns: "
+            f"cpu {report['cpu_utilisation']:.2f} cores, {report['sessions_per_core']:.0f} sessions/core, "
+            f"{report['mb_per_session']:.1f} MB/session, loop lag {report['loop_lag_ms']}, "
+            f"speech end -> reply audio {report['reply_ms']}"
+        )
+        for stage, summary in report["stages"].items():
+            print(f"       {stage}: {summary}")
+        if watchdog is not None:
+            for culprit, stalls in watchdog.stalls.items():
+                print(f"       stalls by {culprit}: {len(stalls)}, worst {max(stalls) * 1000:.0f} ms")
+            watchdog.stalls.clear()
+        if report["loop_lag_ms"][0.99] > args.max_lag_ms:
+            print(f"Event loop lag p99 above {args.max_lag_ms} ms, stopping the ramp")
+            break
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test: many calls in one worker with local providers")
+    parser.add_argument("--sessions", type=lambda value: [int(n) for n in value.split(",")], default=[10, 25, 50])
+    parser.add_argument("--turns", type=int, default=len(CALLER_SCRIPT))
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which callers dial in")
+    parser.add_argument("--stt-latency", type=float, default=0.2)
+    parser.add_argument("--llm-ttft", type=float, default=0.4)
+    parser.add_argument("--tts-ttfb", type=float, default=0.15)
+    parser.add_argument("--mem0-latency", type=float, default=0.15)
+    parser.add_argument("--max-lag-ms", type=float, default=100.0)
+    parser.add_argument("--no-turn-detector", action="store_true", help="end turns on VAD silence alone")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Deprecation and capability warnings repeat for every simulated session
+    logging.getLogger("livekit.agents").setLevel(logging.ERROR)
+    asyncio.run(load_test(args))
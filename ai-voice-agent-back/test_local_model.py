@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+
+from aiohttp import web
+from livekit.agents import ChatContext
+
+STUB_PORT = 8767
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}/v1"
+os.environ["OPENAI_MODEL"] = "llama3.2:latest"
+
+from backends import LocalModelWarmer, build_llm
+from context_window import SUMMARY_INSTRUCTION
+from prompts import AGENT_INSTRUCTION
+
+
+class OllamaStub:
+    """
+    Stand-in for a local Ollama server with one model and one prompt cache slot.
+
+    Loading the model takes load_time; prompt processing costs seconds_per_token
+    for every word past the longest prefix shared with the previous request.
+    """
+
+    def __init__(self, load_time: float = 1.5, seconds_per_token: float = 0.002) -> None:
+        self.load_time = load_time
+        self.seconds_per_token = seconds_per_token
+        self.loaded_until: float | None = None
+        self.cached: list[str] = []
+
+    def evict(self) -> None:
+        self.loaded_until = None
+        self.cached = []
+
+    async def _ensure_loaded(self, keep_alive: str = "5m") -> None:
+        if self.loaded_until is None or self.loaded_until < time.monotonic():
+            self.cached = []
+            await asyncio.sleep(self.load_time)
+        number, unit = re.fullmatch(r"(-?\d+)([smh]?)", keep_alive).groups()
+        self.loaded_until = time.monotonic() + int(number) * {"": 1, "s": 1, "m": 60, "h": 3600}[unit]
+
+    async def generate(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        await self._ensure_loaded(body.get("keep_alive", "5m"))
+        return web.json_response({"model": body["model"], "response": "", "done": True})
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        await self._ensure_loaded()
+
+        tokens = []
+        for message in body["messages"]:
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                content = " ".join(part.get("text", "") for part in content)
+            tokens += [f"<{message['role']}>", *content.split()]
+        shared = 0
+        for cached, token in zip(self.cached, tokens):
+            if cached != token:
+                break
+            shared += 1
+        self.cached = tokens
+        await asyncio.sleep((len(tokens) - shared) * self.seconds_per_token)
+
+        words = ["Hello,", " how", " can", " I", " help?"]
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": "".join(words)}
+            return web.json_response({"choices": [{"index": 0, "message": message, "finish_reason": "stop"}]})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for word in words:
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": word}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(0.01)
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+
+async def start_stub(stub: OllamaStub) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_post("/api/generate", stub.generate)
+    app.router.add_post("/v1/chat/completions", stub.chat_completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", STUB_PORT).start()
+    return runner
+
+
+def turn_ctx(question: str) -> ChatContext:
+    """What the assistant sends for a turn: its instructions, then the conversation."""
+    chat_ctx = ChatContext()
+    chat_ctx.add_message(role="system", content=AGENT_INSTRUCTION)
+    chat_ctx.add_message(role="user", content=question)
+    return chat_ctx
+
+
+def summary_ctx(instructions: str | None) -> ChatContext:
+    chat_ctx = ChatContext()
+    if instructions:
+        chat_ctx.add_message(role="system", content=instructions)
+    chat_ctx.add_message(role="system", content=SUMMARY_INSTRUCTION)
+    chat_ctx.add_message(role="user", content="user: What are your savings rates?\nassistant: Savings earn 4% a year.")
+    return chat_ctx
+
+
+async def ttft(model, chat_ctx: ChatContext) -> float:
+    start = time.perf_counter()
+    first_token = None
+    async with model.chat(chat_ctx=chat_ctx) as stream:
+        async for chunk in stream:
+            if first_token is None and chunk.delta and chunk.delta.content:
+                first_token = time.perf_counter() - start
+    if first_token is None:
+        raise RuntimeError("no tokens received")
+    return first_token
+
+
+async def drain(model, chat_ctx: ChatContext) -> None:
+    async with model.chat(chat_ctx=chat_ctx) as stream:
+        async for _ in stream:
+            pass
+
+
+async def benchmark_local_model():
+    stub = OllamaStub()
+    runner = await start_stub(stub)
+    model = build_llm("openai")
+    try:
+        results = {}
+
+        # Cold: the model was unloaded after sitting idle
+        stub.evict()
+        results["cold (model unloaded)"] = await ttft(model, turn_ctx("What are your opening hours?"))
+
+        # Warm but prefix lost: a summary request with its own system prompt took the cache slot
+        await drain(model, summary_ctx(None))
+        results["warm, prefix evicted by summary"] = await ttft(model, turn_ctx("Do you have a branch in Bulawayo?"))
+
+        # Summary requests that open with the agent's instructions leave the prefix in place
+        await drain(model, summary_ctx(AGENT_INSTRUCTION))
+        results["warm, summary shares prefix"] = await ttft(model, turn_ctx("How do I open an account?"))
+
+        # Next turn, or another session: only the new words are processed
+        results["warm, prefix reused"] = await ttft(model, turn_ctx("What are the fees on a debit card?"))
+
+        # The warmer loads the model and caches the prefix before the first caller arrives
+        stub.evict()
+        warmer = LocalModelWarmer(os.environ["OPENAI_BASE_URL"], os.environ["OPENAI_MODEL"], AGENT_INSTRUCTION)
+        await asyncio.to_thread(warmer.warm)
+        results["first turn after warm-up"] = await ttft(model, turn_ctx("What are your opening hours?"))
+
+        for label, seconds in results.items():
+            print(f"{label:34} ttft {seconds * 1000:6.0f} ms")
+        print(f"Warm-up off the call path: load {warmer.load_time * 1000:.0f} ms, prefix {warmer.prime_time * 1000:.0f} ms")
+    finally:
+        await model.aclose()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(benchmark_local_model())
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from livekit.agents import function_tool
+
+import loop_watchdog
+from loop_watchdog import start_watchdog, stop_watchdog
+
+
+@function_tool()
+async def lookup_branch(city: str) -> str:
+    """Blocking lookup, like a sync HTTP client inside an async tool."""
+    time.sleep(0.3)
+    return f"The {city} branch is open until 4pm"
+
+
+async def refresh_rates():
+    time.sleep(0.2)
+
+
+def parse_statement():
+    time.sleep(0.15)
+
+
+async def check_watchdog():
+    os.environ.setdefault("LOOP_WATCHDOG_MS", "100")
+    watchdog = start_watchdog(tools=[lookup_branch])
+    await asyncio.sleep(0.1)
+
+    # A tool, a named background task and plain application code each block the loop
+    await lookup_branch("Harare")
+    await asyncio.sleep(0.05)
+    await asyncio.create_task(refresh_rates(), name="rates_refresh")
+    await asyncio.sleep(0.05)
+    parse_statement()
+    await asyncio.sleep(0.1)
+
+    # Short blocks stay under the threshold
+    for _ in range(20):
+        time.sleep(0.01)
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.1)
+
+    for culprit, stalls in watchdog.stalls.items():
+        print(f"{culprit}: {len(stalls)} stalls, {', '.join(f'{s * 1000:.0f} ms' for s in stalls)}")
+    stop_watchdog()
+
+
+def watchdog_threads() -> int:
+    return sum(thread.name == "loop-watchdog" for thread in threading.enumerate())
+
+
+def check_no_leaks():
+    """One loop per job, as in the worker's job processes: nothing may outlive its loop."""
+    async def job(stop: bool):
+        start_watchdog()
+        # Two sessions sharing one loop share its watchdog until both are done
+        start_watchdog()
+        await asyncio.sleep(0.05)
+        stop_watchdog()
+        if stop:
+            stop_watchdog()
+
+    for i in range(20):
+        # Half the jobs end without stopping it, as when a job crashes before its shutdown callback
+        asyncio.run(job(stop=i % 2 == 0))
+    time.sleep(0.1)
+    print(f"After 20 jobs: {watchdog_threads()} watchdog threads, {len(loop_watchdog._watchdogs)} loops held")
+    assert watchdog_threads() == 0 and not loop_watchdog._watchdogs
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(check_watchdog())
+    check_no_leaks()
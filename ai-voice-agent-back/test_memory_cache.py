@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+from fakes import LocalMem0
+from memory_cache import CachedMemoryClient
+
+NUM_USERS = 200
+NUM_SESSIONS = 1000
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_sessions(mem0, users):
+    """Each session start reads the caller's memories, like MemoryRetriever.prefetch()."""
+    latencies = []
+    for user_id in users:
+        start = time.perf_counter()
+        await mem0.search(f"{user_id}'s preferences, recent banking issues and open topics", user_id=user_id, top_k=5)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def benchmark_cache():
+    # Returning callers follow a long tail: a few people call very often
+    users = [f"user{int(random.paretovariate(1.2)) % NUM_USERS}" for _ in range(NUM_SESSIONS)]
+
+    backend = LocalMem0(latency=0.02, jitter=0.01)
+    for user_id in set(users):
+        await backend.add([{"role": "user", "content": f"{user_id} wants to open a Diaspora Account"}], user_id=user_id)
+
+    direct = await run_sessions(backend, users)
+    print(f"Direct:  p50 {percentile(direct, 0.5) * 1000:.1f} ms, p95 {percentile(direct, 0.95) * 1000:.1f} ms")
+
+    cached = CachedMemoryClient(backend, ttl=300, stale_ttl=3600)
+    through_cache = await run_sessions(cached, users)
+    print(f"Cached:  p50 {percentile(through_cache, 0.5) * 1000:.1f} ms, p95 {percentile(through_cache, 0.95) * 1000:.1f} ms")
+    print(f"Cache stats: {cached.stats()}")
+    print(f"Mean latency saved per session start: {(statistics.mean(direct) - statistics.mean(through_cache)) * 1000:.1f} ms")
+
+    # Our own add() invalidates, so the next read sees the new memory
+    user_id = users[0]
+    await cached.add([{"role": "user", "content": "I lost my debit card"}], user_id=user_id)
+    results = await cached.search("debit card", user_id=user_id, top_k=5)
+    print(f"After add, top memory for {user_id}: {results[0]['memory']}")
+
+    # When mem0 is down, cached users still get their memories
+    backend.available = False
+    cached.ttl = 0
+    results = await cached.search("debit card", user_id=user_id, top_k=5)
+    print(f"During outage, served {len(results)} cached memories for {user_id} (stale hits: {cached.stale_hits})")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(benchmark_cache())
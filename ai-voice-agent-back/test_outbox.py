@@ -0,0 +1,150 @@
+import asyncio
+import base64
+import logging
+import os
+import socketserver
+import sqlite3
+import tempfile
+import threading
+import time
+
+received = []
+connections = 0
+
+
+class SMTPStub(socketserver.StreamRequestHandler):
+    """Minimal stand-in for Gmail SMTP: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, QUIT."""
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        global connections
+        connections += 1
+        self.reply("220 localhost stub ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(" ", 1)[0].upper()
+            if command == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN")
+            elif command == "AUTH":
+                _, user, password = base64.b64decode(line.split()[-1]).decode().split("\0")
+                self.reply("235 Authenticated" if password == "secret" else "535 Bad credentials")
+            elif command == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                recipients.append(line.split(":", 1)[1].strip("<> "))
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while (chunk := self.rfile.readline()) not in (b".\r\n", b""):
+                    data.append(chunk)
+                received.append((recipients, b"".join(data)))
+                self.reply("250 Queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+def check_claims_across_processes():
+    """Each job process opens its own outbox on the same database; no message may be claimed twice."""
+    from outbox import SMTPOutbox
+
+    path = os.path.join(tempfile.mkdtemp(), "outbox.db")
+    outboxes = [SMTPOutbox(path, "127.0.0.1", 25, "batsi@example.com", "secret") for _ in range(3)]
+    for i in range(200):
+        outboxes[0].enqueue([f"user{i}@example.com"], f"Statement {i}")
+
+    claimed = []
+
+    def drain(outbox):
+        while (row := outbox._claim()) is not None:
+            claimed.append(row[0])
+
+    threads = [threading.Thread(target=drain, args=(outbox,)) for outbox in outboxes for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"{len(outboxes)} outboxes x 2 threads claimed {len(claimed)} rows, {len(set(claimed))} distinct")
+    assert sorted(claimed) == list(range(1, 201))
+
+    # A process starting up leaves live claims alone and takes over only expired ones
+    SMTPOutbox(path, "127.0.0.1", 25, "batsi@example.com", "secret")
+    assert outboxes[0]._claim() is None, "a live claim was handed out again"
+    expired = SMTPOutbox(path, "127.0.0.1", 25, "batsi@example.com", "secret", lease_timeout=0)
+    recovered = expired._claim()
+    assert recovered is not None, "an expired claim was not recovered"
+    # The process that lost the claim must not overwrite the new owner's outcome
+    outboxes[0]._finish(recovered[0], "status = 'sent', sent_at = ?", (time.time(),))
+    expired._finish(recovered[0], "status = 'failed'", ())
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT status FROM outbox WHERE id = ?", (recovered[0],)).fetchone()[0] == "failed"
+    print("live claims kept, expired claims recovered, stale owners ignored")
+
+
+async def check_outbox():
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    socketserver.ThreadingTCPServer.daemon_threads = True
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.update({
+        "GMAIL_USER": "batsi@example.com",
+        "GMAIL_APP_PASSWORD": "secret",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(server.server_address[1]),
+        "SMTP_STARTTLS": "false",
+        "OUTBOX_PATH": os.path.join(tempfile.mkdtemp(), "outbox.db"),
+    })
+    # A database from before claims had leases, with a message a crashed worker was sending
+    with sqlite3.connect(os.environ["OUTBOX_PATH"]) as db:
+        db.execute(
+            "CREATE TABLE outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT NOT NULL, recipients TEXT NOT NULL, "
+            "message TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL, next_attempt_at REAL NOT NULL, sent_at REAL, last_error TEXT)"
+        )
+        db.execute(
+            "INSERT INTO outbox (sender, recipients, message, status, created_at, next_attempt_at) VALUES (?, ?, ?, 'sending', ?, ?)",
+            ("batsi@example.com", '["crashed@example.com"]', "Subject: Spooled\r\n\r\nSent before the crash.", time.time(), time.time()),
+        )
+    import tools
+    from outbox import get_outbox
+
+    try:
+        # Worker start (prewarm) recovers it before anyone sends mail
+        outbox = get_outbox()
+        while outbox.queue_depth():
+            await asyncio.sleep(0.05)
+        assert [r for r, _ in received] == [["crashed@example.com"]], received
+        print("Recovered the crashed worker's email at startup")
+
+        # The tool returns as soon as the message is spooled
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            tools.send_email(None, f"user{i}@example.com", f"Statement {i}", "Your statement is ready.", "cc@example.com")
+            for i in range(10)
+        ))
+        print(f"Queued 10 emails in {(time.perf_counter() - start) * 1000:.1f} ms: {results[0]}")
+
+        outbox = get_outbox()
+        while outbox.queue_depth():
+            await asyncio.sleep(0.05)
+        print(f"Stats: {outbox.stats()}")
+        print(f"Delivered {len(received)} emails over {connections} SMTP connections")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    check_claims_across_processes()
+    asyncio.run(check_outbox())
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from livekit.agents import Agent, AgentSession
+
+from fakes import LocalAudioInput, LocalAudioOutput, LocalLLM, LocalTTS
+from phrase_audio import PhraseAudioCache
+from prompts import AGENT_INSTRUCTION, GREETING
+
+LLM_TTFT = 0.4
+TTS_TTFB = 0.3
+
+
+async def start_session(tts) -> tuple[AgentSession, LocalAudioOutput]:
+    session = AgentSession(stt=None, llm=LocalLLM(ttft=LLM_TTFT, respond=lambda _: GREETING), tts=tts)
+    speaker = LocalAudioOutput()
+    session.input.audio = LocalAudioInput()
+    session.output.audio = speaker
+    await session.start(agent=Agent(instructions=AGENT_INSTRUCTION))
+    return session, speaker
+
+
+async def time_to_first_audio(tts, greet) -> float:
+    """Session started -> first greeting frame played."""
+    session, speaker = await start_session(tts)
+    try:
+        start = time.perf_counter()
+        await greet(session)
+        return speaker.first_frame_at - start
+    finally:
+        await session.aclose()
+
+
+async def benchmark_greeting():
+    tts = LocalTTS(ttfb=TTS_TTFB)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PhraseAudioCache(directory)
+
+        generated = await time_to_first_audio(tts, lambda s: s.generate_reply(instructions=f"Say: {GREETING}"))
+        print(f"LLM reply + TTS:      {generated * 1000:4.0f} ms")
+
+        # First call: live TTS, rendered for the next caller in the background
+        live = await time_to_first_audio(tts, lambda s: cache.say(s, GREETING, tts, phrase="greeting"))
+        print(f"Cache miss, live TTS: {live * 1000:4.0f} ms")
+        while cache._rendering:
+            await asyncio.sleep(0.05)
+
+        cached = await time_to_first_audio(tts, lambda s: cache.say(s, GREETING, tts, phrase="greeting"))
+        print(f"Cache hit:            {cached * 1000:4.0f} ms")
+
+        # Another worker process maps the same file
+        other = PhraseAudioCache(directory)
+        audio = other.get(GREETING, tts)
+        size = os.path.getsize(audio.path)
+        print(f"On disk: {size / 1024:.0f} KiB for {audio.duration:.1f}s at {audio.sample_rate} Hz, shared by every process")
+
+        # A different voice is a different recording
+        print(f"Other voice cached: {other.get(GREETING, LocalTTS(sample_rate=16000)) is not None}")
+        print(f"Hits {cache.hits}, misses {cache.misses}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("livekit.agents").setLevel(logging.ERROR)
+    asyncio.run(benchmark_greeting())
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from types import SimpleNamespace
+
+from aiohttp import web
+from livekit.agents import llm
+from livekit.agents.utils import http_context
+
+STUB_PORT = 8766
+STUB_DELAY = 0.4
+# A city the stub answers after the weather tool's deadline
+SLOW_CITY, SLOW_DELAY = "Slowville", 2.0
+os.environ["WEATHER_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}"
+os.environ["WEATHER_TOOL_TIMEOUT"] = "1"
+
+
+async def wttr_stub(request: web.Request) -> web.Response:
+    """Stand-in for wttr.in: answers ?format=3 after a fixed delay."""
+    await asyncio.sleep(SLOW_DELAY if request.match_info["city"] == SLOW_CITY else STUB_DELAY)
+    return web.Response(text=f"{request.match_info['city']}: ☀️ +24°C\n")
+
+
+async def start_stub() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/{city}", wttr_stub)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", STUB_PORT).start()
+    return runner
+
+
+def check_detection():
+    from prefetch import detect_intents
+
+    for transcript in (
+        "What's the weather like in Harare?",
+        "is it cold in new york right now",
+        "Should I bring an umbrella in London today please",
+        "What's the weather in New",
+        "Can you search the web for the latest AI news",
+        "look up the best restaurants in Paris",
+        "Send an email to john@example.com",
+    ):
+        print(f"{transcript!r:55} -> {detect_intents(transcript)}")
+
+
+async def speak(prefetcher, interims: list[str], gap: float = 0.15):
+    """Interim transcripts as STT streams them, then the final one."""
+    for text in interims:
+        prefetcher.on_user_input_transcribed(SimpleNamespace(transcript=text, is_final=False))
+        await asyncio.sleep(gap)
+    prefetcher.on_user_input_transcribed(SimpleNamespace(transcript=interims[-1], is_final=True))
+
+
+async def model_calls_weather(prefetcher, tools, city: str) -> float:
+    """The model asks for the weather: time the tool call and report it to the prefetcher."""
+    call = llm.FunctionCall(call_id="call_1", name="get_weather", arguments=json.dumps({"city": city}))
+    start = time.perf_counter()
+    await tools.get_weather(None, city)
+    elapsed = time.perf_counter() - start
+    prefetcher.on_function_tools_executed(SimpleNamespace(function_calls=[call], function_call_outputs=[None]))
+    return elapsed
+
+
+async def check_prefetch():
+    import tools
+    from prefetch import SpeculativePrefetcher
+
+    state = SimpleNamespace(job_id="job_prefetch")
+    prefetcher = SpeculativePrefetcher(state)
+    runner = await start_stub()
+    try:
+        async with http_context.open():
+            # Lookup starts once "New York" is stable, well before the turn ends
+            await speak(prefetcher, [
+                "what's the",
+                "what's the weather in New",
+                "what's the weather in New York",
+                "what's the weather in New York today",
+            ])
+            await asyncio.sleep(0.25)  # end of turn and the model's first token
+            elapsed = await model_calls_weather(prefetcher, tools, "New York")
+            print(f"Prefetched call: {elapsed * 1000:.0f} ms")
+
+            # Nothing was said that hinted at Dubai, so the call waits for the lookup
+            elapsed = await model_calls_weather(prefetcher, tools, "Dubai")
+            print(f"Unprefetched call: {elapsed * 1000:.0f} ms")
+
+            # The caller changes their mind; the lookup is wasted
+            await speak(prefetcher, ["is it hot in Cairo", "is it hot in Cairo", "never mind"])
+            await asyncio.sleep(0.5)
+            print(f"Summary: {await prefetcher.aclose()}")
+    finally:
+        await runner.cleanup()
+
+
+async def check_prefetch_runtime():
+    """Prefetches run under the tool's deadline and circuit breaker, like the model's calls."""
+    import tools
+    from tool_runtime import runtime
+
+    _, _, prefetch = tools.PREFETCHABLE_TOOLS["get_weather"]
+    breaker = runtime.breakers["get_weather"]
+    runner = await start_stub()
+    try:
+        async with http_context.open():
+            start = time.perf_counter()
+            outcome = await prefetch(SLOW_CITY)
+            elapsed = time.perf_counter() - start
+            print(f"Slow upstream: prefetch {outcome} after {elapsed * 1000:.0f} ms, breaker failures {breaker.failures}")
+            assert outcome == "timeout" and elapsed < SLOW_DELAY and breaker.failures == 1
+
+            breaker.opened_at = time.monotonic()
+            outcome = await prefetch("Harare")
+            print(f"Circuit open: prefetch {outcome}")
+            assert outcome == "rejected"
+    finally:
+        breaker.record_success()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    check_detection()
+    asyncio.run(check_prefetch())
+    asyncio.run(check_prefetch_runtime())
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+from livekit.agents import Agent, ChatContext
+
+from memory import ConversationFlusher, MemoryRetriever, extract_name
+from sessions import registry
+
+NUM_SESSIONS = 50
+
+
+class FakeMem0:
+    """Stand-in for AsyncMemoryClient with per-user memories and random latency."""
+
+    def __init__(self):
+        self.saved = []
+
+    async def search(self, query, user_id, top_k=5):
+        await asyncio.sleep(random.uniform(0.01, 0.2))
+        return [{"id": f"{user_id}-1", "memory": f"{user_id} likes the mobile app", "updated_at": "2025-08-24"}]
+
+    async def add(self, messages, user_id):
+        await asyncio.sleep(random.uniform(0.01, 0.1))
+        self.saved.append((user_id, messages))
+        return {"results": []}
+
+
+class TopicMem0(FakeMem0):
+    """Records every search and returns one memory per query, so each search has something new to inject."""
+
+    def __init__(self):
+        super().__init__()
+        self.queries = []
+
+    async def search(self, query, user_id, top_k=5):
+        self.queries.append(query)
+        await asyncio.sleep(0.1)
+        return [{"id": query, "memory": f"{user_id} asked about {query}", "updated_at": "2025-08-24"}]
+
+
+def caller_name(i: int) -> str:
+    # Names are letters only, like real callers' first names
+    return "Caller" + chr(ord('a') + i // 26) + chr(ord('a') + i % 26)
+
+
+async def run_session(i: int, mem0: FakeMem0):
+    name = caller_name(i)
+    state = registry.create(f"job-{i}", f"room-{i}")
+    state.assistant = Agent(instructions="You are Batsi.", chat_ctx=ChatContext())
+    state.flusher = ConversationFlusher(mem0, state, checkpoint_interval=0)
+    state.retriever = MemoryRetriever(mem0, state)
+
+    # The caller answers the greeting with their name at a random moment
+    await asyncio.sleep(random.uniform(0, 0.2))
+    chat_ctx = state.assistant.chat_ctx.copy()
+    chat_ctx.add_message(role="user", content=f"My name is {name}")
+    await state.assistant.update_chat_ctx(chat_ctx)
+
+    state.user_name = extract_name(f"My name is {name}")
+    await state.retriever.prefetch()
+
+    chat_ctx = state.assistant.chat_ctx.copy()
+    chat_ctx.add_message(role="assistant", content=f"Nice to meet you {state.user_name}")
+    await state.assistant.update_chat_ctx(chat_ctx)
+
+    # Several save paths firing together still upload once
+    await asyncio.gather(*(state.flusher.flush(reason) for reason in ("disconnect", "close", "shutdown")))
+    return name, state
+
+
+def check_sessions():
+    mem0 = FakeMem0()
+
+    async def run():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_session(i, mem0) for i in range(NUM_SESSIONS)))
+        print(f"{NUM_SESSIONS} concurrent sessions finished in {time.perf_counter() - start:.2f}s, {len(registry)} registered")
+        return results
+
+    results = asyncio.run(run())
+
+    mixed_up = 0
+    for name, state in results:
+        memories = json.loads(state.memory_str)
+        if state.user_name != name or not memories[0]["memory"].startswith(name):
+            mixed_up += 1
+    saved_users = [user_id for user_id, _ in mem0.saved]
+    wrong_uploads = sum(
+        1 for user_id, messages in mem0.saved if user_id not in messages[0]["content"]
+    )
+    print(f"Sessions with another caller's user or memories: {mixed_up}")
+    print(f"Uploads: {len(saved_users)} for {len(set(saved_users))} users, {wrong_uploads} under the wrong user")
+
+
+def check_refresh_coalescing():
+    """Queries arriving during a search share it or queue one follow-up for the newest topic; none are dropped."""
+    mem0 = TopicMem0()
+
+    async def run():
+        state = registry.create("job-refresh", "room-refresh")
+        state.assistant = Agent(instructions="You are Batsi.", chat_ctx=ChatContext())
+        state.user_name = "Tendai"
+        state.retriever = MemoryRetriever(mem0, state)
+        try:
+            first = state.retriever.refresh("lost card")
+            assert state.retriever.refresh("Lost  card") is first
+            follow_up = state.retriever.refresh("loan rates")
+            assert state.retriever.refresh("ecocash transfer") is follow_up
+            await asyncio.gather(first, follow_up)
+            # Once the follow-up has finished, the next query starts a search of its own
+            await state.retriever.refresh("branch hours")
+            return state
+        finally:
+            registry.remove("job-refresh")
+
+    state = asyncio.run(run())
+    memories = [memory["memory"] for memory in json.loads(state.memory_str)]
+    print(f"Searches: {mem0.queries}, injected {state.retriever.injections} times")
+    assert mem0.queries == ["lost card", "ecocash transfer", "branch hours"], mem0.queries
+    assert memories == [f"Tendai asked about {query}" for query in mem0.queries], memories
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    check_sessions()
+    check_refresh_coalescing()
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+from livekit.agents import function_tool
+
+from tool_runtime import TOOL_CALLS, ToolRuntime
+
+runtime = ToolRuntime(max_threads=4)
+upstream = {"delay": 0.05, "fail": False}
+
+
+@function_tool
+@runtime.tool(
+    fallback="I couldn't check the balance on {account} right now.",
+    timeout=0.5,
+    session_concurrency=2,
+    failure_threshold=3,
+    reset_timeout=1.0,
+)
+async def check_balance(account: str) -> str:
+    """Look up an account balance from a slow upstream service."""
+    await asyncio.sleep(upstream["delay"])
+    if upstream["fail"]:
+        raise ConnectionError("upstream refused connection")
+    if account == "unknown":
+        raise aiohttp.ClientResponseError(None, (), status=404, message="No such account")
+    return f"The balance on {account} is $120"
+
+
+@function_tool
+@runtime.tool(fallback="I couldn't find the branch in {city}.", timeout=0.5, session_concurrency=2)
+def lookup_branch(city: str) -> str:
+    """Sync body: runs on the runtime's thread pool, not the event loop."""
+    time.sleep(0.2)
+    return f"The {city} branch is open until 4pm"
+
+
+def outcomes(tool: str) -> dict[str, int]:
+    return {
+        outcome: int(TOOL_CALLS.labels(tool=tool, outcome=outcome)._value.get())
+        for outcome in ("ok", "error", "invalid", "timeout", "rejected")
+    }
+
+
+async def check_runtime():
+    breaker = runtime.breakers["check_balance"]
+
+    print(await check_balance("savings"))
+
+    # Five calls, two at a time: the last ones wait for a slot
+    start = time.perf_counter()
+    await asyncio.gather(*(check_balance("savings") for _ in range(5)))
+    print(f"5 calls capped at 2 in flight: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    # The sync body leaves the loop free
+    start = time.perf_counter()
+    ticks = 0
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+    ticker = asyncio.create_task(tick())
+    print(await lookup_branch("Harare"))
+    ticker.cancel()
+    print(f"Loop ticked {ticks} times during a 200 ms sync tool")
+
+    # Bad input is the caller's problem, not the upstream's: the circuit stays closed
+    for _ in range(10):
+        reply = await check_balance("unknown")
+    print(f"10 unknown accounts: {breaker.state}, {breaker.failures} failures  {reply}")
+    assert breaker.state == "closed"
+
+    # A hung upstream is cut off at the deadline and the circuit opens
+    upstream["delay"] = 5.0
+    for _ in range(3):
+        start = time.perf_counter()
+        reply = await check_balance("savings")
+        print(f"{(time.perf_counter() - start) * 1000:4.0f} ms  {breaker.state:9}  {reply}")
+
+    # While open, calls fail fast without touching the upstream
+    start = time.perf_counter()
+    reply = await check_balance("savings")
+    print(f"{(time.perf_counter() - start) * 1000:4.0f} ms  {breaker.state:9}  {reply}")
+
+    # After the cooldown one trial call goes through; a failure reopens the circuit
+    await asyncio.sleep(1.0)
+    upstream["delay"], upstream["fail"] = 0.05, True
+    print(f"{breaker.state}: {await check_balance('savings')} -> {breaker.state}")
+
+    # A successful trial closes it again
+    await asyncio.sleep(1.0)
+    upstream["fail"] = False
+    print(f"{breaker.state}: {await check_balance('savings')} -> {breaker.state}")
+
+    print(f"check_balance: {outcomes('check_balance')}")
+    print(f"lookup_branch: {outcomes('lookup_branch')}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.CRITICAL)
+    asyncio.run(check_runtime())
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from types import SimpleNamespace
+
+import prometheus_client
+from livekit.agents.llm import FunctionCall, FunctionCallOutput
+from livekit.agents.metrics import EOUMetrics, LLMMetrics, RealtimeModelMetrics, TTSMetrics
+
+from sessions import SessionState
+from turn_metrics import TurnMetrics
+
+NUM_TURNS = 200
+
+
+def event(metrics):
+    return SimpleNamespace(metrics=metrics)
+
+
+def simulate_call(turn_metrics: TurnMetrics):
+    for turn in range(NUM_TURNS):
+        speech_id = f"speech_{turn}"
+        now = time.time()
+        if turn_metrics.state.model_type == "openai":
+            turn_metrics.on_metrics_collected(event(EOUMetrics(
+                timestamp=now, end_of_utterance_delay=random.uniform(0.3, 0.9),
+                transcription_delay=random.uniform(0.1, 0.4), on_user_turn_completed_delay=0.0, speech_id=speech_id,
+            )))
+            turn_metrics.on_metrics_collected(event(LLMMetrics(
+                label="openai", request_id=f"req_{turn}", timestamp=now, duration=1.0, ttft=random.uniform(0.2, 1.5),
+                cancelled=False, completion_tokens=40, prompt_tokens=1500 + turn * 10, prompt_cached_tokens=0,
+                total_tokens=1540, tokens_per_second=40, speech_id=speech_id,
+            )))
+            turn_metrics.on_metrics_collected(event(TTSMetrics(
+                label="cartesia", request_id=f"tts_{turn}", timestamp=now, ttfb=random.uniform(0.1, 0.3), duration=0.5,
+                audio_duration=3.0, cancelled=False, characters_count=120, streamed=True, speech_id=speech_id,
+            )))
+        else:
+            turn_metrics.on_metrics_collected(event(RealtimeModelMetrics(
+                label="google", request_id=f"rt_{turn}", timestamp=now, duration=1.0, ttft=random.uniform(0.3, 0.8),
+                cancelled=False, input_tokens=2000, output_tokens=50, total_tokens=2050, tokens_per_second=50,
+                input_token_details=RealtimeModelMetrics.InputTokenDetails(), output_token_details=RealtimeModelMetrics.OutputTokenDetails(),
+            )))
+        if turn % 5 == 0:
+            call = FunctionCall(call_id=f"call_{turn}", name="get_weather", arguments='{"city": "Harare"}', created_at=now)
+            output = FunctionCallOutput(call_id=call.call_id, name="get_weather", output="Harare: 24C", is_error=False,
+                                        created_at=now + random.uniform(0.2, 1.0))
+            turn_metrics.on_function_tools_executed(SimpleNamespace(function_calls=[call], function_call_outputs=[output]))
+
+
+async def check_turn_metrics():
+    path = os.path.join(tempfile.mkdtemp(), "turn_metrics.jsonl")
+    for backend in ("openai", "google"):
+        state = SessionState(job_id=f"job-{backend}", room_name="room", model_type=backend)
+        turn_metrics = TurnMetrics(state, path=path)
+        simulate_call(turn_metrics)
+        print(f"{backend}: {json.dumps(await turn_metrics.aclose(), indent=1)}")
+
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    print(f"JSONL: {len(lines)} lines, first: {lines[0]}")
+    # Every reply and both session summaries, in order, although they were written in the background
+    assert len(lines) == 2 * (NUM_TURNS + 1), len(lines)
+    assert [line["turn_id"] for line in lines[:NUM_TURNS]] == [f"speech_{turn}" for turn in range(NUM_TURNS)]
+    assert "summary" in lines[NUM_TURNS] and "summary" in lines[-1]
+    exposition = prometheus_client.generate_latest().decode()
+    print("\n".join(line for line in exposition.splitlines() if line.startswith("voice_turn_stage_seconds_count")))
+
+
+if __name__ == "__main__":
+    asyncio.run(check_turn_metrics())
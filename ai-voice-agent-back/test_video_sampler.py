@@ -0,0 +1,63 @@
+import logging
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from livekit import rtc
+from livekit.agents.utils import images
+
+from backends import VIDEO_ENCODE_OPTIONS
+from video_sampler import VideoSampler
+
+WIDTH, HEIGHT, FPS = 1280, 720, 30
+# What the realtime plugin encodes with when not told otherwise
+PLUGIN_DEFAULT = images.EncodeOptions(
+    format="JPEG", quality=75, resize_options=images.ResizeOptions(width=1024, height=1024, strategy="scale_aspect_fit")
+)
+
+
+def camera_frame(t: float, rng: np.random.Generator) -> rtc.VideoFrame:
+    """A desk scene with sensor noise; a card is held up to the camera between 12 s and 15 s."""
+    y = np.tile(np.linspace(60, 200, WIDTH, dtype=np.float32), (HEIGHT, 1))
+    if 12 <= t < 15:
+        x = int(200 + (t - 12) * 150)
+        y[200:520, x:x + 500] = 235
+    y = np.clip(y + rng.normal(0, 3, y.shape), 0, 255).astype(np.uint8)
+    chroma = np.full(WIDTH * HEIGHT // 2, 128, dtype=np.uint8)
+    return rtc.VideoFrame(WIDTH, HEIGHT, rtc.VideoBufferType.I420, y.tobytes() + chroma.tobytes())
+
+
+def benchmark_sampling():
+    rng = np.random.default_rng(0)
+    session = SimpleNamespace(user_state="listening")
+    sampler = VideoSampler(source=None, session=session)
+    sent_bytes = default_bytes = 0
+    decide_seconds = 0.0
+    seconds = 30
+    for n in range(seconds * FPS):
+        t = n / FPS
+        # The caller talks from 5 s to 8 s while the scene stays still
+        session.user_state = "speaking" if 5 <= t < 8 else "listening"
+        frame = camera_frame(t, rng)
+        start = time.perf_counter()
+        outcome = sampler.decide(frame, t)
+        decide_seconds += time.perf_counter() - start
+        sampler.counts["received"] += 1
+        sampler.counts[outcome] += 1
+        default_bytes += len(images.encode(frame, PLUGIN_DEFAULT))
+        if outcome.startswith("sent"):
+            sent_bytes += len(images.encode(frame, VIDEO_ENCODE_OPTIONS))
+
+    summary = sampler.summary()
+    print(summary)
+    print(f"{summary['sent']} of {summary['received']} frames sent over {seconds}s "
+          f"({summary['sent'] / seconds:.2f} fps instead of {FPS})")
+    print(f"JPEG bytes to the model: {sent_bytes / 1024:.0f} KiB instead of {default_bytes / 1024:.0f} KiB")
+    print(f"Sampling cost: {decide_seconds / summary['received'] * 1e6:.0f} us per received frame")
+    assert summary["sent_change"] >= 2, "the card was not picked up"
+    assert summary["sent_speech"] >= 3, "no burst while the caller spoke"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    benchmark_sampling()
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import os
+import time
+
+from aiohttp import web
+from livekit.agents.utils import http_context
+
+STUB_PORT = 8765
+STUB_DELAY = 0.3
+stub_requests = 0
+
+
+async def wttr_stub(request: web.Request) -> web.Response:
+    """Stand-in for wttr.in: answers ?format=3 after a fixed delay."""
+    global stub_requests
+    stub_requests += 1
+    await asyncio.sleep(STUB_DELAY)
+    city = request.match_info["city"]
+    if city == "nowhere":
+        return web.Response(status=404, text="Unknown location")
+    return web.Response(text=f"{city}: ☀️ +24°C\n")
+
+
+async def start_stub() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/{city}", wttr_stub)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", STUB_PORT).start()
+    return runner
+
+
+async def check_weather():
+    os.environ["WEATHER_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}"
+    import tools
+
+    runner = await start_stub()
+    try:
+        async with http_context.open():
+            # Concurrent lookups for the same city share one upstream request
+            start = time.perf_counter()
+            results = await asyncio.gather(*(tools.get_weather(None, "Harare") for _ in range(20)))
+            print(f"20 concurrent lookups: {time.perf_counter() - start:.3f}s, upstream requests: {stub_requests}")
+            print(f"Result: {results[0]}")
+
+            # Repeat lookups (any casing) are served from the cache
+            start = time.perf_counter()
+            print(await tools.get_weather(None, "harare "))
+            print(f"Cached lookup: {(time.perf_counter() - start) * 1000:.2f} ms, upstream requests: {stub_requests}")
+
+            # Errors are reported and not cached
+            print(await tools.get_weather(None, "nowhere"))
+            print(await tools.get_weather(None, "nowhere"))
+            print(f"Upstream requests after two failed lookups: {stub_requests}")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(check_weather())
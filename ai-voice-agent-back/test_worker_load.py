@@ -0,0 +1,55 @@
+import logging
+import multiprocessing
+import time
+
+from worker_load import WorkerLoad, clear_session, report_session
+
+
+def fake_session(job_id: str, video: bool, duty: float, stop) -> None:
+    """A job process that keeps duty of one core busy, like a session's audio (and video) pipeline."""
+    report_session(job_id, video)
+    while not stop.is_set():
+        start = time.perf_counter()
+        while time.perf_counter() - start < duty * 0.1:
+            pass
+        time.sleep((1 - duty) * 0.1)
+    clear_session(job_id)
+
+
+def sample_for(load: WorkerLoad, job_ids: list[str], seconds: float) -> None:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        load.sample(job_ids)
+        time.sleep(0.5)
+
+
+def check_admission():
+    # A small worker, so a handful of sessions fills it; costs start from the defaults
+    load = WorkerLoad(threshold=0.75, cpu_limit=0.8, smoothing=0.3)
+    stop = multiprocessing.Event()
+    processes, job_ids = [], []
+    try:
+        for n in range(12):
+            admitted, resource = load.admit()
+            print(f"job {n}: {'accepted' if admitted else 'passed on'} "
+                  f"(expected cost {load.expected_cost().cpu:.2f} cores, load {load.load():.2f}, limited by {resource})")
+            if not admitted:
+                break
+            video = n % 3 == 2
+            job_id = f"job-{n}"
+            process = multiprocessing.Process(target=fake_session, args=(job_id, video, 0.2 if video else 0.08, stop))
+            process.start()
+            processes.append(process)
+            job_ids.append(job_id)
+            sample_for(load, job_ids, 3)
+        print(load.summary())
+        assert len(job_ids) < 12, "admission never refused a job"
+    finally:
+        stop.set()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    check_admission()
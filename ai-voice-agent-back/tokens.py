@@ -0,0 +1,20 @@
+"""
+Rough token accounting for prompt budgets.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text
+    return (len(text) + 3) // 4
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, preferring a sentence or word boundary."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    boundary = max(cut.rfind(". "), cut.rfind("... "))
+    if boundary > max_chars // 2:
+        return cut[:boundary + 1]
+    return cut.rsplit(" ", 1)[0] + "..."
@@ -0,0 +1,230 @@
+"""
+Shared runtime for function tools: deadlines, per-session concurrency caps, thread
+offload, circuit breakers and metrics.
+"""
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+
+import aiohttp
+import prometheus_client
+
+TOOL_CALL_SECONDS = prometheus_client.Histogram(
+    "tool_call_seconds",
+    "Function tool latency, including the wait for a free slot",
+    ["tool", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0),
+)
+TOOL_CALLS = prometheus_client.Counter(
+    "tool_calls_total",
+    "Function tool calls by outcome: ok, error (upstream down), invalid (bad input), timeout or rejected (circuit open)",
+    ["tool", "outcome"],
+)
+
+
+def is_upstream_failure(error: BaseException, upstream_errors: tuple[type[BaseException], ...] = ()) -> bool:
+    """
+    Whether an error says the dependency is unavailable, rather than that this call asked for something it can't answer.
+
+    Timeouts, connection errors, 5xx and 429 responses count; 4xx responses and
+    errors raised by the tool body itself (bad arguments, validation) do not.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (TimeoutError, ConnectionError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, *upstream_errors))
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated failures of one dependency.
+
+    After failure_threshold consecutive failures the circuit opens and calls are
+    rejected for reset_timeout seconds; then one trial call is let through, which
+    closes the circuit again on success or reopens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def record_ignored(self) -> None:
+        """A call that failed for reasons of its own: no verdict on the dependency, but a trial slot is freed."""
+        self._trial_running = False
+
+
+class ToolRuntime:
+    """
+    Wraps function tools so one slow or failing dependency cannot stall the conversation.
+
+    Each wrapped tool gets a deadline, a cap on how many of its calls one session
+    runs at once, and a circuit breaker. Every job runs in its own process on its
+    own event loop, so the caps, the breakers and the thread pool are all per
+    session; nothing here limits the worker as a whole. Only upstream failures
+    (see is_upstream_failure) count towards opening a circuit, so callers asking
+    for a city that doesn't exist can't shut a tool off. Timeouts, errors and an
+    open circuit all return the tool's spoken fallback instead of raising, so the
+    assistant can tell the caller and move on. Sync tool bodies, and blocking
+    helpers passed to to_thread(), run on the runtime's thread pool.
+    Speculative lookups made ahead of a call go through speculate(), under the
+    same deadline, slots and breaker as the tool they stand in for.
+    """
+
+    def __init__(self, max_threads: int = 8, default_timeout: float = 8.0, default_concurrency: int = 16) -> None:
+        self.default_timeout = default_timeout
+        self.default_concurrency = default_concurrency
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="tool")
+        # asyncio semaphores belong to one loop; each job process has one loop, and one set
+        self._slots: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._limits: dict[str, int] = {}
+        # Tool name -> (deadline, breaker, upstream errors)
+        self._policies: dict[str, tuple[float, CircuitBreaker, tuple[type[BaseException], ...]]] = {}
+
+    async def to_thread(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking call on the runtime's thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args))
+
+    def _slot(self, name: str) -> asyncio.Semaphore:
+        slots = self._slots.setdefault(asyncio.get_running_loop(), {})
+        if name not in slots:
+            slots[name] = asyncio.Semaphore(self._limits[name])
+        return slots[name]
+
+    async def _guarded(self, name: str, call: Callable[[], Awaitable[Any]]) -> tuple[str, Any]:
+        """Run call() in one of the tool's slots, under its deadline and circuit breaker; returns (outcome, result)."""
+        deadline, breaker, upstream_errors = self._policies[name]
+        if not breaker.allow():
+            return "rejected", None
+
+        async def in_slot() -> Any:
+            async with self._slot(name):
+                return await call()
+
+        try:
+            result = await asyncio.wait_for(in_slot(), deadline)
+            breaker.record_success()
+            return "ok", result
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            logging.error(f"Tool {name} timed out after {deadline:.1f}s")
+            return "timeout", None
+        except Exception as e:
+            if is_upstream_failure(e, upstream_errors):
+                breaker.record_failure()
+                logging.error(f"Tool {name} failed: {e!r}")
+                return "error", None
+            breaker.record_ignored()
+            logging.warning(f"Tool {name} could not answer: {e!r}")
+            return "invalid", None
+
+    async def speculate(self, name: str, fetch: Callable[[], Awaitable[Any]]) -> str:
+        """
+        Run a lookup ahead of a call to the tool name, as that tool's calls run.
+
+        It waits for one of the session's slots for the tool, is abandoned at
+        the tool's deadline, is skipped while its circuit is open, and its
+        upstream failures count towards opening it. It is not counted as a
+        tool call in the metrics.
+
+        Returns:
+            The outcome: ok, error, invalid, timeout or rejected
+        """
+        outcome, _ = await self._guarded(name, fetch)
+        return outcome
+
+    def tool(
+        self,
+        fallback: str,
+        timeout: float | None = None,
+        session_concurrency: int | None = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        upstream_errors: tuple[type[BaseException], ...] = (),
+    ) -> Callable:
+        """
+        Decorate a tool body; apply @function_tool on top of it.
+
+        Args:
+            fallback: What to tell the caller when the tool cannot answer, formatted with the tool's arguments
+            timeout: Seconds before the call is abandoned, including the wait for a free slot
+            session_concurrency: How many calls of this tool one session runs at once
+            failure_threshold: Consecutive upstream failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial call
+            upstream_errors: Further exception types that mean the dependency is down
+        """
+        def decorator(func: Callable) -> Callable:
+            name = func.__name__
+            self._limits[name] = session_concurrency or self.default_concurrency
+            breaker = self.breakers[name] = CircuitBreaker(failure_threshold, reset_timeout)
+            self._policies[name] = (timeout if timeout is not None else self.default_timeout, breaker, upstream_errors)
+            signature = inspect.signature(func)
+            is_async = inspect.iscoroutinefunction(func)
+
+            async def call(args: tuple, kwargs: dict) -> Any:
+                if is_async:
+                    return await func(*args, **kwargs)
+                return await self.to_thread(functools.partial(func, *args, **kwargs))
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                outcome, result = await self._guarded(name, lambda: call(args, kwargs))
+                elapsed = time.perf_counter() - start
+                TOOL_CALL_SECONDS.labels(tool=name, outcome=outcome).observe(elapsed)
+                TOOL_CALLS.labels(tool=name, outcome=outcome).inc()
+                if outcome == "ok":
+                    return result
+                if outcome == "rejected":
+                    logging.warning(f"Tool {name} skipped, circuit open after {breaker.failures} failures")
+                bound = signature.bind_partial(*args, **kwargs)
+                return fallback.format(**bound.arguments)
+
+            return wrapper
+
+        return decorator
+
+
+runtime = ToolRuntime(
+    max_threads=int(os.getenv("TOOL_MAX_THREADS", "8")),
+    default_timeout=float(os.getenv("TOOL_TIMEOUT", "8")),
+    default_concurrency=int(os.getenv("TOOL_SESSION_CONCURRENCY", "4")),
+)
@@ -1,14 +1,98 @@
 import logging
+import re
+import time
+import aiohttp
 from livekit.agents import function_tool, RunContext
-import requests
+from livekit.agents.utils import http_context
 from langchain_community.tools import DuckDuckGoSearchRun
-import smtplib
+from duckduckgo_search.exceptions import DuckDuckGoSearchException
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import os
+import sqlite3
+from urllib.parse import quote
+
+from cache import TTLCache
+from tokens import estimate_tokens, trim_to_tokens
+from outbox import get_outbox
+from tool_runtime import runtime
+
+
+WEATHER_BASE_URL = os.getenv("WEATHER_BASE_URL", "https://wttr.in")
+WEATHER_TIMEOUT = aiohttp.ClientTimeout(
+    total=float(os.getenv("WEATHER_TIMEOUT", "4")),
+    sock_connect=float(os.getenv("WEATHER_CONNECT_TIMEOUT", "2")),
+)
+# Conditions change slowly, so one lookup per city serves every session for a while
+_weather_cache = TTLCache(ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")), maxsize=512)
+
+
+async def _fetch_weather(city: str) -> str:
+    # http_session() is the worker's pooled aiohttp session, shared by every job on the loop
+    async with http_context.http_session().get(
+        f"{WEATHER_BASE_URL}/{quote(city)}",
+        params={"format": "3"},
+        timeout=WEATHER_TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+        return (await response.text()).strip()
+
+
+SEARCH_MAX_TOKENS = int(os.getenv("SEARCH_MAX_TOKENS", "300"))
+_search_tool: DuckDuckGoSearchRun | None = None
+_search_cache = TTLCache(ttl=float(os.getenv("SEARCH_CACHE_TTL", "900")), maxsize=256)
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+def _search(query: str) -> str:
+    # One search tool for the whole worker, created on first use
+    global _search_tool
+    if _search_tool is None:
+        _search_tool = DuckDuckGoSearchRun()
+    return _search_tool.run(tool_input=query)
+
+
+async def _run_search(query: str) -> str:
+    # DuckDuckGo search is synchronous, so it runs on the tool runtime's thread pool
+    results = await runtime.to_thread(_search, query)
+    return trim_to_tokens(results, SEARCH_MAX_TOKENS)
+
+
+def _weather_key(city: str) -> str:
+    return city.strip().lower()
+
+
+async def _prefetch_weather(city: str) -> str:
+    return await runtime.speculate(
+        "get_weather", lambda: _weather_cache.get_or_fetch(_weather_key(city), lambda: _fetch_weather(city.strip()))
+    )
+
+
+async def _prefetch_search(query: str) -> str:
+    return await runtime.speculate(
+        "search_web", lambda: _search_cache.get_or_fetch(_normalize_query(query), lambda: _run_search(query))
+    )
+
+
+# Lookups that can start before the model asks for them, so the tool call finds
+# the result in its cache: tool name -> (argument, cache key, prefetch). Each
+# prefetch runs under its tool's deadline, session slots and circuit breaker,
+# and returns the runtime's outcome
+PREFETCHABLE_TOOLS = {
+    "get_weather": ("city", _weather_key, _prefetch_weather),
+    "search_web": ("query", _normalize_query, _prefetch_search),
+}
 
 
 @function_tool
+@runtime.tool(
+    fallback="I couldn't get the weather for {city} right now.",
+    timeout=float(os.getenv("WEATHER_TOOL_TIMEOUT", "5")),
+    session_concurrency=int(os.getenv("WEATHER_SESSION_CONCURRENCY", "4")),
+)
 async def get_weather(
     context: RunContext,  # type: ignore
     city: str) -> str:
@@ -30,21 +114,19 @@ async def get_weather(
     - "Should I bring an umbrella in London?"
     - "What's the temperature in Tokyo?"
     """
-    try:
-        response = requests.get(
-            f"https://wttr.in/{city}?format=3")
-        if response.status_code == 200:
-            logging.info(f"Weather for {city}: {response.text.strip()}")
-            return response.text.strip()
-        else:
-            logging.error(f"Failed to get weather for {city}: {response.status_code}")
-            return f"Could not retrieve weather for {city}."
-    except Exception as e:
-        logging.error(f"Error retrieving weather for {city}: {e}")
-        return f"An error occurred while retrieving weather for {city}."
+    weather = await _weather_cache.get_or_fetch(_weather_key(city), lambda: _fetch_weather(city.strip()))
+    logging.info(f"Weather for {city}: {weather}")
+    return weather
 
 
 @function_tool
+@runtime.tool(
+    fallback="I couldn't search the web for that right now.",
+    timeout=float(os.getenv("SEARCH_TOOL_TIMEOUT", "10")),
+    session_concurrency=int(os.getenv("SEARCH_SESSION_CONCURRENCY", "2")),
+    # Rate limits and timeouts from DuckDuckGo all surface as this
+    upstream_errors=(DuckDuckGoSearchException,),
+)
 async def search_web(
     context: RunContext,  # type: ignore
     query: str) -> str:
@@ -69,16 +151,23 @@ async def search_web(
     - "What are people saying about the new iPhone?"
     - "Find me information on climate change"
     """
-    try:
-        results = DuckDuckGoSearchRun().run(tool_input=query)
-        logging.info(f"Search results for '{query}': {results}")
-        return results
-    except Exception as e:
-        logging.error(f"Error searching the web for '{query}': {e}")
-        return f"An error occurred while searching the web for '{query}'."
+    start = time.perf_counter()
+    results = await _search_cache.get_or_fetch(_normalize_query(query), lambda: _run_search(query))
+    logging.info(
+        f"Search results for '{query}' in {(time.perf_counter() - start) * 1000:.0f} ms "
+        f"(~{estimate_tokens(results)} tokens): {results}"
+    )
+    return results
 
 
 @function_tool
+@runtime.tool(
+    fallback="I couldn't queue the email to {to_email} right now, please try again in a moment.",
+    timeout=float(os.getenv("EMAIL_TOOL_TIMEOUT", "5")),
+    session_concurrency=int(os.getenv("EMAIL_SESSION_CONCURRENCY", "4")),
+    # A locked or unwritable outbox database
+    upstream_errors=(sqlite3.OperationalError,),
+)
 async def send_email(
     context: RunContext,  # type: ignore
     to_email: str,
@@ -116,66 +205,30 @@ async def send_email(
     """
     logging.info(f"Attempting to send email to {to_email} with subject: {subject}")
     
-    try:
-        # Gmail SMTP configuration
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-
-        # Get credentials from environment variables
-        gmail_user = os.getenv("GMAIL_USER")
-        gmail_password = os.getenv("GMAIL_APP_PASSWORD")
-
-        if not gmail_user or not gmail_password:
-            logging.error("Gmail credentials not found in environment variables")
-            return "I cannot send the email because Gmail credentials are not configured in the system. Please ask the administrator to set up GMAIL_USER and GMAIL_APP_PASSWORD in the environment variables."
-
-        logging.info(f"Using Gmail account: {gmail_user}")
-
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = gmail_user
-        msg['To'] = to_email
-        msg['Subject'] = subject
-
-        # Add CC if provided
-        recipients = [to_email]
-        if cc_email:
-            msg['Cc'] = cc_email
-            recipients.append(cc_email)
-
-        # Attach message body
-        msg.attach(MIMEText(message, 'plain'))
-
-        # Connect to Gmail SMTP server
-        logging.info("Connecting to Gmail SMTP server...")
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()  # Enable TLS encryption
-        
-        logging.info("Authenticating with Gmail...")
-        server.login(gmail_user, gmail_password)
-
-        # Send email
-        logging.info("Sending email...")
-        text = msg.as_string()
-        server.sendmail(gmail_user, recipients, text)
-        server.quit()
-
-        logging.info(f"Email sent successfully to {to_email}")
-        return f"Email sent successfully to {to_email} with subject '{subject}'"
-
-    except smtplib.SMTPAuthenticationError as e:
-        error_msg = f"Gmail authentication failed: {str(e)}. Please ensure you're using a Gmail App Password (not your regular password) and that it's correctly configured."
-        logging.error(error_msg)
-        return error_msg
-    except smtplib.SMTPException as e:
-        error_msg = f"SMTP error occurred: {str(e)}"
-        logging.error(error_msg)
-        return error_msg
-    except Exception as e:
-        error_msg = f"Error sending email: {str(e)}"
-        logging.error(error_msg)
-        return error_msg
-
-
-
-
+    # Delivery happens in the background outbox; it is only created once credentials exist
+    outbox = get_outbox()
+    if outbox is None:
+        logging.error("Gmail credentials not found in environment variables")
+        return "I cannot send the email because Gmail credentials are not configured in the system. Please ask the administrator to set up GMAIL_USER and GMAIL_APP_PASSWORD in the environment variables."
+
+    logging.info(f"Using Gmail account: {outbox.user}")
+
+    # Create message
+    msg = MIMEMultipart()
+    msg['From'] = outbox.user
+    msg['To'] = to_email
+    msg['Subject'] = subject
+
+    # Add CC if provided
+    recipients = [to_email]
+    if cc_email:
+        msg['Cc'] = cc_email
+        recipients.append(cc_email)
+
+    # Attach message body
+    msg.attach(MIMEText(message, 'plain'))
+
+    # Spool the message; the outbox delivers it over a persistent SMTP connection
+    message_id = await runtime.to_thread(outbox.enqueue, recipients, msg.as_string())
+    logging.info(f"Email {message_id} to {to_email} queued for delivery")
+    return f"Email to {to_email} with subject '{subject}' has been queued and will be sent in a moment"
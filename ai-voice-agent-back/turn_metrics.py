@@ -0,0 +1,203 @@
+"""
+Per-turn voice latency: where each reply's time goes, per backend and tool.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING
+
+import prometheus_client
+from livekit.agents.metrics import EOUMetrics, LLMMetrics, RealtimeModelMetrics, TTSMetrics
+
+if TYPE_CHECKING:
+    from sessions import SessionState
+
+
+# stt: end of speech -> final transcript, eou: end of speech -> end of turn decision,
+# llm_ttft: request -> first token, tool: one tool call, tts_ttfb: text -> first audio byte
+STAGES = ("stt", "eou", "llm_ttft", "tool", "tts_ttfb")
+
+STAGE_SECONDS = prometheus_client.Histogram(
+    "voice_turn_stage_seconds",
+    "Latency of each stage of a voice turn",
+    ["stage", "backend", "tool"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0),
+)
+PROMPT_TOKENS = prometheus_client.Histogram(
+    "voice_turn_prompt_tokens",
+    "Prompt tokens sent to the model per generation",
+    ["backend"],
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000),
+)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of values, q between 0 and 1."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class LatencyStats:
+    """Recent latency samples per stage, backend and tool, summarised as p50/p95/p99."""
+
+    def __init__(self, max_samples: int = 10000) -> None:
+        self.max_samples = max_samples
+        self._samples: dict[tuple[str, str, str], deque[float]] = {}
+
+    def observe(self, stage: str, backend: str, seconds: float, tool: str = "") -> None:
+        key = (stage, backend, tool)
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.max_samples)
+        samples.append(seconds)
+
+    def clear(self) -> None:
+        self._samples.clear()
+
+    def percentile(self, stage: str, backend: str, q: float, tool: str = "") -> float | None:
+        """Percentile of the recent samples in seconds, or None before the first one."""
+        samples = self._samples.get((stage, backend, tool))
+        return percentile(list(samples), q) if samples else None
+
+    def summary(self) -> dict[str, dict]:
+        """Count and p50/p95/p99 in milliseconds, keyed "stage/backend" or "tool/backend/name"."""
+        result = {}
+        for (stage, backend, tool), samples in sorted(self._samples.items()):
+            values = list(samples)
+            result["/".join(part for part in (stage, backend, tool) if part)] = {
+                "count": len(values),
+                "p50": round(percentile(values, 0.50) * 1000, 1),
+                "p95": round(percentile(values, 0.95) * 1000, 1),
+                "p99": round(percentile(values, 0.99) * 1000, 1),
+            }
+        return result
+
+
+# Every session in this worker process, for load tests and the shutdown log
+process_stats = LatencyStats()
+
+
+class TurnMetrics:
+    """
+    Collects one session's latency per reply and exports it.
+
+    Pipeline metrics (end of turn, LLM, TTS) share the speech id of the reply
+    they belong to, so each reply gets one record; realtime model metrics have
+    no speech id and are recorded per request. Tool calls are attributed to the
+    reply that made them. Every observation goes to the Prometheus histograms
+    and the session and process summaries as it arrives; records are appended
+    to the JSONL file once newer replies have started, and on aclose(). Writes
+    run on a thread, never on the event loop: records that arrive while one is
+    in progress are batched into the next.
+    """
+
+    def __init__(self, state: "SessionState", path: str | None = None, max_open_turns: int = 4) -> None:
+        self.state = state
+        self.path = path
+        self.max_open_turns = max_open_turns
+        self.stats = LatencyStats()
+        self.turns = 0
+        self._open: OrderedDict[str, dict] = OrderedDict()
+        self._lines: list[str] = []
+        self._flush_task: asyncio.Task | None = None
+
+    def _turn(self, turn_id: str) -> dict:
+        record = self._open.get(turn_id)
+        if record is None:
+            record = self._open[turn_id] = {
+                "session": self.state.job_id,
+                "room": self.state.room_name,
+                "turn_id": turn_id,
+                "backend": self.state.model_type,
+                "started_at": time.time(),
+                "tools": [],
+            }
+            while len(self._open) > self.max_open_turns:
+                self._write(self._open.popitem(last=False)[1])
+        return record
+
+    def _observe(self, record: dict, stage: str, seconds: float, tool: str = "") -> None:
+        backend = record["backend"]
+        STAGE_SECONDS.labels(stage=stage, backend=backend, tool=tool).observe(seconds)
+        self.stats.observe(stage, backend, seconds, tool)
+        process_stats.observe(stage, backend, seconds, tool)
+        if tool:
+            record["tools"].append({"name": tool, "seconds": round(seconds, 4)})
+        # Replies can stream several generations or TTS segments; the first one is what the caller waits for
+        elif stage not in record:
+            record[stage] = round(seconds, 4)
+
+    def on_metrics_collected(self, ev) -> None:
+        metrics = ev.metrics
+        if isinstance(metrics, EOUMetrics):
+            record = self._turn(metrics.speech_id or "unknown")
+            self._observe(record, "stt", metrics.transcription_delay)
+            self._observe(record, "eou", metrics.end_of_utterance_delay)
+        elif isinstance(metrics, LLMMetrics):
+            if metrics.cancelled or metrics.ttft < 0:
+                return
+            record = self._turn(metrics.speech_id or metrics.request_id)
+            self._observe(record, "llm_ttft", metrics.ttft)
+            record["prompt_tokens"] = metrics.prompt_tokens
+            PROMPT_TOKENS.labels(backend=record["backend"]).observe(metrics.prompt_tokens)
+        elif isinstance(metrics, RealtimeModelMetrics):
+            if metrics.cancelled or metrics.ttft < 0:
+                return
+            record = self._turn(metrics.request_id)
+            self._observe(record, "llm_ttft", metrics.ttft)
+            record["prompt_tokens"] = metrics.input_tokens
+            PROMPT_TOKENS.labels(backend=record["backend"]).observe(metrics.input_tokens)
+        elif isinstance(metrics, TTSMetrics):
+            if metrics.cancelled or metrics.ttfb < 0:
+                return
+            self._observe(self._turn(metrics.speech_id or metrics.request_id), "tts_ttfb", metrics.ttfb)
+
+    def on_function_tools_executed(self, ev) -> None:
+        # Tools run inside the reply that was generated last
+        record = next(reversed(self._open.values())) if self._open else self._turn("tools")
+        for call, output in zip(ev.function_calls, ev.function_call_outputs):
+            if output is None:
+                continue
+            self._observe(record, "tool", max(0.0, output.created_at - call.created_at), tool=call.name)
+
+    def _write(self, record: dict) -> None:
+        self.turns += 1
+        if not self.path:
+            return
+        self._lines.append(json.dumps(record))
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush(), name="turn_metrics_flush")
+
+    async def _flush(self) -> None:
+        while self._lines:
+            lines, self._lines = self._lines, []
+            await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: list[str]) -> None:
+        try:
+            with open(self.path, "a") as f:
+                f.write("".join(line + "\n" for line in lines))
+        except OSError as e:
+            logging.warning(f"Could not write {len(lines)} metrics records to {self.path}: {e}")
+
+    async def aclose(self) -> dict[str, dict]:
+        """Write the remaining replies and the session summary, and return the summary."""
+        while self._open:
+            self._write(self._open.popitem(last=False)[1])
+        summary = self.stats.summary()
+        if self.path:
+            self._lines.append(json.dumps({
+                "session": self.state.job_id,
+                "room": self.state.room_name,
+                "turns": self.turns,
+                "duration": round(time.time() - self.state.started_at, 1),
+                "summary": summary,
+            }))
+            self._schedule_flush()
+            await self._flush_task
+        return summary
@@ -0,0 +1,110 @@
+"""
+Camera frame sampling for the realtime backend: send frames when the scene changes
+or the user is talking, not at the camera's frame rate.
+"""
+import time
+
+import numpy as np
+import prometheus_client
+from livekit import rtc
+from livekit.agents import AgentSession
+from livekit.agents.voice.io import VideoInput
+
+FRAMES = prometheus_client.Counter(
+    "video_frames_total",
+    "Camera frames from the room, by what happened to them",
+    ["outcome"],
+)
+
+
+def thumbnail(frame: rtc.VideoFrame, grid: tuple[int, int] = (16, 9)) -> np.ndarray:
+    """Mean luma over a coarse grid: a perceptual fingerprint that ignores sensor noise."""
+    if frame.type != rtc.VideoBufferType.I420:
+        frame = frame.convert(rtc.VideoBufferType.I420)
+    luma = np.frombuffer(frame.data, dtype=np.uint8, count=frame.width * frame.height)
+    luma = luma.reshape(frame.height, frame.width)
+    # Every other pixel is plenty for block means and halves the work
+    luma = luma[::2, ::2]
+    cols, rows = grid
+    bh, bw = luma.shape[0] // rows, luma.shape[1] // cols
+    blocks = luma[:rows * bh, :cols * bw].reshape(rows, bh, cols, bw)
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+class VideoSampler(VideoInput):
+    """
+    Sits between the room's camera input and the session, passing on only the frames worth sending.
+
+    Frames that arrive sooner than 1/max_fps after the last one looked at are
+    dropped without looking at them. Otherwise a frame is sent if its
+    thumbnail differs from the last sent frame's by more than change_threshold
+    (mean absolute luma difference, 0 to 1), if the user is speaking (a burst
+    at up to burst_fps, since that is when they point the camera at
+    something), or if nothing has been sent for idle_interval seconds, so the
+    model's view never goes too stale. Downscaling before encoding is set
+    on the realtime model (backends.VIDEO_ENCODE_OPTIONS).
+    """
+
+    def __init__(
+        self,
+        source: VideoInput,
+        session: AgentSession,
+        max_fps: float = 1.0,
+        burst_fps: float = 2.0,
+        change_threshold: float = 0.04,
+        idle_interval: float = 10.0,
+    ) -> None:
+        super().__init__(label="VideoSampler", source=source)
+        self.session = session
+        self.max_fps = max_fps
+        self.burst_fps = burst_fps
+        self.change_threshold = change_threshold
+        self.idle_interval = idle_interval
+        self.counts = {"received": 0, "sent_change": 0, "sent_speech": 0, "sent_idle": 0, "dropped_rate": 0, "dropped_duplicate": 0}
+        self._last_sent_at: float | None = None
+        self._last_checked_at: float | None = None
+        self._last_thumbnail: np.ndarray | None = None
+
+    def _count(self, outcome: str) -> None:
+        self.counts[outcome] += 1
+        FRAMES.labels(outcome=outcome).inc()
+
+    def decide(self, frame: rtc.VideoFrame, now: float) -> str:
+        """What to do with frame: one of the sent_* or dropped_* outcomes."""
+        speaking = self.session.user_state == "speaking"
+        if self._last_checked_at is not None and now - self._last_checked_at < 1 / (self.burst_fps if speaking else self.max_fps):
+            return "dropped_rate"
+        self._last_checked_at = now
+
+        fingerprint = thumbnail(frame)
+        previous = self._last_thumbnail
+        if previous is None or previous.shape != fingerprint.shape:
+            outcome = "sent_change"
+        elif float(np.mean(np.abs(fingerprint - previous))) / 255 > self.change_threshold:
+            outcome = "sent_change"
+        elif speaking:
+            outcome = "sent_speech"
+        elif now - self._last_sent_at >= self.idle_interval:
+            outcome = "sent_idle"
+        else:
+            return "dropped_duplicate"
+        self._last_sent_at = now
+        self._last_thumbnail = fingerprint
+        return outcome
+
+    async def __anext__(self) -> rtc.VideoFrame:
+        while True:
+            frame = await super().__anext__()
+            self._count("received")
+            outcome = self.decide(frame, time.monotonic())
+            self._count(outcome)
+            if outcome.startswith("sent"):
+                return frame
+
+    def summary(self) -> dict:
+        sent = sum(count for outcome, count in self.counts.items() if outcome.startswith("sent"))
+        return {
+            **self.counts,
+            "sent": sent,
+            "sent_ratio": round(sent / self.counts["received"], 3) if self.counts["received"] else None,
+        }
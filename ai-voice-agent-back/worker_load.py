@@ -0,0 +1,226 @@
+"""
+Worker load reporting and job admission from the measured cost of each session.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+
+import prometheus_client
+import psutil
+from livekit.agents import AgentServer, JobRequest
+from livekit.agents.utils.hw import get_cpu_monitor
+
+SESSION_COST_CPU = prometheus_client.Gauge(
+    "worker_session_cost_cpu",
+    "Estimated CPU cores one session uses, by mode (audio or video)",
+    ["mode"],
+)
+SESSION_COST_MEMORY = prometheus_client.Gauge(
+    "worker_session_cost_memory_mb",
+    "Estimated resident memory one session uses, by mode (audio or video)",
+    ["mode"],
+)
+COMMITTED_LOAD = prometheus_client.Gauge(
+    "worker_committed_load",
+    "Load reported to the dispatcher: current use plus headroom for audio sessions turning video on",
+)
+ADMISSIONS = prometheus_client.Counter(
+    "worker_job_admissions_total",
+    "Job requests accepted or passed on to another worker, by outcome and limiting resource",
+    ["outcome", "resource"],
+)
+
+# Job processes report what their session is doing here; the main process reads it.
+# Set before the job processes start, so they inherit it
+if "WORKER_LOAD_DIR" not in os.environ:
+    os.environ["WORKER_LOAD_DIR"] = tempfile.mkdtemp(prefix="agent-load-")
+
+
+def _status_path(job_id: str) -> str:
+    return os.path.join(os.environ["WORKER_LOAD_DIR"], f"{job_id}.json")
+
+
+def report_session(job_id: str, video: bool) -> None:
+    """Record, from the job process, whether its session is streaming video."""
+    path = _status_path(job_id)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump({"pid": os.getpid(), "video": video}, f)
+    os.replace(tmp_path, path)
+
+
+def clear_session(job_id: str) -> None:
+    try:
+        os.remove(_status_path(job_id))
+    except FileNotFoundError:
+        pass
+
+
+@dataclass
+class SessionCost:
+    cpu: float
+    memory_mb: float
+
+
+class WorkerLoad:
+    """
+    Load function and admission policy for AgentServer, from per-session measurements.
+
+    Every call samples the CPU and memory of this worker's whole process tree
+    (the main process, the inference process running the turn detector, and
+    one process per job) and of each job process. A session's cost is its own
+    process plus an equal share of everything else, and is averaged separately
+    for audio-only sessions and sessions streaming video to the realtime model,
+    starting from audio_cost and video_cost until there are measurements.
+
+    The load reported to the dispatcher is the larger of CPU and memory use as
+    a fraction of the worker's limits, plus room for each audio-only session to
+    turn its camera on, weighted by the share of sessions that currently have
+    video. A new job is admitted only if one more session of the expected mix
+    still fits under threshold, so a worker passes jobs on to other nodes
+    before its calls start to stutter rather than after.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.75,
+        audio_cost: SessionCost | None = None,
+        video_cost: SessionCost | None = None,
+        video_share: float = 0.2,
+        smoothing: float = 0.05,
+        cpu_limit: float | None = None,
+        memory_limit_mb: float | None = None,
+    ) -> None:
+        self.threshold = threshold
+        # Updated in place as sessions are measured
+        self.costs = {
+            "audio": audio_cost or SessionCost(cpu=0.3, memory_mb=350),
+            "video": video_cost or SessionCost(cpu=0.6, memory_mb=450),
+        }
+        self.video_share = video_share
+        self.smoothing = smoothing
+        self.cpu_limit = cpu_limit or get_cpu_monitor().cpu_count()
+        self.memory_limit_mb = memory_limit_mb or psutil.virtual_memory().total / 1024 / 1024
+        self.cpu = 0.0
+        self.memory_mb = 0.0
+        self.sessions: dict[str, bool] = {}
+        self._processes: dict[int, psutil.Process] = {}
+        self._lock = threading.Lock()
+        for mode, cost in self.costs.items():
+            SESSION_COST_CPU.labels(mode=mode).set(cost.cpu)
+            SESSION_COST_MEMORY.labels(mode=mode).set(cost.memory_mb)
+
+    def _process(self, pid: int) -> psutil.Process:
+        process = self._processes.get(pid)
+        if process is None:
+            process = self._processes[pid] = psutil.Process(pid)
+            # The first reading only sets the baseline for the next one
+            process.cpu_percent(None)
+        return process
+
+    def _usage(self, pid: int) -> tuple[float, float]:
+        """CPU cores used since the previous sample and resident memory in MB."""
+        process = self._process(pid)
+        with process.oneshot():
+            return process.cpu_percent(None) / 100, process.memory_info().rss / 1024 / 1024
+
+    def sample(self, job_ids: list[str]) -> None:
+        """Measure the process tree and update the per-session costs of the given running jobs."""
+        main = os.getpid()
+        pids = [main] + [child.pid for child in psutil.Process(main).children(recursive=True)]
+        usage = {}
+        for pid in pids:
+            try:
+                usage[pid] = self._usage(pid)
+            except psutil.Error:
+                continue
+        self._processes = {pid: self._processes[pid] for pid in usage}
+
+        sessions = {}
+        for job_id in job_ids:
+            try:
+                with open(_status_path(job_id)) as f:
+                    status = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if status["pid"] in usage and status["pid"] != main:
+                sessions[job_id] = status
+
+        with self._lock:
+            self.cpu = sum(cpu for cpu, _ in usage.values())
+            self.memory_mb = sum(memory for _, memory in usage.values())
+            self.sessions = {job_id: status["video"] for job_id, status in sessions.items()}
+            if not sessions:
+                return
+            own = [usage[status["pid"]] for status in sessions.values()]
+            shared_cpu = (self.cpu - sum(cpu for cpu, _ in own)) / len(sessions)
+            shared_memory = (self.memory_mb - sum(memory for _, memory in own)) / len(sessions)
+            for status, (cpu, memory) in zip(sessions.values(), own):
+                mode = "video" if status["video"] else "audio"
+                cost = self.costs[mode]
+                cost.cpu += self.smoothing * (cpu + shared_cpu - cost.cpu)
+                cost.memory_mb += self.smoothing * (memory + shared_memory - cost.memory_mb)
+                SESSION_COST_CPU.labels(mode=mode).set(cost.cpu)
+                SESSION_COST_MEMORY.labels(mode=mode).set(cost.memory_mb)
+            share = sum(self.sessions.values()) / len(self.sessions)
+            self.video_share += self.smoothing * (share - self.video_share)
+
+    def expected_cost(self) -> SessionCost:
+        """Cost of a session whose camera may or may not come on."""
+        audio, video = self.costs["audio"], self.costs["video"]
+        return SessionCost(
+            cpu=audio.cpu + self.video_share * (video.cpu - audio.cpu),
+            memory_mb=audio.memory_mb + self.video_share * (video.memory_mb - audio.memory_mb),
+        )
+
+    def _load(self, extra: SessionCost) -> dict[str, float]:
+        audio, video = self.costs["audio"], self.costs["video"]
+        audio_sessions = sum(not video_on for video_on in self.sessions.values())
+        cpu = self.cpu + audio_sessions * self.video_share * max(video.cpu - audio.cpu, 0) + extra.cpu
+        memory = self.memory_mb + audio_sessions * self.video_share * max(video.memory_mb - audio.memory_mb, 0) + extra.memory_mb
+        return {"cpu": cpu / self.cpu_limit, "memory": memory / self.memory_limit_mb}
+
+    def load(self) -> float:
+        with self._lock:
+            return max(self._load(SessionCost(0, 0)).values())
+
+    def __call__(self, server: AgentServer) -> float:
+        """The load_fnc: sample, then report the committed load."""
+        self.sample([info.job.id for info in server.active_jobs])
+        load = self.load()
+        COMMITTED_LOAD.set(load)
+        return load
+
+    def admit(self) -> tuple[bool, str]:
+        """Whether one more session fits under the threshold, and the resource that decides it."""
+        with self._lock:
+            projected = self._load(self.expected_cost())
+        resource = max(projected, key=projected.get)
+        return projected[resource] < self.threshold, resource
+
+    async def on_request(self, request: JobRequest) -> None:
+        """The rtc_session request handler: accept, or leave the job for a worker with room."""
+        admitted, resource = self.admit()
+        ADMISSIONS.labels(outcome="accepted" if admitted else "rejected", resource=resource).inc()
+        if admitted:
+            await request.accept()
+            return
+        logging.warning(
+            f"Passing on job {request.id}: another session would put {resource} over {self.threshold:.0%} "
+            f"({len(self.sessions)} sessions, {self.cpu:.2f}/{self.cpu_limit:.1f} cores, "
+            f"{self.memory_mb:.0f}/{self.memory_limit_mb:.0f} MB)"
+        )
+        # Not terminal, so the dispatcher offers the job to another worker
+        await request.reject(terminate=False)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self.sessions),
+                "video_share": round(self.video_share, 2),
+                "load": round(max(self._load(SessionCost(0, 0)).values()), 2),
+                **{f"{mode}_cost": {"cpu": round(c.cpu, 2), "memory_mb": round(c.memory_mb)} for mode, c in self.costs.items()},
+            }